@@ -1,7 +1,9 @@
 import os
+from concurrent.futures import Executor
 from typing import List, Union, Set, Optional
 import hashlib
 
+import numpy as np
 from tqdm import tqdm
 
 # from deepsearcher.configuration import embedding_model, vector_db, file_loader
@@ -103,6 +105,70 @@ def _filter_new_chunks(chunks: List, existing_ids: Set[str]) -> List:
     return new_chunks
 
 
+def _written_count(result, chunks: List) -> int:
+    """Number of chunks an insert_data call wrote; vector databases that do not report it are trusted."""
+    return len(chunks) if result is None else result
+
+
+def _embed_and_insert_overlapped(
+    embedding_model,
+    vector_db,
+    collection_name: str,
+    chunks: List,
+    batch_size: int,
+    insert_batch_size: Optional[int],
+    executor: Executor,
+    raw_vectors: bool = False,
+):
+    """
+    Embed chunks batch by batch while the previous write to the vector database runs on the executor.
+
+    Embedded chunks are coalesced into writes of at least ``insert_batch_size`` chunks; at most one
+    write is in flight at a time, so memory stays bounded by roughly two write batches.
+    With ``raw_vectors``, each embedding batch is stored as one contiguous float32 array and every
+    chunk keeps a row view of it instead of its own list of floats.
+
+    Returns:
+        Number of chunks written to the vector database.
+    """
+    insert_kwargs = {"batch_size": insert_batch_size} if insert_batch_size else {}
+    flush_size = insert_batch_size or batch_size
+    pending_insert = None
+    written = 0
+    buffer = []
+    for start in tqdm(range(0, len(chunks), batch_size), desc="Embedding chunks"):
+        batch = chunks[start : start + batch_size]
+        embeddings = embedding_model.embed_documents([c.text for c in batch])
+        if raw_vectors:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        for chunk, embedding in zip(batch, embeddings):
+            chunk.embedding = embedding
+        buffer.extend(batch)
+        if len(buffer) >= flush_size:
+            if pending_insert is not None:
+                written += _written_count(pending_insert.result(), pending_chunks)
+            pending_chunks = buffer
+            pending_insert = executor.submit(
+                vector_db.insert_data, collection=collection_name, chunks=pending_chunks, **insert_kwargs
+            )
+            buffer = []
+    if pending_insert is not None:
+        written += _written_count(pending_insert.result(), pending_chunks)
+    if buffer:
+        written += _written_count(
+            vector_db.insert_data(collection=collection_name, chunks=buffer, **insert_kwargs), buffer
+        )
+    return written
+
+
+def _check_written(written: int, chunks: List, collection_name: str):
+    """Raise if the vector database stored fewer chunks than were submitted."""
+    if written < len(chunks):
+        raise RuntimeError(
+            f"Only {written}/{len(chunks)} chunks were written to collection [{collection_name}]"
+        )
+
+
 def load_from_local_files(
     paths_or_directory: Union[str, List[str]],
     collection_name: str = None,
@@ -112,6 +178,9 @@ def load_from_local_files(
     chunk_size: int = 1500,
     chunk_overlap: int = 100,
     batch_size: int = 256,
+    insert_batch_size: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    raw_vectors: bool = False,
 ):
     """
     Load knowledge from local files or directories into the vector database with incremental update support.
@@ -129,9 +198,19 @@ def load_from_local_files(
         chunk_size: Size of each chunk in characters.
         chunk_overlap: Number of characters to overlap between chunks.
         batch_size: Number of chunks to process at once during embedding.
+        insert_batch_size: Number of chunks written to the vector database per insert call.
+            If None, the vector database's default is used.
+        executor: If given, writes to the vector database run on this executor and overlap
+            with embedding of the following batches.
+        raw_vectors: If True (and an executor is given), embeddings are kept as float32 numpy row
+            views instead of Python lists. Only use with vector databases that accept numpy vectors.
+
+    Returns:
+        Number of chunks written to the vector database.
 
     Raises:
         FileNotFoundError: If any of the specified paths do not exist.
+        RuntimeError: If the vector database did not store every chunk.
     """
     vector_db = configuration.vector_db
     if collection_name is None:
@@ -194,7 +273,18 @@ def load_from_local_files(
         
         if not chunks:
             log.color_print("✅ No new documents to process. Collection is up to date.")
-            return
+            return 0
+    
+    if executor is not None:
+        # 嵌入与写入交替重叠执行
+        log.color_print(f"Embedding and inserting {len(chunks)} chunks into collection [{collection_name}]...")
+        written = _embed_and_insert_overlapped(
+            embedding_model, vector_db, collection_name, chunks, batch_size, insert_batch_size, executor,
+            raw_vectors=raw_vectors,
+        )
+        _check_written(written, chunks, collection_name)
+        log.color_print(f"✅ Successfully loaded {len(chunks)} chunks into vector database!")
+        return written
     
     # 生成嵌入向量
     log.color_print(f"Generating embeddings for {len(chunks)} chunks...")
@@ -202,9 +292,14 @@ def load_from_local_files(
     
     # 插入数据
     log.color_print(f"Inserting {len(chunks)} chunks into collection [{collection_name}]...")
-    vector_db.insert_data(collection=collection_name, chunks=chunks)
+    insert_kwargs = {"batch_size": insert_batch_size} if insert_batch_size else {}
+    written = _written_count(
+        vector_db.insert_data(collection=collection_name, chunks=chunks, **insert_kwargs), chunks
+    )
+    _check_written(written, chunks, collection_name)
     
     log.color_print(f"✅ Successfully loaded {len(chunks)} chunks into vector database!")
+    return written
 
 
 def load_from_website(
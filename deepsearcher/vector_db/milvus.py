@@ -7,6 +7,12 @@ from deepsearcher.loader.splitter import Chunk
 from deepsearcher.utils import log
 from deepsearcher.vector_db.base import BaseVectorDB, CollectionInfo, RetrievalResult
 
+# Supported storage types for the embedding field: (Milvus field type, numpy dtype)
+VECTOR_DTYPES = {
+    "float32": (DataType.FLOAT_VECTOR, np.float32),
+    "float16": (DataType.FLOAT16_VECTOR, np.float16),
+}
+
 
 class Milvus(BaseVectorDB):
     """Milvus class is a subclass of DB class."""
@@ -22,6 +28,7 @@ class Milvus(BaseVectorDB):
         password: str = "",
         db: str = "default",
         hybrid: bool = False,
+        vector_dtype: str = "float32",
         **kwargs,
     ):
         """
@@ -35,8 +42,17 @@ class Milvus(BaseVectorDB):
             password (str, optional): Password for authentication. Defaults to "".
             db (str, optional): Database name. Defaults to "default".
             hybrid (bool, optional): Whether to enable hybrid search. Defaults to False.
+            vector_dtype (str, optional): Storage type of the embedding field, "float32" or "float16".
+                "float16" halves the bytes sent and stored per vector; vectors are converted on insert
+                and search. Existing collections keep the type they were created with. Defaults to "float32".
             **kwargs: Additional keyword arguments to pass to the MilvusClient.
         """
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(
+                f"Unsupported vector_dtype: {vector_dtype}, expected one of {list(VECTOR_DTYPES)}"
+            )
+        self.vector_dtype = vector_dtype
+        self._vector_field_type, self._vector_np_dtype = VECTOR_DTYPES[vector_dtype]
         super().__init__(default_collection)
         self.default_collection = default_collection
         self.client = MilvusClient(
@@ -88,7 +104,7 @@ class Milvus(BaseVectorDB):
                 enable_dynamic_field=False, auto_id=True, description=description
             )
             schema.add_field("id", DataType.INT64, is_primary=True)
-            schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=dim)
+            schema.add_field("embedding", self._vector_field_type, dim=dim)
 
             if self.hybrid:
                 analyzer_params = {"tokenizer": "standard", "filter": ["lowercase"]}
@@ -153,13 +169,20 @@ class Milvus(BaseVectorDB):
             batch_size (int, optional): Number of chunks to insert in each batch. Defaults to 256.
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            int: Number of chunks written.
+
+        Raises:
+            RuntimeError: If a batch fails to insert. Earlier batches remain stored; the
+                message reports how many chunks were written before the failure.
         """
         if not collection:
             collection = self.default_collection
         texts = [chunk.text for chunk in chunks]
         references = [chunk.reference for chunk in chunks]
         metadatas = [chunk.metadata for chunk in chunks]
-        embeddings = [chunk.embedding for chunk in chunks]
+        embeddings = [self._encode_vector(chunk.embedding) for chunk in chunks]
 
         datas = [
             {
@@ -173,11 +196,16 @@ class Milvus(BaseVectorDB):
             )
         ]
         batch_datas = [datas[i : i + batch_size] for i in range(0, len(datas), batch_size)]
+        inserted = 0
         try:
             for batch_data in batch_datas:
                 self.client.insert(collection_name=collection, data=batch_data)
+                inserted += len(batch_data)
         except Exception as e:
-            log.critical(f"fail to insert data, error info: {e}")
+            log.critical(
+                f"fail to insert data after {inserted}/{len(datas)} chunks were written, error info: {e}"
+            )
+        return inserted
 
     def search_data(
         self,
@@ -215,7 +243,7 @@ class Milvus(BaseVectorDB):
 
                 dense_search_params = {"metric_type": self.metric_type}
                 dense_request = AnnSearchRequest(
-                    [vector], "embedding", dense_search_params, limit=top_k
+                    [self._encode_vector(vector)], "embedding", dense_search_params, limit=top_k
                 )
 
                 search_results = self.client.hybrid_search(
@@ -229,7 +257,7 @@ class Milvus(BaseVectorDB):
             else:
                 search_results = self.client.search(
                     collection_name=collection,
-                    data=[vector],
+                    data=[self._encode_vector(vector)],
                     limit=top_k,
                     output_fields=["embedding", "text", "reference", "metadata"],
                     timeout=10,
@@ -237,7 +265,7 @@ class Milvus(BaseVectorDB):
 
             return [
                 RetrievalResult(
-                    embedding=b["entity"]["embedding"],
+                    embedding=self._decode_vector(b["entity"]["embedding"]),
                     text=b["entity"]["text"],
                     reference=b["entity"]["reference"],
                     score=b["distance"],
@@ -250,6 +278,20 @@ class Milvus(BaseVectorDB):
             log.critical(f"fail to search data, error info: {e}")
             return []
 
+    def _encode_vector(self, vector):
+        """Convert a vector to the storage type of the embedding field."""
+        if self._vector_np_dtype is np.float32:
+            return vector
+        return np.asarray(vector, dtype=self._vector_np_dtype)
+
+    def _decode_vector(self, vector):
+        """Convert a returned half-precision vector (raw bytes) back to float32."""
+        if isinstance(vector, list) and len(vector) == 1 and isinstance(vector[0], bytes):
+            vector = vector[0]
+        if isinstance(vector, bytes):
+            return np.frombuffer(vector, dtype=self._vector_np_dtype).astype(np.float32)
+        return vector
+
     def list_collections(self, *args, **kwargs) -> List[CollectionInfo]:
         """
         List all collections in the Milvus database.
@@ -272,7 +314,7 @@ class Milvus(BaseVectorDB):
                     for field_dict in description["fields"]:
                         if (
                             field_dict["name"] == "embedding"
-                            and field_dict["type"] == DataType.FLOAT_VECTOR
+                            and field_dict["type"] in (DataType.FLOAT_VECTOR, DataType.FLOAT16_VECTOR)
                         ):
                             if field_dict["params"]["dim"] != dim:
                                 skip = True
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代码语言检测
+纯字符串分类逻辑，不依赖其他模块；所有函数和常量都带有类型注解，
+可按需用mypyc单独编译为C扩展，未编译时作为普通Python模块使用
+"""
+
+import functools
+import json
+from typing import Any, Callable, FrozenSet, Optional, Tuple
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+    _json_loads: Callable[[str], Any] = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# 代码语言检测特征（均为小写，在小写代码中匹配），按优先级排列，靠前的语言先命中
+_LANGUAGE_INDICATORS: Tuple[Tuple[str, FrozenSet[str]], ...] = (
+    # ArkTS 装饰器、关键字和文件扩展名（优先级最高）
+    ("arkts", frozenset({
+        '@entry', '@component', '@state', '@prop', '@link', '@provide',
+        '@consume', '@objectlink', '@observed', '@watch', '@builder',
+        '@extend', '@styles', '@preview',
+        'struct', 'build()', 'abouttoappear', 'abouttodisappear',
+        'onpageshow', 'onpagehide', 'onbackpress', '.ets'})),
+    ("typescript", frozenset({
+        'interface ', 'type ', 'enum ', 'namespace ', 'declare ',
+        'import type', 'export type', 'as const', 'readonly ',
+        'keyof ', 'typeof ', 'extends ', 'implements '})),
+    ("javascript", frozenset({
+        'function ', 'var ', 'let ', 'const ', 'import ', 'export ',
+        'class ', 'extends ', 'super(', 'this.', 'prototype.',
+        'async ', 'await ', '=>', 'require(', 'module.exports'})),
+    ("java", frozenset({
+        'public class', 'private class', 'protected class', 'public static void main',
+        'package ', 'import java.', 'system.out.', 'public void ', 'private void ',
+        'protected void ', 'public int ', 'private int ', 'string[]', 'arraylist<'})),
+    ("python", frozenset({
+        'def ', 'class ', 'import ', 'from ', 'if __name__', 'print(',
+        'self.', 'elif ', 'with ', 'as ', 'lambda ', 'yield ', 'async def'})),
+    ("cpp", frozenset({
+        '#include', 'int main', 'std::', 'using namespace', 'cout <<',
+        'cin >>', 'endl', 'printf(', 'scanf(', 'malloc(', 'free('})),
+    ("vue", frozenset({
+        '<template>', '<script>', '<style>', 'export default', 'vue.',
+        'v-if', 'v-for', 'v-model', '@click', ':class', ':style'})),
+    ("html", frozenset({
+        '<!doctype', '<html', '<head>', '<body>', '<div', '<span',
+        '<p>', '<a href', '<img src', '<script src'})),
+)
+
+# 区分大小写的 TypeScript 泛型与类型注解特征（在原始代码中匹配）
+_TYPESCRIPT_GENERICS = frozenset({'<T>', '<T,', '<T extends', '<K,', '<V>', 'Array<', 'Promise<'})
+_TYPESCRIPT_ANNOTATIONS = frozenset({': string', ': number', ': boolean', ': object', ': any', ': void',
+                                     ': Array<', ': Promise<'})
+
+_CSS_INDICATORS = frozenset({'{', '}', ':', ';', 'px', 'em', 'rem', '%', 'color:', 'background:',
+                             'margin:', 'padding:', 'display:', 'position:', 'font-'})
+
+def _build_language_automaton() -> Any:
+    """将全部语言特征编译为一个Aho-Corasick自动机，一次扫描即可找出所有命中的特征"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for priority, (language, indicators) in enumerate(_LANGUAGE_INDICATORS):
+        for indicator in indicators:
+            # 同一特征属于多种语言时保留优先级最高的
+            if not automaton.exists(indicator):
+                automaton.add_word(indicator, (priority, language))
+    automaton.make_automaton()
+    return automaton
+
+_LANGUAGE_AUTOMATON: Any = _build_language_automaton()
+
+def _match_language_indicators(code_lower: str) -> Optional[str]:
+    """返回小写代码中命中特征的最高优先级语言，均未命中时返回None"""
+    if _LANGUAGE_AUTOMATON is not None:
+        best: Optional[Tuple[int, str]] = None
+        for _, (priority, language) in _LANGUAGE_AUTOMATON.iter(code_lower):
+            if best is None or priority < best[0]:
+                best = (priority, language)
+                if priority == 0:
+                    break
+        return best[1] if best else None
+    
+    # 未安装pyahocorasick时按优先级逐个语言扫描
+    for language, indicators in _LANGUAGE_INDICATORS:
+        if any(indicator in code_lower for indicator in indicators):
+            return language
+    return None
+
+# 代码语言检测只看代码开头部分：导入、装饰器和类声明通常都在文件开头
+LANGUAGE_DETECT_PREFIX = 4096
+
+def _is_json(code: str) -> bool:
+    """判断代码是否为完整的JSON对象（优先使用orjson解析）"""
+    stripped = code.strip()
+    if stripped[:1] != '{' or stripped[-1:] != '}':
+        return False
+    # 非空JSON对象必然包含冒号，不满足时无需解析
+    if ':' not in stripped and stripped[1:-1].strip():
+        return False
+    try:
+        _json_loads(stripped)
+        return True
+    except (ValueError, RecursionError):
+        return False
+
+@functools.lru_cache(maxsize=256)
+def _detect_code_language_cached(code: str) -> str:
+    """
+    检测代码语言，按代码内容缓存结果
+    同一段代码在代码检查和最终代码生成流程中会被重复检测
+    
+    Args:
+        code: 代码开头部分（最多LANGUAGE_DETECT_PREFIX个字符）
+        
+    Returns:
+        检测到的语言
+    """
+    code_lower = code.lower()
+    
+    # 一次扫描匹配全部语言特征，ArkTS 特征优先级最高；
+    # 行首语法模式（struct 组件定义、build()、@state/@prop）都包含 ArkTS 特征，无需再逐行检查
+    language = _match_language_indicators(code_lower)
+    if language == "arkts":
+        return "arkts"
+    
+    # TypeScript 检测
+    if language == "typescript":
+        return "typescript"
+    
+    if any(generic in code for generic in _TYPESCRIPT_GENERICS):
+        return "typescript"
+    
+    # 检查 TypeScript 类型注解
+    if ':' in code and any(pattern in code for pattern in _TYPESCRIPT_ANNOTATIONS):
+        return "typescript"
+    
+    # JavaScript / Java / Python / C++ / Vue / HTML 检测（类型注解已在上面判定为 TypeScript）
+    if language is not None:
+        return language
+    
+    # CSS 检测
+    if code.count('{') > 2 and code.count('}') > 2 and ':' in code and ';' in code:
+        if any(indicator in code_lower for indicator in _CSS_INDICATORS):
+            return "css"
+    
+    # JSON 检测
+    if _is_json(code):
+        return "json"
+    
+    # 默认返回 unknown
+    return "unknown"
+
+
+def detect_code_language(code: str) -> str:
+    """
+    检测代码语言（增强ArkTS识别能力）
+    
+    Args:
+        code: 代码字符串
+        
+    Returns:
+        检测到的语言，无法识别时返回 "unknown"
+    """
+    language = _detect_code_language_cached(code[:LANGUAGE_DETECT_PREFIX])
+    # JSON 需要完整解析，被截断的长代码再对全文做一次 JSON 检测
+    if language == "unknown" and len(code) > LANGUAGE_DETECT_PREFIX and _is_json(code):
+        return "json"
+    return language
@@ -5,6 +5,7 @@
 """
 
 import os
+import types
 from typing import Dict, List, Any
 from pathlib import Path
 
@@ -17,6 +18,8 @@ class CrawlerConfig:
     DATA_DIR = Path("data")
     RAW_DATA_DIR = DATA_DIR / "raw"
     PROCESSED_DATA_DIR = DATA_DIR / "processed"
+    # 已入库文本哈希，重新加载时跳过重复内容
+    CHUNK_HASH_DIR = PROCESSED_DATA_DIR / "chunk_hashes"
     
     # 爬取控制
     MAX_CONCURRENT = 3
@@ -27,26 +30,26 @@ class CrawlerConfig:
     WAIT_FOR_SELECTOR_TIMEOUT = 5000
     WAIT_FOR_CONTENT_TIMEOUT = 3000
     
-    # 内容选择器
-    CONTENT_SELECTORS = [
+    # 内容选择器（静态配置使用不可变类型，可安全共享）
+    CONTENT_SELECTORS = (
         '.doc-content', '.content', '.main-content', '.article-content',
         '#main-content', '.documentation', '.doc-body', 'main',
         '.markdown-body', '.content-wrapper', '.page-content'
-    ]
+    )
     
     # 代码选择器
-    CODE_SELECTORS = [
+    CODE_SELECTORS = (
         'pre code', 'pre', '.highlight code', '.code-block',
         '.language-java', '.language-javascript', '.language-python',
         '.language-xml', '.language-json', '.language-kotlin',
         'code[class*="language-"]', '.hljs', '.codehilite'
-    ]
+    )
     
     # 文本元素
-    TEXT_ELEMENTS = [
+    TEXT_ELEMENTS = (
         'p', 'div', 'span', 'li', 'td', 'th', 
         'h1', 'h2', 'h3', 'h4', 'h5', 'h6'
-    ]
+    )
     
     # 过滤配置
     MIN_TEXT_LENGTH = 10
@@ -54,18 +57,18 @@ class CrawlerConfig:
     MIN_CONTENT_LENGTH = 100
     
     # 浏览器配置
-    BROWSER_ARGS = [
+    BROWSER_ARGS = (
         '--no-sandbox',
         '--disable-dev-shm-usage',
         '--disable-blink-features=AutomationControlled'
-    ]
+    )
     
     USER_AGENT = (
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
         '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     )
     
-    VIEWPORT = {'width': 1920, 'height': 1080}
+    VIEWPORT = types.MappingProxyType({'width': 1920, 'height': 1080})
     
     # 重试配置
     MAX_RETRIES = 3
@@ -114,21 +117,46 @@ class RAGConfig:
     DEFAULT_CHUNK_OVERLAP = 100
     DEFAULT_COLLECTION_NAME = "huawei_docs"
     
+    # 向量化批大小：嵌入模型推理与向量数据库写入分别设置
+    DEFAULT_EMBED_BATCH_SIZE = 64
+    DEFAULT_UPSERT_BATCH_SIZE = 2000
+    
     # 搜索配置
     DEFAULT_SEARCH_TOP_K = 5
     DEFAULT_SEARCH_THRESHOLD = 0.7
+    # 搜索结果中信息源预览的最大字符数
+    SOURCE_PREVIEW_LENGTH = 200
+    
+    # 集合信息缓存时间（秒）
+    COLLECTION_INFO_TTL = 30.0
+    # 流水线状态缓存时间（秒），避免频繁轮询时反复访问文件系统和向量数据库
+    STATUS_TTL = 2.0
+    
+    # 在线搜索持久化缓存
+    ONLINE_CACHE_DIR = Path.home() / ".huawei_rag" / "cache"
+    ONLINE_CACHE_TTL = 86400
+    # 在线搜索缓存值的总字节数上限
+    ONLINE_CACHE_SIZE_LIMIT = 1 << 30
+    # 每个嵌入模型的int8向量存储行数上限，超出后轮换文件（1024维约占1GB）
+    EMBEDDING_STORE_MAX_ROWS = 1_000_000
+    
+    # 代码生成/检查LLM响应持久化缓存（键包含模型名称，更换模型后自动失效）
+    LLM_CACHE_DIR = Path.home() / ".huawei_rag" / "llm_cache"
+    LLM_CACHE_TTL = 7 * 86400
+    # LLM响应缓存值的总字节数上限，超出后按写入顺序淘汰最早的响应
+    LLM_CACHE_SIZE_LIMIT = 2 << 30
 
 
 # 页面类型特殊配置（简化版）
 PAGE_TYPE_CONFIGS = {
     'api_docs': {
-        'selectors': ['.api-content', '.method-details'],
-        'code_selectors': ['.api-example', '.code-sample'],
+        'selectors': ('.api-content', '.method-details'),
+        'code_selectors': ('.api-example', '.code-sample'),
         'wait_time': 4000
     },
     'tutorial': {
-        'selectors': ['.tutorial-content', '.guide-content'],
-        'code_selectors': ['.tutorial-code', '.example-code'],
+        'selectors': ('.tutorial-content', '.guide-content'),
+        'code_selectors': ('.tutorial-code', '.example-code'),
         'wait_time': 3000
     }
 } 
\ No newline at end of file
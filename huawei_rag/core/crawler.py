@@ -11,7 +11,7 @@ import os
 import time
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Callable, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from playwright.async_api import async_playwright, Page, Browser
 
@@ -40,6 +40,20 @@ class PageContent:
         if not self.crawl_time:
             self.crawl_time = datetime.now().isoformat()
         self.content_length = len(self.text_content)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PageContent':
+        """从已保存的字典恢复，直接赋值字段，不重新执行 __post_init__"""
+        obj = cls.__new__(cls)
+        obj.url = data['url']
+        obj.title = data['title']
+        obj.text_content = data.get('text_content', '')
+        obj.code_blocks = data.get('code_blocks') or []
+        obj.metadata = data.get('metadata') or {}
+        obj.crawl_time = data.get('crawl_time', '')
+        obj.page_type = data.get('page_type', 'unknown')
+        obj.content_length = data.get('content_length', len(obj.text_content))
+        return obj
 
 
 class ContentExtractionResult:
@@ -148,10 +162,10 @@ class HuaweiContentCrawler:
         return config
     
     async def setup_page(self, browser: Browser) -> Page:
-        """设置页面"""
+        """在独立的浏览器上下文中创建页面（关闭 page.context 即同时释放上下文和页面）"""
         context = await browser.new_context(
             user_agent=self.config.USER_AGENT,
-            viewport=self.config.VIEWPORT
+            viewport=dict(self.config.VIEWPORT)
         )
         
         page = await context.new_page()
@@ -192,7 +206,7 @@ class HuaweiContentCrawler:
                     }};
                     
                     // 查找主要内容容器
-                    const contentSelectors = {page_config['selectors']};
+                    const contentSelectors = {json.dumps(list(page_config['selectors']))};
                     let contentContainer = document.body;
                     
                     for (const selector of contentSelectors) {{
@@ -204,7 +218,7 @@ class HuaweiContentCrawler:
                     }}
                     
                     // 提取文本内容
-                    const textElements = {self.config.TEXT_ELEMENTS};
+                    const textElements = {json.dumps(list(self.config.TEXT_ELEMENTS))};
                     const textParts = [];
                     
                     textElements.forEach(tagName => {{
@@ -220,7 +234,7 @@ class HuaweiContentCrawler:
                     result.text_content = textParts.join('\\n\\n');
                     
                     // 提取代码块
-                    const codeSelectors = {page_config['code_selectors']};
+                    const codeSelectors = {json.dumps(list(page_config['code_selectors']))};
                     let codeIndex = 0;
                     
                     codeSelectors.forEach(selector => {{
@@ -330,11 +344,20 @@ class HuaweiContentCrawler:
         
         return None
     
-    async def crawl_content(self, urls: List[Dict]) -> Dict[str, PageContent]:
-        """批量爬取页面内容"""
+    async def crawl_content(self, 
+                            urls: List[Dict],
+                            on_page: Optional[Callable[[str, PageContent], Awaitable[None]]] = None
+                            ) -> Dict[str, PageContent]:
+        """
+        批量爬取页面内容
+        
+        Args:
+            urls: 待爬取的链接列表
+            on_page: 每成功爬取一个新页面时等待执行的回调，用于把页面交给下游处理阶段
+        """
         logger.info(f"开始爬取 {len(urls)} 个页面的内容")
         
-        self.load_existing_content()
+        await self.load_existing_content()
         
         # 过滤已爬取的URL
         urls_to_crawl = [url_info for url_info in urls 
@@ -353,32 +376,51 @@ class HuaweiContentCrawler:
         async with async_playwright() as playwright:
             browser = await playwright.chromium.launch(
                 headless=True,
-                args=self.config.BROWSER_ARGS
+                args=list(self.config.BROWSER_ARGS)
             )
             
             try:
-                semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT)
+                # 工作池：MAX_CONCURRENT 个常驻worker从队列取URL，每个worker独占一个浏览器上下文和页面，
+                # 依次在同一页面中导航，页面意外关闭时在该上下文中重新创建
+                queue: asyncio.Queue = asyncio.Queue()
+                for url_info in urls_to_crawl:
+                    queue.put_nowait(url_info)
                 
-                async def crawl_single_page(url_info: Dict):
-                    async with semaphore:
-                        if self.should_skip_url(url_info['url']):
-                            return
-                        
-                        page = await self.setup_page(browser)
-                        try:
-                            content = await self.crawl_with_retry(page, url_info)
-                            if content:
-                                self.crawled_content[url_info['url']] = content
-                                await self.incremental_save()
+                async def worker():
+                    page = await self.setup_page(browser)
+                    context = page.context
+                    try:
+                        while True:
+                            try:
+                                url_info = queue.get_nowait()
+                            except asyncio.QueueEmpty:
+                                return
                             
-                            await asyncio.sleep(self.config.DELAY_SECONDS)
-                            
-                        finally:
-                            await page.close()
+                            try:
+                                if self.should_skip_url(url_info['url']):
+                                    continue
+                                
+                                if page.is_closed():
+                                    page = await context.new_page()
+                                content = await self.crawl_with_retry(page, url_info)
+                                if content:
+                                    self.crawled_content[url_info['url']] = content
+                                    await self.incremental_save()
+                                    if on_page is not None:
+                                        await on_page(url_info['url'], content)
+                                
+                                await asyncio.sleep(self.config.DELAY_SECONDS)
+                            except Exception as e:
+                                logger.error(f"❌ 爬取页面异常 {url_info['url']}: {e}")
+                            finally:
+                                queue.task_done()
+                    finally:
+                        await context.close()
                 
                 # 并发爬取
-                tasks = [crawl_single_page(url_info) for url_info in urls_to_crawl]
-                await asyncio.gather(*tasks, return_exceptions=True)
+                worker_count = min(self.config.MAX_CONCURRENT, len(urls_to_crawl))
+                workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+                await asyncio.gather(*workers, return_exceptions=True)
                 
                 # 最终保存
                 await self.incremental_save(force=True)
@@ -433,8 +475,8 @@ class HuaweiContentCrawler:
             except Exception as e:
                 logger.error(f"❌ 增量保存失败: {e}")
     
-    def load_existing_content(self):
-        """加载已存在的内容"""
+    async def load_existing_content(self):
+        """加载已存在的内容（文件读取与解析在线程中执行，不阻塞事件循环）"""
         output_path = self.config.PROCESSED_DATA_DIR / self.config.OUTPUT_FILE
         
         if not output_path.exists():
@@ -442,20 +484,12 @@ class HuaweiContentCrawler:
             return
         
         try:
-            with open(output_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
+            existing_data = await asyncio.to_thread(
+                lambda: json.loads(output_path.read_bytes())
+            )
             
             for url, data in existing_data.items():
-                self.crawled_content[url] = PageContent(
-                    url=data['url'],
-                    title=data['title'],
-                    text_content=data.get('text_content', ''),
-                    code_blocks=data.get('code_blocks', []),
-                    metadata=data.get('metadata', {}),
-                    crawl_time=data.get('crawl_time', ''),
-                    page_type=data.get('page_type', 'unknown'),
-                    content_length=data.get('content_length', 0)
-                )
+                self.crawled_content[url] = PageContent.from_dict(data)
             
             logger.info(f"📂 加载现有内容: {len(self.crawled_content)} 个页面已存在")
             self.last_save_count = len(self.crawled_content)
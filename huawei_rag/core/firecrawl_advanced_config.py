@@ -3,149 +3,272 @@ FireCrawl高级配置 - 充分利用Firecrawl的强大功能
 专门针对华为文档优化
 """
 
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from firecrawl import FirecrawlApp, ScrapeOptions
-from typing import Dict, List, Any
+from firecrawl.firecrawl import ScrapeResponse
+from typing import Dict, Iterator, List, Any, Mapping
+from urllib.parse import urldefrag, urlparse
+import asyncio
+import functools
+import heapq
+import importlib.util
+import inspect
+import json
 import logging
+import random
+import time
+import types
+
+import httpx
+import requests
 
 logger = logging.getLogger(__name__)
 
+# 页面等待时间（毫秒）：默认短等待，内容选择器未出现时才使用上限
+HUAWEI_WAIT_FOR_MS = 800
+HUAWEI_MAX_WAIT_FOR_MS = 3000
+# 华为文档主体内容选择器，用于按选择器等待而非固定时长
+HUAWEI_CONTENT_SELECTOR = '.doc-content'
+# 超时配置（毫秒）：默认值面向普通文档页，上限用于按观测延迟自适应时的封顶
+DEFAULT_SCRAPE_TIMEOUT_MS = 20000
+MAX_SCRAPE_TIMEOUT_MS = 45000
+DEFAULT_SEARCH_TIMEOUT_MS = 30000
+# 等待上限重试时，超时在等待时间之外至少预留的加载/提取时间（毫秒）
+WAIT_RETRY_TIMEOUT_MARGIN_MS = 5000
+# 每个主机保留的最近响应时间样本数（用于估计P95）
+LATENCY_SAMPLE_SIZE = 50
+# 仅在“展开内容”按钮存在时点击
+_EXPAND_CONTENT_SCRIPT = "document.querySelector('.expand-content')?.click();"
+# 批量爬取时每个Firecrawl任务包含的URL数，以及同时提交的批量任务数上限
+BATCH_SCRAPE_SIZE = 20
+BATCH_SCRAPE_MAX_WORKERS = 4
+
+
+def _merge_selectors(*groups) -> tuple:
+    """合并多组标签/CSS选择器，保持顺序并去掉重复项（Firecrawl的includeTags/excludeTags同时接受二者）"""
+    return tuple(dict.fromkeys(selector for group in groups for selector in group))
+
+
+# 可重试的HTTP状态码（限流与网关/服务暂不可用）
+_RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """判断是否为值得重试的瞬时错误：超时、连接错误或429/5xx网关错误"""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                          httpx.TimeoutException, httpx.TransportError)):
+        return True
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) in _RETRYABLE_STATUS
+
+
+def retry_transient(func=None, *, max_attempts: int = 3, initial_wait: float = 0.5,
+                    max_wait: float = 4.0):
+    """
+    瞬时错误重试装饰器（指数退避 + 抖动），其他错误直接抛出
+    
+    可直接装饰函数，也可包装调用：retry_transient(self.app.scrape_url)(url=url)
+    """
+    def backoff(attempt: int) -> float:
+        return min(max_wait, initial_wait * 2 ** attempt) * random.uniform(0.5, 1.0)
+    
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                for attempt in range(max_attempts):
+                    try:
+                        return await fn(*args, **kwargs)
+                    except Exception as e:
+                        if attempt == max_attempts - 1 or not _is_transient_error(e):
+                            raise
+                        logger.warning(f"🔄 第 {attempt + 1} 次请求失败，准备重试: {e}")
+                        await asyncio.sleep(backoff(attempt))
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if attempt == max_attempts - 1 or not _is_transient_error(e):
+                        raise
+                    logger.warning(f"🔄 第 {attempt + 1} 次请求失败，准备重试: {e}")
+                    time.sleep(backoff(attempt))
+        return wrapper
+    
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def _canonical_url(item: Any) -> str:
+    """搜索结果的规范化URL（去掉片段和末尾斜杠），用于去重"""
+    url = item.get('url') if isinstance(item, dict) else getattr(item, 'url', None)
+    if not url:
+        return ''
+    return urldefrag(url)[0].rstrip('/')
+
+
+def _iter_unique(items: List[Any], seen: set) -> Iterator[Any]:
+    """只产出URL未出现过的结果（无URL的结果原样保留）"""
+    for item in items:
+        url = _canonical_url(item)
+        if url:
+            if url in seen:
+                continue
+            seen.add(url)
+        yield item
+
+
+# 预先合并的标签与CSS选择器（导入时计算一次）
+_HUAWEI_INCLUDE_TAGS = _merge_selectors(
+    ('article', 'main', 'section', 'div.content', 'div.doc-content'),
+    ('.doc-content', '.article-content', '.guide-content', '.api-doc', 'main', '[role="main"]')
+)
+_HUAWEI_EXCLUDE_TAGS = _merge_selectors(
+    ('nav', 'footer', 'aside', 'header', '.sidebar', '.advertisement'),
+    ('.sidebar', '.navigation', '.breadcrumb', '.footer', '.header', '.advertisement',
+     '.related-links')
+)
+_CRAWL_INCLUDE_TAGS = ('.doc-content', '.guide-content', '.api-reference', 'article', 'main')
+_CRAWL_EXCLUDE_TAGS = ('.sidebar', '.toc', '.breadcrumb', '.footer', '.header')
+_SEARCH_INCLUDE_TAGS = _merge_selectors(
+    ('article', 'main', 'section', '.content'),
+    ('.doc-content', '.developer-content', '.guide-section', 'main', '[role="main"]')
+)
+
 class AdvancedFirecrawlConfig:
-    """FireCrawl高级配置类"""
+    """FireCrawl高级配置类
+    
+    所有配置都是静态的，工厂方法的结果会被缓存复用；字典配置以只读映射返回。
+    """
     
     @staticmethod
-    def get_huawei_optimized_scrape_options() -> ScrapeOptions:
+    @functools.lru_cache(maxsize=None)
+    def get_huawei_optimized_scrape_options(with_screenshot: bool = False,
+                                            wait_ms: int = HUAWEI_WAIT_FOR_MS,
+                                            timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> ScrapeOptions:
         """
         获取针对华为网站优化的爬取选项
         
+        Args:
+            with_screenshot: 是否额外输出html和截图（代价高，仅在确实需要时开启）
+            wait_ms: 页面加载后的等待时间（毫秒）
+            timeout_ms: 单页爬取超时（毫秒）
+        
         Returns:
             优化的ScrapeOptions配置
         """
+        formats = ['markdown', 'links']
+        if with_screenshot:
+            formats += ['html', 'screenshot']
+        
         return ScrapeOptions(
-            formats=['markdown', 'html', 'links', 'screenshot'],  # 多格式输出
-            only_main_content=True,  # 只提取主要内容
-            wait_for=3000,  # 等待3秒确保内容加载完成
-            timeout=45000,  # 45秒超时
-            
-            # 高级选项
-            include_tags=['article', 'main', 'section', 'div.content', 'div.doc-content'],
-            exclude_tags=['nav', 'footer', 'aside', 'header', '.sidebar', '.advertisement'],
+            formats=formats,
+            onlyMainContent=True,  # 只提取主要内容
+            waitFor=wait_ms,
+            timeout=timeout_ms,
             
-            # 移除不需要的元素
-            remove_tags=['script', 'style', 'noscript', 'iframe'],
-            
-            # 华为网站特定的CSS选择器
-            include_selectors=[
-                '.doc-content',
-                '.article-content', 
-                '.guide-content',
-                '.api-doc',
-                'main',
-                '[role="main"]'
-            ],
-            
-            exclude_selectors=[
-                '.sidebar',
-                '.navigation',
-                '.breadcrumb',
-                '.footer',
-                '.header',
-                '.advertisement',
-                '.related-links'
-            ]
+            # 高级选项：标签与华为网站特定的CSS选择器（预先合并，已去重）
+            includeTags=list(_HUAWEI_INCLUDE_TAGS),
+            excludeTags=list(_HUAWEI_EXCLUDE_TAGS)
         )
     
     @staticmethod
-    def get_general_optimized_scrape_options() -> ScrapeOptions:
+    @functools.lru_cache(maxsize=None)
+    def get_general_optimized_scrape_options(timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> ScrapeOptions:
         """
         获取通用网站的优化爬取选项
         
+        Args:
+            timeout_ms: 单页爬取超时（毫秒）
+        
         Returns:
             通用优化的ScrapeOptions配置
         """
         return ScrapeOptions(
             formats=['markdown', 'links'],  # 减少格式以提高速度
-            only_main_content=True,
-            wait_for=2000,
-            timeout=30000,
+            onlyMainContent=True,
+            waitFor=2000,
+            timeout=timeout_ms,
             
             # 通用内容选择器
-            include_tags=['article', 'main', 'section'],
-            exclude_tags=['nav', 'footer', 'aside', 'header'],
-            remove_tags=['script', 'style', 'noscript']
+            includeTags=['article', 'main', 'section'],
+            excludeTags=['nav', 'footer', 'aside', 'header']
         )
     
     @staticmethod
-    def get_crawl_options_for_huawei_docs() -> Dict[str, Any]:
+    @functools.lru_cache(maxsize=None)
+    def get_crawl_options_for_huawei_docs(limit: int = 50,
+                                          poll_interval: float = None,
+                                          timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> Mapping[str, Any]:
         """
         获取华为文档站点的爬取选项
         
+        Args:
+            limit: 最多爬取的页面数
+            poll_interval: 爬取状态轮询间隔（秒），为None时按爬取规模在0.5~3秒之间取值
+            timeout_ms: 单页爬取超时（毫秒）
+        
         Returns:
-            爬取配置字典
+            爬取配置（只读映射）
         """
-        return {
-            'limit': 50,  # 最多爬取50个页面
+        if poll_interval is None:
+            # 小规模爬取很快完成，频繁轮询；大规模爬取放宽间隔避免过度轮询
+            poll_interval = max(0.5, min(3.0, limit * 0.05))
+        
+        return types.MappingProxyType({
+            'limit': limit,
             'max_depth': 3,  # 最大深度3层
             'allow_backward_links': False,  # 不允许向上爬取
             'scrape_options': ScrapeOptions(
                 formats=['markdown', 'links'],
-                only_main_content=True,
-                wait_for=2000,
-                timeout=35000,
+                onlyMainContent=True,
+                waitFor=2000,
+                timeout=timeout_ms,
                 
                 # 华为文档特定优化
-                include_selectors=[
-                    '.doc-content',
-                    '.guide-content', 
-                    '.api-reference',
-                    'article',
-                    'main'
-                ],
-                
-                exclude_selectors=[
-                    '.sidebar',
-                    '.toc',
-                    '.breadcrumb',
-                    '.footer',
-                    '.header'
-                ]
+                includeTags=list(_CRAWL_INCLUDE_TAGS),
+                excludeTags=list(_CRAWL_EXCLUDE_TAGS)
             ),
-            'poll_interval': 3  # 每3秒检查一次爬取状态
-        }
+            'poll_interval': poll_interval
+        })
     
     @staticmethod
-    def get_search_options_for_huawei() -> Dict[str, Any]:
+    @functools.lru_cache(maxsize=None)
+    def get_search_options_for_huawei(timeout_ms: int = DEFAULT_SEARCH_TIMEOUT_MS,
+                                      scrape_timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> Mapping[str, Any]:
         """
         获取华为相关搜索的优化选项
         
+        Args:
+            timeout_ms: 搜索请求超时（毫秒）
+            scrape_timeout_ms: 搜索结果页爬取超时（毫秒）
+        
         Returns:
-            搜索配置字典
+            搜索配置（只读映射）
         """
-        return {
+        return types.MappingProxyType({
             'limit': 10,
             'location': 'China',  # 中国地区优化
             'tbs': None,  # 不限制时间
-            'timeout': 60000,  # 60秒超时
+            'timeout': timeout_ms,
             'ignore_invalid_urls': True,  # 忽略无效URL
             'scrape_options': ScrapeOptions(
                 formats=['markdown', 'links'],
-                only_main_content=True,
-                wait_for=2500,
-                timeout=40000,
+                onlyMainContent=True,
+                waitFor=2500,
+                timeout=scrape_timeout_ms,
                 
                 # 针对搜索结果页面的优化
-                include_tags=['article', 'main', 'section', '.content'],
-                exclude_tags=['nav', 'footer', 'aside', '.sidebar'],
-                
-                # 华为相关内容的特殊处理
-                include_selectors=[
-                    '.doc-content',
-                    '.developer-content',
-                    '.guide-section',
-                    'main',
-                    '[role="main"]'
-                ]
+                includeTags=list(_SEARCH_INCLUDE_TAGS),
+                # 华为相关内容的特殊处理已合并进includeTags
+                excludeTags=['nav', 'footer', 'aside', '.sidebar']
             )
-        }
+        })
     
     @staticmethod
     def get_actions_for_dynamic_content() -> List[Dict[str, Any]]:
@@ -157,11 +280,11 @@ class AdvancedFirecrawlConfig:
             动作序列列表
         """
         return [
-            {"type": "wait", "milliseconds": 3000},  # 等待页面加载
+            {"type": "wait", "selector": HUAWEI_CONTENT_SELECTOR},  # 主体内容出现即继续
             {"type": "scroll", "direction": "down", "amount": 3},  # 向下滚动触发懒加载
-            {"type": "wait", "milliseconds": 2000},  # 等待内容加载
-            {"type": "click", "selector": ".expand-content", "optional": True},  # 展开内容（如果存在）
-            {"type": "wait", "milliseconds": 1000},
+            # 展开内容：元素不存在时脚本直接跳过，不产生远端探测失败
+            {"type": "executeJavascript", "script": _EXPAND_CONTENT_SCRIPT},
+            {"type": "wait", "milliseconds": 500},  # 等待展开/懒加载内容渲染
             {"type": "scrape"}  # 执行爬取
         ]
     
@@ -191,9 +314,10 @@ class AdvancedFirecrawlConfig:
         }
     
     @staticmethod
+    @functools.lru_cache(maxsize=4)
     def create_advanced_firecrawl_app(api_key: str) -> FirecrawlApp:
         """
-        创建配置优化的FireCrawl应用实例
+        创建配置优化的FireCrawl应用实例（按api_key缓存，多个爬虫实例共享同一个应用）
         
         Args:
             api_key: FireCrawl API密钥
@@ -209,23 +333,202 @@ class AdvancedFirecrawlConfig:
             logger.error(f"❌ FireCrawl应用实例创建失败: {e}")
             raise
 
+def _scrape_sdk_kwargs(options: ScrapeOptions) -> Dict[str, Any]:
+    """将ScrapeOptions转换为SDK scrape_url/batch_scrape_urls 接受的snake_case关键字参数（省略未设置项）"""
+    kwargs = {
+        'formats': options.formats,
+        'only_main_content': options.onlyMainContent,
+        'wait_for': options.waitFor,
+        'timeout': options.timeout,
+        'include_tags': options.includeTags,
+        'exclude_tags': options.excludeTags,
+    }
+    return {name: value for name, value in kwargs.items() if value is not None}
+
+
+# 预先计算的华为页面爬取参数，避免每次请求重复构建
+@functools.lru_cache(maxsize=None)
+def _huawei_scrape_kwargs(wait_ms: int = HUAWEI_WAIT_FOR_MS,
+                          timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> Mapping[str, Any]:
+    """华为页面爬取参数，转换为SDK scrape_url/batch_scrape_urls 接受的snake_case关键字参数"""
+    options = AdvancedFirecrawlConfig.get_huawei_optimized_scrape_options(
+        with_screenshot=False, wait_ms=wait_ms, timeout_ms=timeout_ms
+    )
+    return types.MappingProxyType(_scrape_sdk_kwargs(options))
+
+
+@functools.lru_cache(maxsize=None)
+def _scrape_body_prefix(wait_ms: int = HUAWEI_WAIT_FOR_MS,
+                        timeout_ms: int = DEFAULT_SCRAPE_TIMEOUT_MS) -> bytes:
+    """预先序列化的 /v1/scrape 请求体（不含url和结尾的 '}'），每次请求只需拼接url"""
+    options = AdvancedFirecrawlConfig.get_huawei_optimized_scrape_options(
+        with_screenshot=False, wait_ms=wait_ms, timeout_ms=timeout_ms
+    )
+    body = json.dumps(options.model_dump(by_alias=True, exclude_none=True), ensure_ascii=False)
+    return (body[:-1] + (',' if body != '{}' else '')).encode('utf-8')
+
+
+_HUAWEI_SCRAPE_DUMP = _huawei_scrape_kwargs()
+
+# 直接调用REST接口时共享的keep-alive连接池
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32))
+_HTTP_SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+
+def _build_search_payload(search_options: Mapping[str, Any]) -> Dict[str, Any]:
+    """将搜索选项转换为Firecrawl /v1/search 接口的请求体（不含query）"""
+    payload = {
+        'limit': search_options.get('limit'),
+        'location': search_options.get('location'),
+        'tbs': search_options.get('tbs'),
+        'timeout': search_options.get('timeout'),
+        'ignoreInvalidURLs': search_options.get('ignore_invalid_urls'),
+    }
+    scrape_options = search_options.get('scrape_options')
+    if scrape_options is not None:
+        payload['scrapeOptions'] = scrape_options.model_dump(by_alias=True, exclude_none=True)
+    return {k: v for k, v in payload.items() if v is not None}
+
+
+# SDK search() 接受的参数：SDK会拒绝未知参数，ignore_invalid_urls 只能通过REST请求体发送
+_SDK_SEARCH_PARAMS = ('limit', 'tbs', 'location', 'timeout', 'scrape_options')
+
+
+def _search_sdk_kwargs(search_options: Mapping[str, Any]) -> Dict[str, Any]:
+    """将搜索选项转换为SDK search() 的参数（不含query）"""
+    return {
+        name: search_options[name]
+        for name in _SDK_SEARCH_PARAMS
+        if search_options.get(name) is not None
+    }
+
+
+# 预先构建的华为搜索请求体，异步搜索时只需补充query
+_HUAWEI_SEARCH_PAYLOAD = types.MappingProxyType(
+    _build_search_payload(AdvancedFirecrawlConfig.get_search_options_for_huawei())
+)
+
+
 # 使用示例
 class HuaweiDocumentCrawler:
     """华为文档专用爬虫"""
     
+    __slots__ = ('app', '_async_client', '_host_latencies')
+    
     def __init__(self, api_key: str):
         self.app = AdvancedFirecrawlConfig.create_advanced_firecrawl_app(api_key)
-        self.config = AdvancedFirecrawlConfig()
+        # 异步搜索共享的连接池，在对象生命周期内复用keep-alive连接
+        self._async_client = None
+        # 每个主机最近的成功爬取耗时（毫秒），用于自适应超时
+        self._host_latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLE_SIZE))
+    
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """延迟创建的异步HTTP客户端（安装h2时启用HTTP/2）"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.app.api_url,
+                headers={"Authorization": f"Bearer {self.app.api_key}"},
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_keepalive_connections=8),
+                timeout=_HUAWEI_SEARCH_PAYLOAD.get('timeout', DEFAULT_SEARCH_TIMEOUT_MS) / 1000
+            )
+        return self._async_client
+    
+    async def aclose(self):
+        """关闭异步HTTP客户端"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
+    @staticmethod
+    def _build_optimized_queries(query: str) -> List[str]:
+        """生成华为相关的优化搜索查询：一个合并站点限定查询 + 一个关键词查询"""
+        return [
+            f"{query} (site:developer.huawei.com OR site:developer.harmonyos.com)",
+            f"华为 HMS {query}"
+        ]
+    
+    @staticmethod
+    def _build_fallback_queries(query: str) -> List[str]:
+        """合并查询结果不足时使用的逐站点查询"""
+        return [
+            f"{query} site:developer.huawei.com",
+            f"{query} site:developer.harmonyos.com",
+            f"华为 {query}",
+            f"HMS {query}"
+        ]
     
-    def scrape_huawei_doc_page(self, url: str):
-        """爬取华为文档页面"""
+    def _adaptive_timeout_ms(self, host: str) -> int:
+        """根据该主机已观测到的P95响应时间估算超时：P95的2倍，封顶MAX_SCRAPE_TIMEOUT_MS"""
+        samples = self._host_latencies.get(host)
+        if not samples:
+            return DEFAULT_SCRAPE_TIMEOUT_MS
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        # 按秒取整，限制缓存的参数组合数量
+        timeout_ms = -(-int(p95 * 2) // 1000) * 1000
+        return min(MAX_SCRAPE_TIMEOUT_MS, timeout_ms)
+    
+    def _post_scrape(self, url: str, wait_ms: int, timeout_ms: int) -> ScrapeResponse:
+        """使用预序列化的请求体直接调用 /v1/scrape，跳过SDK的逐次参数校验与序列化"""
+        body = (_scrape_body_prefix(wait_ms, timeout_ms)
+                + b'"url":' + json.dumps(url, ensure_ascii=False).encode('utf-8') + b'}')
+        response = _HTTP_SESSION.post(
+            f"{self.app.api_url}/v1/scrape",
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.app.api_key}"
+            },
+            timeout=timeout_ms / 1000 + 5
+        )
+        response.raise_for_status()
+        response_json = response.json()
+        if not response_json.get('success') or 'data' not in response_json:
+            raise RuntimeError(f"爬取失败: {response_json.get('error', response_json)}")
+        return ScrapeResponse(**response_json['data'])
+    
+    def _scrape_page(self, url: str, wait_ms: int, timeout_ms: int):
+        """
+        优先走预序列化的直连请求，重试后仍因传输错误或瞬时状态码（429/5xx网关）失败时回退到SDK；
+        401/402/404等非瞬时错误直接抛出，避免重复发送注定失败或重复计费的请求
+        """
         try:
-            scrape_options = self.config.get_huawei_optimized_scrape_options()
-            
-            result = self.app.scrape_url(
+            return retry_transient(self._post_scrape)(url, wait_ms, timeout_ms)
+        except Exception as e:
+            if not _is_transient_error(e):
+                raise
+            logger.debug(f"直连爬取失败，回退到SDK: {e}")
+            return retry_transient(self.app.scrape_url)(
                 url=url,
-                **scrape_options.model_dump()
+                **_huawei_scrape_kwargs(wait_ms=wait_ms, timeout_ms=timeout_ms)
             )
+    
+    def scrape_huawei_doc_page(self, url: str, timeout_ms: int = None):
+        """
+        爬取华为文档页面
+        
+        Args:
+            url: 页面URL
+            timeout_ms: 超时（毫秒），为None时根据该主机的历史响应时间自适应
+        """
+        try:
+            host = urlparse(url).netloc
+            if timeout_ms is None:
+                timeout_ms = self._adaptive_timeout_ms(host)
+            
+            start = time.monotonic()
+            result = self._scrape_page(url, HUAWEI_WAIT_FOR_MS, timeout_ms)
+            
+            # 短等待未拿到内容时，使用等待上限重试一次
+            if not getattr(result, 'markdown', None):
+                logger.debug(f"页面内容为空，使用 {HUAWEI_MAX_WAIT_FOR_MS}ms 等待重试: {url}")
+                retry_timeout_ms = max(timeout_ms, HUAWEI_MAX_WAIT_FOR_MS + WAIT_RETRY_TIMEOUT_MARGIN_MS)
+                result = self._scrape_page(url, HUAWEI_MAX_WAIT_FOR_MS, retry_timeout_ms)
+            else:
+                self._host_latencies[host].append((time.monotonic() - start) * 1000)
             
             return result
             
@@ -233,14 +536,108 @@ class HuaweiDocumentCrawler:
             logger.error(f"❌ 爬取华为文档页面失败: {e}")
             return None
     
-    def crawl_huawei_doc_site(self, base_url: str):
-        """爬取整个华为文档站点"""
+    def scrape_huawei_doc_pages(self, urls: List[str], batch_size: int = BATCH_SCRAPE_SIZE) -> List[Any]:
+        """
+        批量爬取华为文档页面，每batch_size个URL合并为一个Firecrawl批量任务
+        
+        Args:
+            urls: 页面URL列表
+            batch_size: 每个批量任务的URL数
+            
+        Returns:
+            所有成功爬取的页面结果列表
+        """
+        if not urls:
+            return []
+        
+        batches = [urls[i:i + batch_size] for i in range(0, len(urls), batch_size)]
+        all_pages = []
+        
+        with ThreadPoolExecutor(max_workers=min(len(batches), BATCH_SCRAPE_MAX_WORKERS)) as executor:
+            futures = {
+                executor.submit(retry_transient(self.app.batch_scrape_urls),
+                                urls=batch, **_HUAWEI_SCRAPE_DUMP): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                    if result and getattr(result, 'data', None):
+                        all_pages.extend(result.data)
+                except Exception as e:
+                    logger.error(f"❌ 批量爬取华为文档页面失败 ({len(futures[future])} 个URL): {e}")
+        
+        return all_pages
+    
+    @staticmethod
+    def _path_depth(url: str) -> int:
+        """URL路径的层级数"""
+        return len([segment for segment in urlparse(url).path.split('/') if segment])
+    
+    def _build_bfs_frontier(self, base_url: str, limit: int, max_depth: int) -> List[str]:
+        """
+        构建广度优先的爬取边界：先用map_url发现站点链接，再按深度取最浅的limit个页面
+        
+        Args:
+            base_url: 起始URL
+            limit: 最多页面数
+            max_depth: 相对起始URL的最大深度
+            
+        Returns:
+            按深度从浅到深排列的URL列表
+        """
+        map_result = retry_transient(self.app.map_url)(base_url)
+        links = getattr(map_result, 'links', None) or []
+        
+        base = urlparse(base_url)
+        base_path = base.path.rstrip('/')
+        base_depth = self._path_depth(base_url)
+        
+        frontier = []
+        seen = set()
+        for link in [base_url, *links]:
+            parsed = urlparse(link)
+            # 只保留同站点、不向上回溯的链接
+            if parsed.netloc != base.netloc or not parsed.path.startswith(base_path):
+                continue
+            depth = self._path_depth(link) - base_depth
+            if depth > max_depth or link in seen:
+                continue
+            seen.add(link)
+            frontier.append((depth, link))
+        
+        return [link for _, link in heapq.nsmallest(limit, frontier)]
+    
+    def crawl_huawei_doc_site(self, base_url: str, breadth_first: bool = True):
+        """
+        爬取整个华为文档站点
+        
+        Args:
+            base_url: 起始URL
+            breadth_first: 是否按广度优先选择页面（文档价值集中在浅层，同样的limit覆盖更多有效页面）
+        """
         try:
-            crawl_options = self.config.get_crawl_options_for_huawei_docs()
+            crawl_options = AdvancedFirecrawlConfig.get_crawl_options_for_huawei_docs()
+            
+            if not breadth_first:
+                return retry_transient(self.app.crawl_url)(
+                    url=base_url,
+                    **crawl_options
+                )
             
-            result = self.app.crawl_url(
-                url=base_url,
-                **crawl_options
+            frontier = self._build_bfs_frontier(
+                base_url,
+                limit=crawl_options['limit'],
+                max_depth=crawl_options['max_depth']
+            )
+            if not frontier:
+                logger.warning(f"⚠️ 未发现可爬取的页面: {base_url}")
+                return None
+            
+            result = retry_transient(self.app.batch_scrape_urls)(
+                urls=frontier,
+                poll_interval=crawl_options['poll_interval'],
+                **_scrape_sdk_kwargs(crawl_options['scrape_options'])
             )
             
             return result
@@ -249,48 +646,97 @@ class HuaweiDocumentCrawler:
             logger.error(f"❌ 爬取华为文档站点失败: {e}")
             return None
     
-    def search_huawei_content(self, query: str):
-        """搜索华为相关内容"""
+    def search_huawei_content(self, query: str) -> Iterator[Any]:
+        """
+        搜索华为相关内容
+        
+        以生成器形式流式返回去重后的结果：任一查询完成即可产出，
+        调用方无需等待最慢的查询就能开始后续处理。
+        """
         try:
-            search_options = self.config.get_search_options_for_huawei()
+            search_options = AdvancedFirecrawlConfig.get_search_options_for_huawei()
+            
+            seen_urls = set()
+            count = 0
+            for item in self._iter_search_queries(self._build_optimized_queries(query),
+                                                  search_options, seen_urls):
+                count += 1
+                yield item
             
-            # 优化搜索查询
-            optimized_queries = [
-                f"{query} site:developer.huawei.com",
-                f"{query} site:developer.harmonyos.com",
-                f"华为 {query}",
-                f"HMS {query}"
-            ]
+            # 合并查询结果不足时，回退到逐站点查询补充
+            if count < search_options['limit']:
+                logger.debug(f"合并查询仅返回 {count} 条结果，使用逐站点查询补充")
+                yield from self._iter_search_queries(self._build_fallback_queries(query),
+                                                     search_options, seen_urls)
             
-            all_results = []
-            for q in optimized_queries:
+        except Exception as e:
+            logger.error(f"❌ 搜索华为内容失败: {e}")
+    
+    def _iter_search_queries(self, queries: List[str], search_options: Mapping[str, Any],
+                             seen_urls: set) -> Iterator[Any]:
+        """并发执行一组搜索查询（各查询互相独立且受网络I/O限制），按完成顺序产出去重后的结果"""
+        search_kwargs = _search_sdk_kwargs(search_options)
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            futures = {
+                executor.submit(retry_transient(self.app.search), query=q, **search_kwargs): q
+                for q in queries
+            }
+            for future in as_completed(futures):
+                q = futures[future]
                 try:
-                    result = self.app.search(
-                        query=q,
-                        **search_options
-                    )
-                    if result and hasattr(result, 'data'):
-                        all_results.extend(result.data)
+                    result = future.result()
                 except Exception as e:
                     logger.warning(f"⚠️ 搜索查询失败 '{q}': {e}")
                     continue
-            
-            return all_results
-            
-        except Exception as e:
-            logger.error(f"❌ 搜索华为内容失败: {e}")
-            return []
+                if result and hasattr(result, 'data'):
+                    yield from _iter_unique(result.data, seen_urls)
+    
+    @retry_transient
+    async def _search_one(self, query: str) -> List[Dict[str, Any]]:
+        """通过共享连接池直接调用Firecrawl搜索接口"""
+        response = await self.async_client.post(
+            "/v1/search",
+            json={**_HUAWEI_SEARCH_PAYLOAD, 'query': query}
+        )
+        response.raise_for_status()
+        response_json = response.json()
+        if not response_json.get('success'):
+            raise RuntimeError(response_json.get('error', response_json))
+        return response_json.get('data', [])
+    
+    async def search_huawei_content_async(self, query: str) -> List[Dict[str, Any]]:
+        """异步搜索华为相关内容，所有查询共享同一个连接池并发执行"""
+        all_results = []
+        seen_urls = set()
+        await self._gather_search_queries(self._build_optimized_queries(query), all_results, seen_urls)
+        
+        # 合并查询结果不足时，回退到逐站点查询补充
+        if len(all_results) < _HUAWEI_SEARCH_PAYLOAD.get('limit', 0):
+            await self._gather_search_queries(self._build_fallback_queries(query), all_results, seen_urls)
+        
+        return all_results
+    
+    async def _gather_search_queries(self, queries: List[str], all_results: List[Any], seen_urls: set):
+        """并发执行一组异步搜索查询，结果去重后追加到all_results"""
+        results = await asyncio.gather(
+            *[self._search_one(q) for q in queries],
+            return_exceptions=True
+        )
+        for q, result in zip(queries, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ 搜索查询失败 '{q}': {result}")
+                continue
+            all_results.extend(_iter_unique(result, seen_urls))
     
     def scrape_with_actions(self, url: str):
         """使用动作序列爬取动态内容"""
         try:
-            actions = self.config.get_actions_for_dynamic_content()
-            scrape_options = self.config.get_huawei_optimized_scrape_options()
+            actions = AdvancedFirecrawlConfig.get_actions_for_dynamic_content()
             
-            result = self.app.scrape_url(
+            result = retry_transient(self.app.scrape_url)(
                 url=url,
                 actions=actions,
-                **scrape_options.model_dump()
+                **_HUAWEI_SCRAPE_DUMP
             )
             
             return result
@@ -5,19 +5,438 @@
 专注于使用FireCrawl的智能搜索功能，移除基础搜索引擎依赖
 """
 
+import asyncio
+import functools
+import hashlib
+import heapq
+import importlib.util
+import json
 import logging
+import re
 import time
 import os
 import random
-from typing import List, Dict, Any, Optional, Tuple
-from langchain_core.documents import Document
-from firecrawl import FirecrawlApp, ScrapeOptions
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, Iterator, List, Dict, Any, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import httpx
+import numpy as np
+
+from .adapter import HuaweiDeepSearcherAdapter
+from .config import RAGConfig
+from .search_cache import (
+    QuantizedEmbeddingStore, SearchCache, dequantize_int8, int8_cosine, make_cache_key
+)
 
 # 导入DeepSearcher的LLM配置
-from deepsearcher.configuration import llm, embedding_model, vector_db
+from deepsearcher import configuration
+from deepsearcher.llm.base import BaseLLM
 
 logger = logging.getLogger(__name__)
 
+FIRECRAWL_API_URL = 'https://api.firecrawl.dev'
+FIRECRAWL_SEARCH_PATH = '/v1/search'
+# 同时在途的FireCrawl搜索请求上限，避免触发API频率限制
+SEARCH_CONCURRENCY = 5
+SEARCH_MAX_RETRIES = 3
+# 每秒允许发出的FireCrawl请求数（令牌桶速率与容量）
+SEARCH_RATE_PER_SEC = 5.0
+# 429退避（decorrelated jitter）的起始与上限等待时间（秒）
+SEARCH_BACKOFF_BASE = 1.0
+SEARCH_BACKOFF_CAP = 10.0
+# 未安装h2时httpx无法启用HTTP/2，退回HTTP/1.1连接池
+_HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+# 华为域名限制的查询后缀，与原始查询拼接后一起搜索
+_HUAWEI_SITE_SUFFIXES = (
+    " site:developer.huawei.com",
+    " site:developer.harmonyos.com",
+    " site:consumer.huawei.com",
+    " site:forums.developer.huawei.com",
+)
+# 每个子查询最多发出的搜索请求数，避免过度调用API
+MAX_QUERIES_PER_SUB_QUERY = 3
+
+
+
+@dataclass(slots=True)
+class HitMeta:
+    """单条在线搜索结果的元数据（固定字段，避免为每条结果分配字典）"""
+    source: str
+    title: str
+    description: str
+    query: str
+    user_query: str
+    relevance_score: float
+    is_huawei_official: bool
+    timestamp: float
+    rank: int = 1
+    rrf_score: float = 0.0
+
+
+class _Doc(NamedTuple):
+    """内部流转的搜索结果（轻量元组，创建开销远低于带校验的Document模型）"""
+    page_content: str
+    metadata: HitMeta
+
+
+class AsyncTokenBucket:
+    """
+    异步令牌桶限流器
+    令牌按固定速率补充，桶未空时请求立即放行，只有超出配额时才等待
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数），默认等于rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+    
+    async def acquire(self):
+        """获取一个令牌，必要时等待令牌补充"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited += 1
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """限流统计"""
+        return {
+            'rate_per_sec': self.rate,
+            'capacity': self.capacity,
+            'acquired': self.acquired,
+            'waited': self.waited,
+            'wait_seconds': round(self.wait_seconds, 3)
+        }
+
+
+# 华为官方域名与内容标识合并为一个正则；正文只检查开头部分
+_HUAWEI_OFFICIAL_RE = re.compile(
+    r'developer\.huawei\.com|developer\.harmonyos\.com|consumer\.huawei\.com'
+    r'|forums\.developer\.huawei\.com|huaweicloud\.com'
+    r'|华为|huawei|hms|harmonyos|鸿蒙',
+    re.IGNORECASE
+)
+OFFICIAL_CHECK_LENGTH = 4096
+
+# 去重时忽略的跟踪参数
+_TRACKING_PARAMS = frozenset({'from', 'ref', 'source', 'spm', 'fbclid', 'gclid'})
+# 近似重复判定：SimHash汉明距离小于该值视为同一内容
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_TEXT_LENGTH = 2048
+_SHINGLE_SIZE = 3
+# 倒数排名融合（RRF）平滑常数与华为官方内容加权
+RRF_K = 60
+OFFICIAL_BOOST = 1.5
+# 语义重排时每个文档参与嵌入的最大字符数
+SEMANTIC_TEXT_LENGTH = 2048
+
+# LLM输出的子查询行首的列表符号或编号（如 "-"、"•"、"1."、"2)"、"3、"）
+_BULLET_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)、](?!\d))\s*')
+
+# 每个来源文档送入LLM的近似token上限
+CONTEXT_TOKENS_PER_DOC = 800
+
+# 提示词模板：静态说明作为system消息，便于服务端前缀缓存命中；动态部分通过format_map填充
+_DECOMPOSE_SYSTEM_PROMPT = """作为华为技术文档搜索专家，请将用户的查询分解为多个具体的子查询，以便更全面地搜索相关信息。
+
+请遵循以下原则：
+1. 分解为3-5个具体的子查询
+2. 每个子查询应该聚焦于问题的一个特定方面
+3. 优先考虑华为技术栈相关的查询
+4. 包含不同层次的查询（概念、实现、示例、最佳实践等）
+5. 确保查询适合在华为开发者文档中搜索
+
+只输出JSON，不要添加任何解释，格式为：{"sub_queries": ["子查询1", "子查询2"]}"""
+
+DECOMPOSE_PROMPT_TMPL = "用户查询：{user_query}"
+
+_ANSWER_SYSTEM_PROMPT = """作为华为技术专家，请基于用户提供的华为官方文档和技术资料，为用户提供准确、全面的答案。
+
+请遵循以下要求:
+1. 基于提供的华为官方文档内容回答问题
+2. 答案要准确、详细、实用
+3. 如果涉及代码示例，请提供具体的实现方法
+4. 突出华为技术栈的特点和优势
+5. 如果有多个相关方面，请分点详细说明
+6. 在答案末尾简要说明信息来源的可靠性"""
+
+ANSWER_PROMPT_TMPL = """用户问题: {user_query}
+
+搜索策略: 
+- 执行了 {query_count} 个相关查询
+- 共找到 {document_count} 个相关文档
+- 查询分解: {sub_queries}
+
+相关文档内容:
+{context}
+
+请生成一个专业、详细的答案:"""
+
+_HYBRID_SYSTEM_PROMPT = """作为华为技术专家，请基于本地知识库和在线搜索的信息，为用户提供综合性的答案。
+
+请综合给出的信息，生成一个准确、全面的答案：
+1. 整合本地和在线信息
+2. 去除重复内容
+3. 突出最重要的信息
+4. 保持逻辑清晰"""
+
+HYBRID_PROMPT_TMPL = """用户问题: {user_query}
+
+本地知识库信息:
+{local_context}
+
+在线搜索信息:
+{online_answer}"""
+
+
+def _build_messages(system_prompt: str, template: str, **fields: Any) -> List[Dict[str, str]]:
+    """组装 system + user 两段式消息"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": template.format_map(fields)}
+    ]
+
+
+def _parse_sub_queries(content: str) -> List[str]:
+    """
+    解析LLM输出的子查询
+    
+    优先按 {"sub_queries": [...]} JSON解析；模型未遵循JSON格式时，
+    按行去掉列表符号/编号前缀，跳过空行和Markdown标题。
+    """
+    content = BaseLLM.remove_think(content)
+    start, end = content.find('{'), content.rfind('}')
+    if start != -1 and end > start:
+        try:
+            sub_queries = json.loads(content[start:end + 1])['sub_queries']
+            return [query.strip() for query in sub_queries if isinstance(query, str) and query.strip()]
+        except (ValueError, KeyError, TypeError):
+            pass
+    return [
+        cleaned for cleaned in (
+            _BULLET_RE.sub('', line).strip() for line in content.splitlines()
+            if not line.lstrip().startswith('#')
+        )
+        if cleaned
+    ]
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    按近似token数截断文本
+    
+    中日韩字符按每字1个token计，其余字符按每4个字符1个token计，
+    与常见BPE分词器在中英文混排文档上的token数大致相当。
+    """
+    if len(text) <= max_tokens:
+        return text
+    budget = max_tokens * 4
+    for end, char in enumerate(text[:budget]):
+        budget -= 4 if char >= '\u2e80' else 1
+        if budget < 0:
+            return text[:end]
+    return text[:max_tokens * 4]
+
+
+def _canonical_url(url: str) -> str:
+    """
+    规范化URL用于去重：忽略协议、片段、跟踪参数、主机名大小写和末尾斜杠，查询参数按键排序
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in _TRACKING_PARAMS
+    )
+    return f"{host}{path}?{urlencode(query)}" if query else f"{host}{path}"
+
+
+def _url_fingerprint(url: str) -> int:
+    """规范化URL的64位指纹"""
+    return int.from_bytes(
+        hashlib.blake2b(_canonical_url(url).encode('utf-8'), digest_size=8).digest(), 'big'
+    )
+
+
+def _simhash(text: str) -> int:
+    """
+    基于字符shingle的64位SimHash，用于识别正文近似重复的页面
+    
+    仅在单次去重内比较，因此直接使用进程内的内置hash，位统计交给numpy完成。
+    """
+    text = ' '.join(text[:SIMHASH_TEXT_LENGTH].split())
+    count = max(len(text) - _SHINGLE_SIZE + 1, 1)
+    hashes = np.fromiter(
+        (hash(text[i:i + _SHINGLE_SIZE]) for i in range(count)), dtype=np.int64, count=count
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(count, 8), axis=1)
+    fingerprint = np.packbits(bits.sum(axis=0) * 2 > count)
+    return int.from_bytes(fingerprint.tobytes(), 'big')
+
+
+@functools.lru_cache(maxsize=1024)
+def _huawei_optimized_queries(user_query: str) -> Tuple[str, ...]:
+    """原始查询加上华为域名限制的变体，结果按查询缓存（返回不可变元组供共享）"""
+    variants = (user_query,) + tuple(user_query + suffix for suffix in _HUAWEI_SITE_SUFFIXES)
+    return variants[:MAX_QUERIES_PER_SUB_QUERY]
+
+
+@functools.lru_cache(maxsize=256)
+def _query_term_matcher(user_query: str) -> Tuple[Tuple[str, ...], Callable[[str], FrozenSet[str]]]:
+    """
+    为查询词构建一次性编译的多词匹配器
+    
+    所有查询词合并为一个忽略大小写的正则，在每个位置做前瞻匹配，一次线性扫描即可
+    得到文本中出现过的查询词，无需为长文本创建小写副本。同一位置只会报告最长的词，
+    被其包含的较短词通过预先计算的包含关系补齐，结果与逐词 `in` 判断一致。
+    每个查询词对应一个捕获组，命中按组号映射回查询词，而不是对匹配文本取小写：
+    忽略大小写匹配的部分字符（如 'ſ'、'K'）小写后并不等于查询词。
+    
+    Returns:
+        (查询词元组, 返回文本中出现的查询词集合的函数)
+    """
+    query_terms = tuple(user_query.lower().split())
+    distinct = sorted(set(query_terms), key=len, reverse=True)
+    if not distinct:
+        return query_terms, lambda text: frozenset()
+    
+    pattern = re.compile(
+        '(?=(?:' + '|'.join(f'({re.escape(term)})' for term in distinct) + '))', re.IGNORECASE
+    )
+    contained = {
+        term: frozenset(other for other in distinct if other != term and other in term)
+        for term in distinct
+    }
+    
+    def matched_terms(text: str) -> FrozenSet[str]:
+        found = set()
+        for match in pattern.finditer(text):
+            term = distinct[match.lastindex - 1]
+            if term not in found:
+                found.add(term)
+                found.update(contained.get(term, ()))
+        return frozenset(found)
+    
+    return query_terms, matched_terms
+
+
+# 标题、内容、描述的关键词匹配权重
+_FIELD_WEIGHTS = np.array([0.4, 0.4, 0.2])
+
+
+def _keyword_relevance_scores(user_query: str, fields: Sequence[Tuple[str, str, str]]) -> np.ndarray:
+    """
+    批量计算关键词重叠相关性分数
+    
+    每个文档的 (标题, 内容, 描述) 先经多词匹配器得到命中矩阵，
+    加权合成 0.4*标题 + 0.4*内容 + 0.2*描述 在numpy中一次完成。
+    
+    Args:
+        user_query: 用户查询
+        fields: 每个文档的 (标题, 内容, 描述)
+        
+    Returns:
+        与fields顺序一致的分数数组 (0-1)
+    """
+    query_terms, matched_terms = _query_term_matcher(user_query)
+    if not query_terms or not fields:
+        return np.zeros(len(fields))
+    
+    # 重复出现的查询词按出现次数计权，与逐词计数一致
+    distinct = list(dict.fromkeys(query_terms))
+    multiplicity = np.array([query_terms.count(term) for term in distinct], dtype=np.float64)
+    index = {term: i for i, term in enumerate(distinct)}
+    
+    hits = np.zeros((len(fields), 3, len(distinct)))
+    for doc_idx, doc_fields in enumerate(fields):
+        for field_idx, text in enumerate(doc_fields):
+            if text:
+                for term in matched_terms(text):
+                    term_idx = index.get(term)
+                    if term_idx is not None:
+                        hits[doc_idx, field_idx, term_idx] = 1.0
+    
+    scores = (hits @ multiplicity) @ _FIELD_WEIGHTS / len(query_terms)
+    return np.minimum(scores, 1.0)
+
+
+def _item_fields(item: Dict) -> Tuple[str, str, str, str]:
+    """FireCrawl搜索结果项的 (URL, 标题, 描述, 内容)，内容优先使用markdown，没有则使用description"""
+    description = item.get('description') or ''
+    return item.get('url', ''), item.get('title', ''), description, item.get('markdown') or description
+
+
+def openai_completions(llm_client: Any) -> Optional[Tuple[Any, str]]:
+    """返回LLM底层OpenAI兼容客户端的completions接口和模型名，不支持时返回None"""
+    client = getattr(llm_client, 'client', None)
+    completions = getattr(getattr(client, 'chat', None), 'completions', None)
+    model = getattr(llm_client, 'model', None)
+    if completions is None or not model:
+        return None
+    return completions, model
+
+
+def stream_llm_chat(llm_client: Any, messages: List[Dict[str, str]]) -> Iterator[str]:
+    """
+    以流式方式调用LLM
+    
+    依次尝试LLM自身的stream方法、OpenAI兼容客户端的流式接口，都不支持时退回一次性chat调用。
+    
+    Yields:
+        答案文本片段
+    """
+    stream = getattr(llm_client, 'stream', None)
+    if callable(stream):
+        for chunk in stream(messages):
+            text = getattr(chunk, 'content', chunk)
+            if text:
+                yield text
+        return
+    
+    openai_api = openai_completions(llm_client)
+    if openai_api is not None:
+        completions, model = openai_api
+        for chunk in completions.create(model=model, messages=messages, stream=True):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        return
+    
+    yield llm_client.chat(messages).content
+
+
 class EnhancedOnlineSearchEngine:
     """
     增强版在线搜索引擎
@@ -47,24 +466,195 @@ class EnhancedOnlineSearchEngine:
         self.llm = None
         self.embedding_model = None
         self.vector_db = None
+        self._ready = False
         
-        # 初始化FireCrawl
-        try:
-            api_key = os.getenv("FIRECRAWL_API_KEY")
-            if not api_key:
-                raise ValueError("FIRECRAWL_API_KEY未配置")
-            
-            self.firecrawl_app = FirecrawlApp(api_key=api_key)
+        # 本地搜索适配器按集合名称缓存，首次使用时创建
+        self._adapters = {}
+        
+        # 初始化FireCrawl：API密钥只读取一次，HTTP客户端在首次搜索时创建并复用连接
+        self._api_key = os.getenv("FIRECRAWL_API_KEY")
+        if self._api_key:
             logger.info("✅ 增强版在线搜索引擎初始化成功")
+        else:
+            logger.error("❌ FireCrawl初始化失败: FIRECRAWL_API_KEY未配置")
+        self._http = None
+        # 异步搜索统一在后台事件循环线程中执行，保证HTTP连接池始终绑定同一个循环
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        # 所有FireCrawl请求共享的令牌桶，以及429重试统计
+        self._limiter = AsyncTokenBucket(SEARCH_RATE_PER_SEC)
+        self._throttled = 0
+        self._retries = 0
+        
+        # 持久化缓存：搜索结果、查询分解和嵌入向量跨进程复用
+        try:
+            self._cache = SearchCache(
+                RAGConfig.ONLINE_CACHE_DIR,
+                default_expire=RAGConfig.ONLINE_CACHE_TTL,
+                size_limit=RAGConfig.ONLINE_CACHE_SIZE_LIMIT
+            )
         except Exception as e:
-            logger.error(f"❌ FireCrawl初始化失败: {e}")
-            self.firecrawl_app = None
+            logger.warning(f"⚠️ 在线搜索缓存初始化失败，将不使用缓存: {e}")
+            self._cache = None
+        # 嵌入向量存储按嵌入模型区分目录，首次使用时创建
+        self._embedding_store = None
+        self._embedding_store_model = None
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取后台事件循环，首次调用时启动循环线程"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="online-search-loop", daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+    
+    def _run(self, coro):
+        """在后台事件循环中执行协程并等待结果，可从同步代码或其他事件循环中调用"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """FireCrawl API的共享HTTP客户端（仅在后台事件循环中使用）"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=FIRECRAWL_API_URL,
+                timeout=30.0,
+                http2=_HTTP2_AVAILABLE,
+                headers={
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {self._api_key}'
+                }
+            )
+        return self._http
+    
+    def close(self):
+        """关闭HTTP连接、后台事件循环和缓存"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            if self._http is not None:
+                asyncio.run_coroutine_threadsafe(self._http.aclose(), loop).result()
+                self._http = None
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join()
+            loop.close()
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+        if self._embedding_store is not None:
+            self._embedding_store.close()
+            self._embedding_store = None
+    
+    @property
+    def adapter(self) -> HuaweiDeepSearcherAdapter:
+        """默认集合的本地搜索适配器"""
+        return self._get_adapter()
+    
+    def _get_adapter(self, collection_name: str = None) -> HuaweiDeepSearcherAdapter:
+        """获取指定集合的本地搜索适配器，每个集合只创建一次"""
+        adapter = self._adapters.get(collection_name)
+        if adapter is None:
+            adapter = HuaweiDeepSearcherAdapter(collection_name=collection_name)
+            self._adapters[collection_name] = adapter
+        return adapter
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        FireCrawl请求限流统计，可据此调整 SEARCH_RATE_PER_SEC
+        
+        Returns:
+            包含令牌桶统计、429次数和重试次数的字典
+        """
+        return {
+            **self._limiter.stats(),
+            'throttled': self._throttled,
+            'retries': self._retries
+        }
+    
+    @staticmethod
+    def _model_id(component: Any) -> str:
+        """获取模型组件的标识，用作缓存键的一部分"""
+        return getattr(component, 'model', None) or type(component).__name__
+    
+    def _get_embedding_store(self) -> Optional[QuantizedEmbeddingStore]:
+        """获取当前嵌入模型对应的int8向量存储，缓存不可用时返回None"""
+        if self._cache is None:
+            return None
+        model_id = self._model_id(self.embedding_model)
+        if self._embedding_store_model != model_id:
+            try:
+                self._embedding_store = QuantizedEmbeddingStore(
+                    RAGConfig.ONLINE_CACHE_DIR / "embeddings" / make_cache_key('model', model_id)[:16],
+                    max_rows=RAGConfig.EMBEDDING_STORE_MAX_ROWS
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 嵌入向量存储初始化失败，将不缓存嵌入: {e}")
+                self._embedding_store = None
+            self._embedding_store_model = model_id
+        return self._embedding_store
+    
+    def _embedding_rows(self, store: QuantizedEmbeddingStore, texts: List[str]) -> np.ndarray:
+        """确保文本嵌入已写入向量存储，返回与输入顺序一致的行号"""
+        keys = [make_cache_key('emb', text) for text in texts]
+        found = store.lookup(list(dict.fromkeys(keys)))
+        
+        uncached = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in uncached:
+                uncached[key] = text
+        
+        if uncached:
+            vectors = self.embedding_model.embed_documents(list(uncached.values()))
+            found.update(store.add(list(uncached.keys()), np.asarray(vectors, dtype=np.float32)))
+        
+        logger.info(f"📦 嵌入缓存命中 {len(texts) - len(uncached)}/{len(texts)}")
+        return np.fromiter((found[key] for key in keys), dtype=np.int64, count=len(keys))
+    
+    def _cached_embeddings(self, texts: List[str]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        从向量存储读取文本的int8嵌入和缩放系数，未命中的文本先嵌入并写入；存储不可用时返回None
+        """
+        store = self._get_embedding_store()
+        if store is None:
+            return None
+        try:
+            return store.get(self._embedding_rows(store, texts))
+        except KeyError:
+            # 存储在查询行号后发生了轮换，旧行号失效，重新查询一次
+            return store.get(self._embedding_rows(store, texts))
+    
+    def embed_texts_cached(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量计算文本嵌入，已缓存的文本直接复用，只对未命中的文本调用嵌入模型
+        
+        嵌入以int8量化形式缓存，返回的是反量化后的近似向量。
+        
+        Args:
+            texts: 待嵌入的文本列表
+            
+        Returns:
+            与输入顺序一致的嵌入向量列表
+        """
+        if not self._ensure_components_initialized():
+            raise RuntimeError("嵌入模型未初始化，需要先调用 init_config()")
+        cached = self._cached_embeddings(texts)
+        if cached is None:
+            return self.embedding_model.embed_documents(texts)
+        return dequantize_int8(*cached).tolist()
     
     def _ensure_components_initialized(self):
-        """确保组件已正确初始化"""
+        """确保组件已正确初始化（成功后不再重复检查）"""
+        if self._ready:
+            return True
         if self.llm is None or self.embedding_model is None:
-            # 重新获取全局组件
-            from deepsearcher.configuration import llm as global_llm, embedding_model as global_embedding, vector_db as global_vector_db
+            # 重新获取全局组件（init_config() 会替换模块级变量，因此按属性读取）
+            global_llm = configuration.llm
+            global_embedding = configuration.embedding_model
+            global_vector_db = configuration.vector_db
             
             if global_llm is None:
                 logger.warning("⚠️ LLM未初始化，需要先调用 init_config()")
@@ -77,6 +667,7 @@ class EnhancedOnlineSearchEngine:
             self.embedding_model = global_embedding
             self.vector_db = global_vector_db
             logger.info("✅ LLM组件已动态初始化")
+        self._ready = True
         return True
     
     def search_and_answer(self, user_query: str) -> Tuple[str, List[Dict[str, Any]]]:
@@ -89,56 +680,90 @@ class EnhancedOnlineSearchEngine:
         Returns:
             (答案, 信息源列表)
         """
-        try:
-            logger.info(f"🧠 开始增强版在线搜索: {user_query}")
-            
-            if not self.firecrawl_app:
-                return "FireCrawl服务未配置，无法进行在线搜索。请配置FIRECRAWL_API_KEY。", []
-            
-            # 第一步：使用LLM分解用户问题
-            sub_queries = self._decompose_query_with_llm(user_query)
-            logger.info(f"🔍 问题分解完成，生成 {len(sub_queries)} 个子查询")
-            
-            # 第二步：对每个子查询使用FireCrawl搜索
-            all_documents = []
-            search_results_summary = {}
-            
-            for i, sub_query in enumerate(sub_queries, 1):
-                logger.info(f"🔍 执行子查询 {i}/{len(sub_queries)}: {sub_query}")
-                documents = self._search_with_firecrawl(sub_query, user_query)
-                
-                if documents:
-                    all_documents.extend(documents)
-                    search_results_summary[sub_query] = len(documents)
-                    logger.info(f"✅ 子查询 {i} 获得 {len(documents)} 个文档")
-                else:
-                    logger.warning(f"⚠️ 子查询 {i} 未找到相关文档")
-                
-                # 添加延迟避免API频率限制
-                if i < len(sub_queries):
-                    time.sleep(random.uniform(1, 2))
-            
-            # 第三步：去重和排序文档
-            unique_documents = self._deduplicate_and_rank_documents(all_documents, user_query)
-            logger.info(f"📚 文档处理完成，最终获得 {len(unique_documents)} 个高质量文档")
-            
-            if not unique_documents:
-                return "抱歉，没有找到相关的华为技术文档。建议尝试更具体的关键词或查看华为开发者官网。", []
-            
-            # 第四步：使用LLM基于搜索结果生成综合答案
-            answer = self._generate_comprehensive_answer_with_llm(
-                user_query, unique_documents, sub_queries, search_results_summary
-            )
-            
-            # 第五步：准备信息源
-            sources = self._prepare_sources_info(unique_documents)
-            
+        chunks, sources = self.search_and_answer_stream(user_query)
+        answer = "".join(chunks).strip()
+        if sources:
             logger.info(f"🎉 增强版搜索完成，生成答案长度: {len(answer)} 字符，信息源: {len(sources)} 个")
-            return answer, sources
+        return answer, sources
+    
+    def search_and_answer_stream(self, user_query: str) -> Tuple[Iterator[str], List[Dict[str, Any]]]:
+        """
+        流式智能搜索和回答：搜索阶段完成后立即返回信息源，答案以文本片段逐步产出
+        
+        Args:
+            user_query: 用户查询
             
+        Returns:
+            (答案文本片段迭代器, 信息源列表)
+        """
+        try:
+            prepared = self._run(self._async_search_documents(user_query))
         except Exception as e:
             logger.error(f"❌ 增强版在线搜索失败: {e}")
-            return f"搜索过程中发生错误: {str(e)}", []
+            return iter([f"搜索过程中发生错误: {str(e)}"]), []
+        
+        if isinstance(prepared, str):
+            return iter([prepared]), []
+        
+        sub_queries, unique_documents, search_results_summary = prepared
+        
+        # 第五步：准备信息源
+        sources = self._prepare_sources_info(unique_documents)
+        
+        # 第四步：使用LLM基于搜索结果流式生成综合答案
+        chunks = self._stream_comprehensive_answer_with_llm(
+            user_query, unique_documents, sub_queries, search_results_summary
+        )
+        return chunks, sources
+    
+    async def _async_search_documents(self, user_query: str):
+        """
+        搜索阶段的异步实现，所有子查询的FireCrawl请求并发执行
+        
+        Args:
+            user_query: 用户查询
+            
+        Returns:
+            (子查询列表, 去重排序后的文档, 各子查询命中数)；无法继续时返回提示信息字符串
+        """
+        logger.info(f"🧠 开始增强版在线搜索: {user_query}")
+        
+        if not self._api_key:
+            return "FireCrawl服务未配置，无法进行在线搜索。请配置FIRECRAWL_API_KEY。"
+        
+        # 第一步：使用LLM分解用户问题
+        # 后台事件循环由所有并发搜索共享，同步的LLM调用、嵌入计算和SQLite缓存读写都放到线程中执行
+        sub_queries = await asyncio.to_thread(self._decompose_query_with_llm, user_query)
+        logger.info(f"🔍 问题分解完成，生成 {len(sub_queries)} 个子查询")
+        
+        # 第二步：并发执行所有子查询的FireCrawl搜索
+        all_documents = []
+        search_results_summary = {}
+        
+        semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+        results = await asyncio.gather(*(
+            self._search_with_firecrawl(semaphore, sub_query, user_query)
+            for sub_query in sub_queries
+        ))
+        
+        for i, (sub_query, documents) in enumerate(zip(sub_queries, results), 1):
+            if documents:
+                all_documents.extend(documents)
+                search_results_summary[sub_query] = len(documents)
+                logger.info(f"✅ 子查询 {i} 获得 {len(documents)} 个文档")
+            else:
+                logger.warning(f"⚠️ 子查询 {i} 未找到相关文档")
+        
+        # 第三步：去重和排序文档
+        unique_documents = await asyncio.to_thread(
+            self._deduplicate_and_rank_documents, all_documents, user_query
+        )
+        logger.info(f"📚 文档处理完成，最终获得 {len(unique_documents)} 个高质量文档")
+        
+        if not unique_documents:
+            return "抱歉，没有找到相关的华为技术文档。建议尝试更具体的关键词或查看华为开发者官网。"
+        
+        return sub_queries, unique_documents, search_results_summary
     
     def hybrid_search_and_answer(self, 
                                 user_query: str, 
@@ -159,27 +784,12 @@ class EnhancedOnlineSearchEngine:
         """
         logger.info(f"🔀 开始混合搜索: {user_query}")
         
-        local_results = []
-        online_answer = ""
-        online_sources = []
-        
-        # 本地搜索
-        if use_local:
-            try:
-                from .adapter import HuaweiDeepSearcherAdapter
-                adapter = HuaweiDeepSearcherAdapter()
-                local_results = adapter.search_huawei_docs(user_query, top_k=5)
-                logger.info(f"📚 本地搜索完成，找到 {len(local_results)} 个结果")
-            except Exception as e:
-                logger.warning(f"⚠️ 本地搜索失败: {e}")
-        
-        # 在线搜索
-        if use_online:
-            try:
-                online_answer, online_sources = self.search_and_answer(user_query)
-                logger.info(f"🌐 在线搜索完成，生成答案长度: {len(online_answer)} 字符")
-            except Exception as e:
-                logger.warning(f"⚠️ 在线搜索失败: {e}")
+        # 本地搜索与在线搜索互不依赖，并行执行
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            local_future = executor.submit(self._local_search, user_query, collection_name) if use_local else None
+            online_future = executor.submit(self._online_search, user_query) if use_online else None
+            local_results = local_future.result() if local_future else []
+            online_answer, online_sources = online_future.result() if online_future else ("", [])
         
         # 生成混合答案
         if local_results or online_answer:
@@ -218,6 +828,43 @@ class EnhancedOnlineSearchEngine:
                 'online_sources_count': 0
             }
     
+    def _local_search(self, user_query: str, collection_name: str = None) -> List[Dict]:
+        """
+        本地知识库搜索
+        
+        Args:
+            user_query: 用户查询
+            collection_name: 本地搜索的集合名称
+            
+        Returns:
+            本地搜索结果列表，失败时为空列表
+        """
+        try:
+            local_results = self._get_adapter(collection_name).search_huawei_docs(user_query, top_k=5)
+            logger.info(f"📚 本地搜索完成，找到 {len(local_results)} 个结果")
+            return local_results
+        except Exception as e:
+            logger.warning(f"⚠️ 本地搜索失败: {e}")
+            return []
+    
+    def _online_search(self, user_query: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        在线搜索，失败时返回空结果
+        
+        Args:
+            user_query: 用户查询
+            
+        Returns:
+            (答案, 信息源列表)
+        """
+        try:
+            online_answer, online_sources = self.search_and_answer(user_query)
+            logger.info(f"🌐 在线搜索完成，生成答案长度: {len(online_answer)} 字符")
+            return online_answer, online_sources
+        except Exception as e:
+            logger.warning(f"⚠️ 在线搜索失败: {e}")
+            return "", []
+    
     def _decompose_query_with_llm(self, user_query: str) -> List[str]:
         """
         使用LLM将用户查询分解为多个子查询
@@ -233,53 +880,55 @@ class EnhancedOnlineSearchEngine:
                 logger.warning("⚠️ LLM未初始化，使用默认查询分解策略")
                 return self._fallback_query_decomposition(user_query)
             
-            # 构建问题分解的提示词
-            decomposition_prompt = f"""
-作为华为技术文档搜索专家，请将用户的查询分解为多个具体的子查询，以便更全面地搜索相关信息。
-
-用户查询：{user_query}
-
-请遵循以下原则：
-1. 分解为3-5个具体的子查询
-2. 每个子查询应该聚焦于问题的一个特定方面
-3. 优先考虑华为技术栈相关的查询
-4. 包含不同层次的查询（概念、实现、示例、最佳实践等）
-5. 确保查询适合在华为开发者文档中搜索
-
-请直接输出子查询列表，每行一个，不要添加编号或其他格式：
-"""
+            cache_key = make_cache_key('decompose', self._model_id(self.llm), user_query)
+            if self._cache is not None:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"📦 查询分解命中缓存，{len(cached)} 个子查询")
+                    return cached
             
             # 调用LLM进行问题分解
             logger.info("🧠 正在使用LLM分解查询...")
-            messages = [{"role": "user", "content": decomposition_prompt}]
-            response = self.llm.chat(messages)
+            messages = _build_messages(_DECOMPOSE_SYSTEM_PROMPT, DECOMPOSE_PROMPT_TMPL, user_query=user_query)
+            sub_queries = _parse_sub_queries(self._chat_json(messages))
             
-            # 解析LLM响应
-            sub_queries = []
-            for line in response.content.strip().split('\n'):
-                line = line.strip()
-                if line and not line.startswith(('#', '-', '*', '1.', '2.', '3.', '4.', '5.')):
-                    # 清理可能的编号前缀
-                    cleaned_line = line
-                    for prefix in ['1.', '2.', '3.', '4.', '5.', '-', '*', '•']:
-                        if cleaned_line.startswith(prefix):
-                            cleaned_line = cleaned_line[len(prefix):].strip()
-                    
-                    if cleaned_line:
-                        sub_queries.append(cleaned_line)
-            
-            # 限制子查询数量并添加原始查询
-            sub_queries = sub_queries[:self.max_sub_queries-1]
+            # 去重、限制子查询数量并添加原始查询
+            sub_queries = list(dict.fromkeys(sub_queries))[:self.max_sub_queries-1]
             if user_query not in sub_queries:
                 sub_queries.insert(0, user_query)  # 确保原始查询在第一位
             
             logger.info(f"✅ LLM分解查询成功，生成 {len(sub_queries)} 个子查询")
+            if self._cache is not None:
+                self._cache.set(cache_key, sub_queries)
             return sub_queries
             
         except Exception as e:
             logger.warning(f"⚠️ LLM查询分解失败: {e}，使用备用策略")
             return self._fallback_query_decomposition(user_query)
     
+    def _openai_completions(self):
+        """返回LLM底层OpenAI兼容客户端的completions接口和模型名，不支持时返回None"""
+        return openai_completions(self.llm)
+    
+    def _chat_json(self, messages: List[Dict[str, str]]) -> str:
+        """
+        以JSON模式调用LLM（OpenAI兼容接口的response_format），不支持时退回普通chat调用
+        
+        Returns:
+            LLM输出文本
+        """
+        openai_api = self._openai_completions()
+        if openai_api is not None:
+            completions, model = openai_api
+            try:
+                completion = completions.create(
+                    model=model, messages=messages, response_format={"type": "json_object"}
+                )
+                return completion.choices[0].message.content
+            except Exception as e:
+                logger.debug(f"JSON模式调用失败，改用普通调用: {e}")
+        return self.llm.chat(messages).content
+    
     def _fallback_query_decomposition(self, user_query: str) -> List[str]:
         """
         备用查询分解策略（当LLM不可用时）
@@ -309,11 +958,15 @@ class EnhancedOnlineSearchEngine:
         
         return base_queries[:self.max_sub_queries]
     
-    def _search_with_firecrawl(self, query: str, original_query: str) -> List[Document]:
+    async def _search_with_firecrawl(self,
+                                     semaphore: asyncio.Semaphore,
+                                     query: str,
+                                     original_query: str) -> List[_Doc]:
         """
-        使用FireCrawl进行搜索
+        使用FireCrawl进行搜索，各优化查询并发发出
         
         Args:
+            semaphore: 限制并发请求数的信号量
             query: 搜索查询
             original_query: 原始用户查询
             
@@ -321,73 +974,31 @@ class EnhancedOnlineSearchEngine:
             搜索到的文档列表
         """
         try:
-            if not self.firecrawl_app:
+            if not self._api_key:
                 logger.warning("⚠️ FireCrawl未初始化")
                 return []
             
             # 生成华为优化的搜索查询
             optimized_queries = self._generate_huawei_optimized_queries(query)
+            results = await asyncio.gather(*(
+                self._search_one(semaphore, search_query)
+                for search_query in optimized_queries
+            ))
+            
+            # 关键词相关性分数对该子查询的全部结果批量计算
+            ranked_items = [(rank, item) for items in results for rank, item in enumerate(items, 1)]
+            scores = _keyword_relevance_scores(original_query, [
+                (title, content, description)
+                for _, title, description, content in (_item_fields(item) for _, item in ranked_items)
+            ])
             
             documents = []
-            for search_query in optimized_queries:
-                try:
-                    logger.info(f"🔥 FireCrawl搜索: {search_query}")
-                    
-                    # 使用FireCrawl的搜索功能 - 通过REST API调用
-                    import requests
-                    import os
-                    
-                    api_key = os.getenv('FIRECRAWL_API_KEY')
-                    if not api_key:
-                        logger.error("❌ FireCrawl API密钥未配置")
-                        continue
-                    
-                    headers = {
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {api_key}'
-                    }
-                    
-                    payload = {
-                        'query': search_query,
-                        'limit': 5,
-                        'scrapeOptions': {
-                            'formats': ['markdown', 'html']
-                        }
-                    }
-                    
-                    response = requests.post(
-                        'https://api.firecrawl.dev/v1/search',
-                        json=payload,
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        search_result = response.json()
-                        
-                        if search_result.get('success') and search_result.get('data'):
-                            for item in search_result['data']:
-                                doc = self._process_firecrawl_search_result(item, query, original_query)
-                                if doc:
-                                    documents.append(doc)
-                            
-                            logger.info(f"✅ FireCrawl搜索 '{search_query}' 返回 {len(search_result['data'])} 个结果")
-                        else:
-                            logger.warning(f"⚠️ FireCrawl搜索 '{search_query}' 无结果")
-                    else:
-                        logger.error(f"❌ FireCrawl搜索失败 '{search_query}': HTTP {response.status_code}")
-                    
-                    # 添加延迟避免API频率限制
-                    time.sleep(random.uniform(0.5, 1.0))
-                    
-                except Exception as e:
-                    if "429" in str(e) or "rate limit" in str(e).lower():
-                        logger.warning(f"⚠️ FireCrawl API频率限制，跳过查询: {search_query}")
-                        time.sleep(2)
-                        continue
-                    else:
-                        logger.error(f"❌ FireCrawl搜索失败 '{search_query}': {e}")
-                        continue
+            for (rank, item), score in zip(ranked_items, scores.tolist()):
+                hit = self._process_firecrawl_search_result(item, query, original_query, relevance_score=score)
+                if hit:
+                    # 记录在该次搜索结果中的排名，供RRF融合使用
+                    hit.metadata.rank = rank
+                    documents.append(hit)
             
             return documents
             
@@ -395,35 +1006,89 @@ class EnhancedOnlineSearchEngine:
             logger.error(f"❌ FireCrawl搜索整体失败: {e}")
             return []
     
-    def _generate_huawei_optimized_queries(self, user_query: str) -> List[str]:
+    async def _search_one(self,
+                          semaphore: asyncio.Semaphore,
+                          search_query: str) -> List[Dict]:
         """
-        生成华为优化的搜索查询
+        执行单个FireCrawl搜索请求，经令牌桶限流；遇到429时按decorrelated jitter异步退避重试
         
         Args:
-            user_query: 用户查询
+            semaphore: 限制并发请求数的信号量
+            search_query: 搜索查询
             
         Returns:
-            优化后的查询列表
+            FireCrawl返回的结果项列表
         """
-        queries = []
+        cache_key = make_cache_key('fc', search_query)
+        if self._cache is not None:
+            cached = await asyncio.to_thread(self._cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"📦 FireCrawl搜索命中缓存: {search_query}")
+                return cached
         
-        # 原始查询
-        queries.append(user_query)
+        payload = {
+            'query': search_query,
+            'limit': 5,
+            'scrapeOptions': {
+                # 只请求实际使用的markdown，响应体约减半
+                'formats': ['markdown']
+            }
+        }
         
-        # 添加华为域名限制的查询
-        huawei_domains = [
-            "site:developer.huawei.com",
-            "site:developer.harmonyos.com", 
-            "site:consumer.huawei.com",
-            "site:forums.developer.huawei.com"
-        ]
+        delay = SEARCH_BACKOFF_BASE
+        for attempt in range(1, SEARCH_MAX_RETRIES + 1):
+            try:
+                async with semaphore, self._limiter:
+                    logger.info(f"🔥 FireCrawl搜索: {search_query}")
+                    response = await self.http.post(FIRECRAWL_SEARCH_PATH, json=payload)
+                
+                if response.status_code == 429:
+                    self._throttled += 1
+                    if attempt == SEARCH_MAX_RETRIES:
+                        logger.warning(f"⚠️ FireCrawl API频率限制，跳过查询: {search_query}")
+                        return []
+                    delay = min(SEARCH_BACKOFF_CAP, random.uniform(SEARCH_BACKOFF_BASE, delay * 3))
+                    self._retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                
+                if response.status_code != 200:
+                    logger.error(f"❌ FireCrawl搜索失败 '{search_query}': HTTP {response.status_code}")
+                    return []
+                
+                search_result = json.loads(response.content)
+                if search_result.get('success') and search_result.get('data'):
+                    logger.info(f"✅ FireCrawl搜索 '{search_query}' 返回 {len(search_result['data'])} 个结果")
+                    if self._cache is not None:
+                        await asyncio.to_thread(self._cache.set, cache_key, search_result['data'])
+                    return search_result['data']
+                
+                logger.warning(f"⚠️ FireCrawl搜索 '{search_query}' 无结果")
+                return []
+                
+            except Exception as e:
+                logger.error(f"❌ FireCrawl搜索失败 '{search_query}': {e}")
+                return []
         
-        for domain in huawei_domains:
-            queries.append(f"{user_query} {domain}")
+        return []
+    
+    def _generate_huawei_optimized_queries(self, user_query: str) -> List[str]:
+        """
+        生成华为优化的搜索查询
         
-        return queries[:3]  # 限制查询数量避免过度调用API
+        Args:
+            user_query: 用户查询
+            
+        Returns:
+            优化后的查询列表
+        """
+        return list(_huawei_optimized_queries(user_query))
     
-    def _process_firecrawl_search_result(self, item: Dict, query: str, user_query: str) -> Optional[Document]:
+    def _process_firecrawl_search_result(self,
+                                         item: Dict,
+                                         query: str,
+                                         user_query: str,
+                                         relevance_score: Optional[float] = None) -> Optional[_Doc]:
         """
         处理FireCrawl搜索结果
         
@@ -431,16 +1096,13 @@ class EnhancedOnlineSearchEngine:
             item: FireCrawl搜索结果项
             query: 搜索查询
             user_query: 原始用户查询
+            relevance_score: 已批量计算的相关性分数，为None时单独计算
             
         Returns:
-            处理后的文档对象
+            (正文, 元数据)
         """
         try:
-            url = item.get('url', '')
-            title = item.get('title', '')
-            # 优先使用markdown内容，如果没有则使用description
-            content = item.get('markdown', '') or item.get('content', '') or item.get('description', '')
-            description = item.get('description', '')
+            url, title, description, content = _item_fields(item)
             
             if not content and not description:
                 return None
@@ -449,25 +1111,24 @@ class EnhancedOnlineSearchEngine:
             is_huawei_official = self._is_huawei_official_content(url, title, content)
             
             # 计算相关性分数
-            relevance_score = self._calculate_relevance_score(content, title, description, user_query)
+            if relevance_score is None:
+                relevance_score = self._calculate_relevance_score(content, title, description, user_query)
             
-            # 创建文档对象
+            # 组装正文
             full_content = f"{title}\n\n{content}"
             if description and description not in content:
                 full_content += f"\n\n{description}"
             
-            metadata = {
-                'source': url,
-                'title': title,
-                'description': description,
-                'query': query,
-                'user_query': user_query,
-                'relevance_score': relevance_score,
-                'is_huawei_official': is_huawei_official,
-                'timestamp': time.time()
-            }
-            
-            return Document(page_content=full_content, metadata=metadata)
+            return _Doc(full_content, HitMeta(
+                source=url,
+                title=title,
+                description=description,
+                query=query,
+                user_query=user_query,
+                relevance_score=relevance_score,
+                is_huawei_official=is_huawei_official,
+                timestamp=time.time()
+            ))
             
         except Exception as e:
             logger.error(f"❌ 处理FireCrawl搜索结果失败: {e}")
@@ -485,24 +1146,11 @@ class EnhancedOnlineSearchEngine:
         Returns:
             是否为华为官方内容
         """
-        huawei_domains = [
-            'developer.huawei.com',
-            'developer.harmonyos.com',
-            'consumer.huawei.com',
-            'forums.developer.huawei.com',
-            'huaweicloud.com'
-        ]
-        
-        # 检查URL域名
-        for domain in huawei_domains:
-            if domain in url.lower():
-                return True
-        
-        # 检查标题和内容中的华为标识
-        huawei_indicators = ['华为', 'huawei', 'hms', 'harmonyos', '鸿蒙']
-        text_to_check = f"{title} {content}".lower()
-        
-        return any(indicator in text_to_check for indicator in huawei_indicators)
+        return bool(
+            _HUAWEI_OFFICIAL_RE.search(url)
+            or _HUAWEI_OFFICIAL_RE.search(title)
+            or _HUAWEI_OFFICIAL_RE.search(content, 0, OFFICIAL_CHECK_LENGTH)
+        )
     
     def _calculate_relevance_score(self, content: str, title: str, description: str, user_query: str) -> float:
         """
@@ -517,33 +1165,53 @@ class EnhancedOnlineSearchEngine:
         Returns:
             相关性分数 (0-1)
         """
-        score = 0.0
-        query_terms = user_query.lower().split()
-        
-        # 检查标题匹配
-        title_lower = title.lower()
-        title_matches = sum(1 for term in query_terms if term in title_lower)
-        score += (title_matches / len(query_terms)) * 0.4
-        
-        # 检查内容匹配
-        content_lower = content.lower()
-        content_matches = sum(1 for term in query_terms if term in content_lower)
-        score += (content_matches / len(query_terms)) * 0.4
+        return float(_keyword_relevance_scores(user_query, [(title, content, description)])[0])
+    
+    def _semantic_scores(self, query: str, docs: List[_Doc]) -> np.ndarray:
+        """
+        一次批量嵌入查询和所有文档，计算查询与各文档的余弦相似度
         
-        # 检查描述匹配
-        if description:
-            desc_lower = description.lower()
-            desc_matches = sum(1 for term in query_terms if term in desc_lower)
-            score += (desc_matches / len(query_terms)) * 0.2
+        Args:
+            query: 用户查询
+            docs: 文档列表
+            
+        Returns:
+            与docs顺序一致的相似度数组
+        """
+        texts = [query] + [content[:SEMANTIC_TEXT_LENGTH] for content, _ in docs]
+        cached = self._cached_embeddings(texts)
+        if cached is not None:
+            # 直接在int8向量上计算余弦，缩放系数相互抵消
+            quantized, _ = cached
+            return int8_cosine(quantized[0], quantized[1:])
         
-        return min(score, 1.0)
+        vecs = np.asarray(self.embedding_model.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs /= np.where(norms == 0, 1.0, norms)
+        return vecs[1:] @ vecs[0]
     
-    def _deduplicate_and_rank_documents(self, documents: List[Document], user_query: str) -> List[Document]:
+    def _apply_semantic_scores(self, query: str, docs: List[_Doc]) -> None:
+        """将语义相似度写入文档的relevance_score，嵌入模型不可用时保留关键词重叠分数"""
+        if not docs or not self._ensure_components_initialized():
+            return
+        try:
+            scores = self._semantic_scores(query, docs)
+        except Exception as e:
+            logger.warning(f"⚠️ 语义重排失败，使用关键词相关性分数: {e}")
+            return
+        for (_, meta), score in zip(docs, scores.tolist()):
+            meta.relevance_score = max(score, 0.0)
+        logger.info(f"🧮 语义重排完成，共 {len(docs)} 个文档")
+    
+    def _deduplicate_and_rank_documents(self, documents: List[_Doc], user_query: str) -> List[_Doc]:
         """
         去重和排序文档
         
+        同一页面在各子查询结果中的排名按RRF累加：score = Σ 1/(RRF_K + rank)，
+        华为官方内容乘以 OFFICIAL_BOOST，相关性分数作为次要排序依据。
+        
         Args:
-            documents: 文档列表
+            documents: 文档列表（元数据中带有所在搜索结果的rank）
             user_query: 用户查询
             
         Returns:
@@ -552,30 +1220,46 @@ class EnhancedOnlineSearchEngine:
         if not documents:
             return []
         
-        # 基于URL去重
-        seen_urls = set()
-        unique_docs = []
-        
+        # 按规范化URL指纹融合排名，每个页面保留相关性最高的文档对象
+        rrf_scores = defaultdict(float)
+        docs_by_fp = {}
         for doc in documents:
-            url = doc.metadata.get('source', '')
-            if url not in seen_urls:
-                seen_urls.add(url)
-                unique_docs.append(doc)
+            meta = doc.metadata
+            fingerprint = _url_fingerprint(meta.source)
+            rrf_scores[fingerprint] += 1.0 / (RRF_K + meta.rank)
+            best = docs_by_fp.get(fingerprint)
+            if best is None or meta.relevance_score > best.metadata.relevance_score:
+                docs_by_fp[fingerprint] = doc
         
-        # 排序：华为官方内容优先，然后按相关性分数排序
-        def sort_key(doc):
-            is_official = doc.metadata.get('is_huawei_official', False)
-            relevance = doc.metadata.get('relevance_score', 0)
-            return (not is_official, -relevance)  # 官方内容优先，相关性高的优先
+        # 嵌入模型可用时，用查询与文档的余弦相似度替换关键词重叠分数
+        self._apply_semantic_scores(user_query, list(docs_by_fp.values()))
         
-        unique_docs.sort(key=sort_key)
+        heap = []
+        for order, (fingerprint, doc) in enumerate(docs_by_fp.items()):
+            meta = doc.metadata
+            score = rrf_scores[fingerprint]
+            if meta.is_huawei_official:
+                score *= OFFICIAL_BOOST
+            meta.rrf_score = score
+            heap.append((-score, -meta.relevance_score, order, doc))
+        heapq.heapify(heap)
         
-        # 限制返回数量
-        return unique_docs[:self.max_search_results]
+        # 按分数依次取出，丢弃正文近似重复的页面，凑满所需数量即停止
+        kept_simhashes = []
+        ranked_docs = []
+        while heap and len(ranked_docs) < self.max_search_results:
+            doc = heapq.heappop(heap)[-1]
+            content_hash = _simhash(doc.page_content)
+            if any((content_hash ^ kept).bit_count() < SIMHASH_MAX_DISTANCE for kept in kept_simhashes):
+                continue
+            kept_simhashes.append(content_hash)
+            ranked_docs.append(doc)
+        
+        return ranked_docs
     
     def _generate_comprehensive_answer_with_llm(self, 
                                                user_query: str, 
-                                               documents: List[Document], 
+                                               documents: List[_Doc], 
                                                sub_queries: List[str],
                                                search_results_summary: Dict[str, int]) -> str:
         """
@@ -590,66 +1274,77 @@ class EnhancedOnlineSearchEngine:
         Returns:
             生成的综合答案
         """
-        try:
-            if not self._ensure_components_initialized():
-                logger.warning("⚠️ LLM未初始化，使用简单答案生成")
-                return self._generate_simple_answer(user_query, documents)
-            
-            # 准备文档内容
-            context_parts = []
-            for i, doc in enumerate(documents, 1):
-                title = doc.metadata.get('title', f'文档{i}')
-                url = doc.metadata.get('source', '')
-                content = doc.page_content[:1500]  # 限制长度避免token过多
-                
-                context_part = f"## 来源{i}: {title}\n"
-                if url:
-                    context_part += f"链接: {url}\n"
-                context_part += f"内容: {content}\n"
-                context_parts.append(context_part)
-            
-            context = "\n".join(context_parts)
-            
-            # 构建综合答案生成的提示词
-            answer_prompt = f"""
-作为华为技术专家，请基于以下搜索到的华为官方文档和技术资料，为用户提供准确、全面的答案。
-
-用户问题: {user_query}
-
-搜索策略: 
-- 执行了 {len(sub_queries)} 个相关查询
-- 共找到 {len(documents)} 个相关文档
-- 查询分解: {', '.join(sub_queries)}
-
-相关文档内容:
-{context}
-
-请遵循以下要求:
-1. 基于提供的华为官方文档内容回答问题
-2. 答案要准确、详细、实用
-3. 如果涉及代码示例，请提供具体的实现方法
-4. 突出华为技术栈的特点和优势
-5. 如果有多个相关方面，请分点详细说明
-6. 在答案末尾简要说明信息来源的可靠性
-
-请生成一个专业、详细的答案:
-"""
-            
-            # 调用LLM生成答案
-            logger.info("🧠 正在使用LLM生成综合答案...")
-            messages = [{"role": "user", "content": answer_prompt}]
-            response = self.llm.chat(messages)
-            
-            answer = response.content.strip()
-            logger.info(f"✅ LLM答案生成成功，长度: {len(answer)} 字符")
-            
-            return answer
+        return "".join(self._stream_comprehensive_answer_with_llm(
+            user_query, documents, sub_queries, search_results_summary
+        )).strip()
+    
+    def _stream_comprehensive_answer_with_llm(self, 
+                                              user_query: str, 
+                                              documents: List[_Doc], 
+                                              sub_queries: List[str],
+                                              search_results_summary: Dict[str, int]) -> Iterator[str]:
+        """
+        使用LLM流式生成综合答案，LLM不可用或在输出前失败时产出简单答案
+        
+        Args:
+            user_query: 用户查询
+            documents: 搜索到的文档
+            sub_queries: 子查询列表
+            search_results_summary: 搜索结果摘要
             
+        Yields:
+            答案文本片段
+        """
+        if not self._ensure_components_initialized():
+            logger.warning("⚠️ LLM未初始化，使用简单答案生成")
+            yield self._generate_simple_answer(user_query, documents)
+            return
+        
+        # 准备文档内容
+        context_parts = []
+        for i, (page_content, meta) in enumerate(documents, 1):
+            title = meta.title or f'文档{i}'
+            url = meta.source
+            content = _truncate_to_tokens(page_content, CONTEXT_TOKENS_PER_DOC)
+            
+            context_part = f"## 来源{i}: {title}\n"
+            if url:
+                context_part += f"链接: {url}\n"
+            context_part += f"内容: {content}\n"
+            context_parts.append(context_part)
+        
+        context = "\n".join(context_parts)
+        
+        # 调用LLM生成答案
+        logger.info("🧠 正在使用LLM生成综合答案...")
+        messages = _build_messages(
+            _ANSWER_SYSTEM_PROMPT, ANSWER_PROMPT_TMPL,
+            user_query=user_query,
+            query_count=len(sub_queries),
+            document_count=len(documents),
+            sub_queries=', '.join(sub_queries),
+            context=context
+        )
+        
+        length = 0
+        try:
+            for chunk in self._stream_llm(messages):
+                length += len(chunk)
+                yield chunk
         except Exception as e:
+            if length:
+                logger.warning(f"⚠️ LLM答案生成中断: {e}")
+                return
             logger.warning(f"⚠️ LLM答案生成失败: {e}，使用简单答案生成")
-            return self._generate_simple_answer(user_query, documents)
+            yield self._generate_simple_answer(user_query, documents)
+            return
+        logger.info(f"✅ LLM答案生成成功，长度: {length} 字符")
+    
+    def _stream_llm(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """以流式方式调用LLM，产出答案文本片段"""
+        return stream_llm_chat(self.llm, messages)
     
-    def _generate_simple_answer(self, user_query: str, documents: List[Document]) -> str:
+    def _generate_simple_answer(self, user_query: str, documents: List[_Doc]) -> str:
         """
         生成简单答案（当LLM不可用时）
         
@@ -665,10 +1360,10 @@ class EnhancedOnlineSearchEngine:
         
         answer_parts = [f"根据搜索到的 {len(documents)} 个华为技术文档，以下是相关信息：\n"]
         
-        for i, doc in enumerate(documents, 1):
-            title = doc.metadata.get('title', f'文档{i}')
-            url = doc.metadata.get('source', '')
-            content = doc.page_content[:300]  # 限制长度
+        for i, (page_content, meta) in enumerate(documents, 1):
+            title = meta.title or f'文档{i}'
+            url = meta.source
+            content = page_content[:300]  # 限制长度
             
             answer_parts.append(f"## {i}. {title}")
             if url:
@@ -724,25 +1419,12 @@ class EnhancedOnlineSearchEngine:
                     local_parts.append(f"- {title}: {content}")
                 local_context = "\n".join(local_parts)
             
-            hybrid_prompt = f"""
-作为华为技术专家，请基于本地知识库和在线搜索的信息，为用户提供综合性的答案。
-
-用户问题: {user_query}
-
-本地知识库信息:
-{local_context if local_context else "无相关本地信息"}
-
-在线搜索信息:
-{online_answer if online_answer else "无在线搜索结果"}
-
-请综合以上信息，生成一个准确、全面的答案：
-1. 整合本地和在线信息
-2. 去除重复内容
-3. 突出最重要的信息
-4. 保持逻辑清晰
-"""
-            
-            messages = [{"role": "user", "content": hybrid_prompt}]
+            messages = _build_messages(
+                _HYBRID_SYSTEM_PROMPT, HYBRID_PROMPT_TMPL,
+                user_query=user_query,
+                local_context=local_context or "无相关本地信息",
+                online_answer=online_answer or "无在线搜索结果"
+            )
             response = self.llm.chat(messages)
             
             return response.content.strip()
@@ -765,7 +1447,7 @@ class EnhancedOnlineSearchEngine:
             
             return "\n".join(answer_parts) if answer_parts else "未找到相关信息。"
     
-    def _prepare_sources_info(self, documents: List[Document]) -> List[Dict[str, Any]]:
+    def _prepare_sources_info(self, documents: List[_Doc]) -> List[Dict[str, Any]]:
         """
         准备信息源信息
         
@@ -776,13 +1458,14 @@ class EnhancedOnlineSearchEngine:
             信息源列表
         """
         sources = []
-        for doc in documents:
+        for page_content, meta in documents:
             source_info = {
-                'title': doc.metadata.get('title', '未知标题'),
-                'url': doc.metadata.get('source', ''),
-                'description': doc.metadata.get('description', ''),
-                'relevance_score': doc.metadata.get('relevance_score', 0),
-                'is_huawei_official': doc.metadata.get('is_huawei_official', False)
+                'title': meta.title or '未知标题',
+                'url': meta.source,
+                'description': meta.description,
+                'preview': page_content[:RAGConfig.SOURCE_PREVIEW_LENGTH].strip() + "...",
+                'relevance_score': meta.relevance_score,
+                'is_huawei_official': meta.is_huawei_official
             }
             sources.append(source_info)
         
@@ -6,10 +6,24 @@
 
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional
+import copy
+import os
+import threading
+import time
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Any, Optional, Tuple, Union
 from pathlib import Path
 
+from openai import OpenAIError
+from pymilvus.exceptions import MilvusException
+
+from deepsearcher import configuration
+from deepsearcher.agent.chain_of_rag import ChainOfRAG
+from deepsearcher.agent.deep_search import DeepSearch
 from deepsearcher.configuration import Configuration, init_config
+from deepsearcher.offline_loading import _filter_new_chunks, _get_existing_document_ids
 
 from .config import CrawlerConfig, RAGConfig
 from .crawler import HuaweiContentCrawler
@@ -17,6 +31,38 @@ from .adapter import HuaweiDeepSearcherAdapter
 
 logger = logging.getLogger(__name__)
 
+# 流水线阶段日志分隔线
+_SEP = "=" * 50
+_BANNER = "\n" + _SEP
+
+# 检索、RAG和向量化过程中预期可能出现的错误（网络/向量数据库/LLM接口/数据格式），
+# 其余异常视为程序错误直接抛出
+_EXPECTED_SEARCH_ERRORS = (OSError, ValueError, KeyError, RuntimeError, MilvusException, OpenAIError)
+
+# RAG查询微批处理：收集窗口（秒）与单批最大请求数
+RAG_BATCH_WINDOW = 0.02
+RAG_BATCH_MAX_SIZE = 16
+
+# 流式流水线各阶段间队列容量（页面数 / 批次数），队列满时上游等待形成背压
+PIPELINE_PAGE_QUEUE_SIZE = 32
+PIPELINE_BATCH_QUEUE_SIZE = 8
+# 阶段结束标记
+_STAGE_DONE = object()
+# 内容文件stat结果的缓存时间（秒）
+CONTENT_STAT_TTL = 1.0
+# 向量化I/O线程池大小（远程嵌入与向量数据库写入重叠执行）
+IO_POOL_WORKERS = 4
+
+
+def _install_event_loop_policy():
+    """安装了uvloop时使用其事件循环，加速爬虫的大量并发网络请求"""
+    if importlib.util.find_spec('uvloop') is None:
+        return
+    import uvloop
+    if not isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy):
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("⚡ 已启用uvloop事件循环")
+
 class HuaweiRAGPipeline:
     """华为RAG流水线 - 完整的内容处理流程"""
     
@@ -32,16 +78,72 @@ class HuaweiRAGPipeline:
         
         self.crawler = None
         self.adapter = None
+        # 尚未初始化适配器时，仅用于列出内容文件的适配器
+        self._file_list_adapter = None
+        # RAG智能体缓存，键为(智能体类型, top_k)；智能体不保存查询状态，可被多个线程同时使用
+        self._rag_agents: Dict[Tuple[str, int], Any] = {}
+        # 批处理的RAG请求在线程池中并发执行，适配器与智能体的惰性创建需要加锁
+        self._init_lock = threading.RLock()
+        # DeepSearcher是否已完成配置
+        self._deepsearcher_ready = False
+        # 状态缓存：(生成时间, 内容文件与集合状态)
+        self._status_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # 向量化I/O线程池，首次加载时创建
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        # 异步RAG请求队列及其批处理协程（绑定到首次调用时的事件循环）
+        self._rag_queue: Optional[asyncio.Queue] = None
+        self._rag_worker: Optional[asyncio.Task] = None
+        # 正在执行的RAG批次任务（保留引用，避免任务在完成前被回收）
+        self._rag_batches: set = set()
+        # 向量数据库内容版本，每次加载后递增，搜索代理据此使查询缓存失效
+        self.index_version = 0
         
         # 确保目录存在
         self.crawler_config.ensure_directories()
+        # 爬虫输出的内容文件路径
+        self._content_file = self.crawler_config.PROCESSED_DATA_DIR / self.crawler_config.OUTPUT_FILE
+        # 内容文件stat缓存：(检查时间, stat结果或None)
+        self._content_stat_cache: Optional[Tuple[float, Optional[os.stat_result]]] = None
+        
+        _install_event_loop_policy()
         
         logger.info("🚀 华为RAG流水线初始化完成")
     
+    def _content_file_stat(self) -> Optional[os.stat_result]:
+        """内容文件的stat结果（不存在时为None），短时间内复用上次结果"""
+        now = time.monotonic()
+        if self._content_stat_cache is None or now - self._content_stat_cache[0] >= CONTENT_STAT_TTL:
+            try:
+                stat = os.stat(self._content_file)
+            except FileNotFoundError:
+                stat = None
+            self._content_stat_cache = (now, stat)
+        return self._content_stat_cache[1]
+    
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        """向量化I/O线程池（延迟创建，在多次加载间复用）"""
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="huawei-rag-io")
+        return self._io_pool
+    
+    def close(self):
+        """释放流水线持有的线程池"""
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=False)
+            self._io_pool = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+    
     def setup_deepsearcher(self, 
                           llm_model: str = None,
                           embedding_model: str = None,
-                          vector_db_config: Dict = None):
+                          vector_db_config: Dict = None,
+                          embedding_dtype: str = None):
         """
         设置DeepSearcher配置
         
@@ -49,13 +151,22 @@ class HuaweiRAGPipeline:
             llm_model: LLM模型名称
             embedding_model: 嵌入模型名称  
             vector_db_config: 向量数据库配置
+            embedding_dtype: 向量存储精度 ("float32", "float16")，float16使传输和存储的向量字节数减半，
+                更改精度需要重建集合
+        
+        Note:
+            单查询线程数、并发查询工作线程数和查询排队上限属于Milvus服务端配置，客户端不接受这些参数，
+            需在服务端设置；设置时应使 单查询线程数 × 并发工作线程数 不超过 CPU核数-1，避免线程争用
         """
         logger.info("⚙️ 设置DeepSearcher配置...")
         
         # 使用默认配置或传入的配置
         llm_model = llm_model or self.rag_config.DEFAULT_LLM_MODEL
         embedding_model = embedding_model or self.rag_config.DEFAULT_EMBEDDING_MODEL
-        vector_db_config = vector_db_config or self.rag_config.DEFAULT_VECTOR_DB_CONFIG
+        vector_db_config = dict(vector_db_config or self.rag_config.DEFAULT_VECTOR_DB_CONFIG)
+        
+        if embedding_dtype:
+            vector_db_config['vector_dtype'] = embedding_dtype
         
         # 创建配置
         config = Configuration()
@@ -65,11 +176,16 @@ class HuaweiRAGPipeline:
         
         # 应用配置
         init_config(config)
+        # 全局LLM/向量库已替换，之前创建的RAG智能体失效
+        with self._init_lock:
+            self._rag_agents = {}
+        self._deepsearcher_ready = True
         
-        logger.info(f"✅ DeepSearcher配置完成")
-        logger.info(f"   LLM: {self.rag_config.DEFAULT_LLM_PROVIDER}/{llm_model}")
-        logger.info(f"   嵌入模型: {self.rag_config.DEFAULT_EMBEDDING_PROVIDER}/{embedding_model}")
-        logger.info(f"   向量数据库: {self.rag_config.DEFAULT_VECTOR_DB_PROVIDER}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ DeepSearcher配置完成")
+            logger.info("   LLM: %s/%s", self.rag_config.DEFAULT_LLM_PROVIDER, llm_model)
+            logger.info("   嵌入模型: %s/%s", self.rag_config.DEFAULT_EMBEDDING_PROVIDER, embedding_model)
+            logger.info("   向量数据库: %s", self.rag_config.DEFAULT_VECTOR_DB_PROVIDER)
     
     def initialize_crawler(self, links_file: str = None) -> HuaweiContentCrawler:
         """初始化爬虫"""
@@ -90,31 +206,33 @@ class HuaweiRAGPipeline:
             collection_name: 集合名称
             content_type: 内容类型选择 ("auto", "expanded", "basic", "all")
         """
+        # 双重检查：已初始化时无需加锁；并发的首次调用只创建一个适配器
         if self.adapter is None:
-            logger.info("🔄 初始化DeepSearcher适配器...")
-            
-            # 确保DeepSearcher已配置
-            try:
-                from deepsearcher.configuration import vector_db, embedding_model
-                if vector_db is None or embedding_model is None:
-                    logger.info("⚙️ DeepSearcher未配置，正在自动配置...")
-                    self.setup_deepsearcher()
-            except Exception as e:
-                logger.warning(f"⚠️ 检查DeepSearcher配置时出错: {e}")
-                logger.info("⚙️ 重新配置DeepSearcher...")
-                self.setup_deepsearcher()
-            
-            collection_name = collection_name or self.rag_config.DEFAULT_COLLECTION_NAME
-            
-            self.adapter = HuaweiDeepSearcherAdapter(
-                collection_name=collection_name,
-                chunk_size=self.rag_config.DEFAULT_CHUNK_SIZE,
-                chunk_overlap=self.rag_config.DEFAULT_CHUNK_OVERLAP,
-                content_type=content_type
-            )
-            logger.info("✅ 适配器初始化完成")
+            with self._init_lock:
+                if self.adapter is None:
+                    logger.info("🔄 初始化DeepSearcher适配器...")
+                    
+                    # 确保DeepSearcher已配置（可能已由外部调用init_config完成）
+                    if not self._deepsearcher_ready:
+                        if configuration.vector_db is None or configuration.embedding_model is None:
+                            logger.info("⚙️ DeepSearcher未配置，正在自动配置...")
+                            self.setup_deepsearcher()
+                        else:
+                            self._deepsearcher_ready = True
+                    
+                    collection_name = collection_name or self.rag_config.DEFAULT_COLLECTION_NAME
+                    
+                    self.adapter = HuaweiDeepSearcherAdapter(
+                        collection_name=collection_name,
+                        chunk_size=self.rag_config.DEFAULT_CHUNK_SIZE,
+                        chunk_overlap=self.rag_config.DEFAULT_CHUNK_OVERLAP,
+                        content_type=content_type,
+                        dedup_dir=self.crawler_config.CHUNK_HASH_DIR
+                    )
+                    self._status_cache = None
+                    logger.info("✅ 适配器初始化完成")
         return self.adapter
-    
+                    
     async def crawl_content(self, 
                            links_file: str = None, 
                            force_recrawl: bool = False) -> bool:
@@ -129,9 +247,8 @@ class HuaweiRAGPipeline:
             logger.info("🕷️ 开始爬取华为文档内容...")
             
             # 检查是否已有内容且不强制重新爬取
-            content_file = self.crawler_config.PROCESSED_DATA_DIR / self.crawler_config.OUTPUT_FILE
-            if content_file.exists() and not force_recrawl:
-                logger.info(f"📂 发现已存在的内容文件: {content_file}")
+            if self._content_file_stat() is not None and not force_recrawl:
+                logger.info("📂 发现已存在的内容文件: %s", self._content_file)
                 logger.info("💡 如需重新爬取，请设置 force_recrawl=True")
                 return True
             
@@ -145,34 +262,39 @@ class HuaweiRAGPipeline:
                 return False
             
             # 开始爬取
-            logger.info(f"📋 开始爬取 {len(urls)} 个页面...")
+            logger.info("📋 开始爬取 %s 个页面...", len(urls))
             crawled_content = await crawler.crawl_content(urls)
+            self._status_cache = None
+            self._content_stat_cache = None
             
             if not crawled_content:
                 logger.error("❌ 爬取失败，没有获得任何内容")
                 return False
             
-            # 生成统计信息
-            stats = crawler.generate_statistics()
-            logger.info("📊 爬取完成统计:")
-            logger.info(f"   ✅ 成功: {stats['total_pages']} 页")
-            logger.info(f"   ❌ 失败: {stats['failed_pages']} 页")
-            logger.info(f"   ⏩ 跳过: {stats['skipped_pages']} 页")
-            logger.info(f"   📝 总文本长度: {stats['total_text_length']:,} 字符")
-            logger.info(f"   💻 总代码块: {stats['total_code_blocks']} 个")
+            # 生成统计信息（遍历全部页面，仅在输出INFO日志时计算）
+            if logger.isEnabledFor(logging.INFO):
+                stats = crawler.generate_statistics()
+                logger.info("📊 爬取完成统计:")
+                logger.info("   ✅ 成功: %s 页", stats['total_pages'])
+                logger.info("   ❌ 失败: %s 页", stats['failed_pages'])
+                logger.info("   ⏩ 跳过: %s 页", stats['skipped_pages'])
+                logger.info("   📝 总文本长度: %s 字符", format(stats['total_text_length'], ','))
+                logger.info("   💻 总代码块: %s 个", stats['total_code_blocks'])
             
             return True
             
         except Exception as e:
-            logger.error(f"❌ 爬取内容失败: {e}")
+            logger.error("❌ 爬取内容失败: %s", e)
             return False
     
     def load_to_vector_database(self, 
                                collection_name: str = None,
                                force_new_collection: bool = False,
                                incremental_update: bool = True,
-                               batch_size: int = 64,
-                               content_type: str = "auto") -> bool:
+                               batch_size: int = None,
+                               content_type: str = "auto",
+                               embed_batch_size: int = None,
+                               upsert_batch_size: int = None) -> bool:
         """
         加载内容到向量数据库
         
@@ -180,8 +302,10 @@ class HuaweiRAGPipeline:
             collection_name: 集合名称
             force_new_collection: 是否强制创建新集合
             incremental_update: 是否启用增量更新，仅处理新文档
-            batch_size: 批处理大小
+            batch_size: 已弃用，等同于embed_batch_size
             content_type: 内容类型选择 ("auto", "expanded", "basic", "all")
+            embed_batch_size: 每次嵌入调用的文档块数量
+            upsert_batch_size: 每次写入向量数据库的文档块数量
         """
         try:
             logger.info("💾 开始加载内容到向量数据库...")
@@ -192,7 +316,7 @@ class HuaweiRAGPipeline:
             # 检查内容文件是否存在
             content_file = Path(adapter.content_file)
             if not content_file.exists() and adapter.content_type != "all":
-                logger.error(f"❌ 内容文件不存在: {content_file}")
+                logger.error("❌ 内容文件不存在: %s", content_file)
                 logger.info("💡 请先运行爬虫生成内容文件")
                 return False
             
@@ -205,19 +329,24 @@ class HuaweiRAGPipeline:
             success = adapter.load_to_vector_database(
                 force_new_collection=force_new_collection,
                 incremental_update=incremental_update,
-                batch_size=batch_size
+                embed_batch_size=embed_batch_size or batch_size,
+                upsert_batch_size=upsert_batch_size,
+                executor=self.io_pool
             )
             
+            # 加载失败时也可能已写入部分文档块
+            self.index_version += 1
+            self._status_cache = None
             if success:
                 # 显示集合信息
                 collection_info = adapter.get_collection_info()
                 if collection_info.get('exists'):
-                    logger.info(f"📚 集合信息: {collection_info['name']} ({collection_info.get('count', 0)} 个文档)")
+                    logger.info("📚 集合信息: %s (%s 个文档)", collection_info['name'], collection_info.get('count', 0))
             
             return success
             
-        except Exception as e:
-            logger.error(f"❌ 加载到向量数据库失败: {e}")
+        except _EXPECTED_SEARCH_ERRORS as e:
+            logger.error("❌ 加载到向量数据库失败: %s", e)
             return False
     
     def search(self, 
@@ -247,8 +376,8 @@ class HuaweiRAGPipeline:
             
             return results
             
-        except Exception as e:
-            logger.error(f"❌ 搜索失败: {e}")
+        except _EXPECTED_SEARCH_ERRORS as e:
+            logger.error("❌ 搜索失败: %s", e)
             return []
     
     def search_with_rag(self, 
@@ -256,7 +385,8 @@ class HuaweiRAGPipeline:
                        top_k: int = 5,
                        content_type: str = None,
                        collection_name: str = None,
-                       use_chain_of_rag: bool = False) -> List[Dict]:
+                       use_chain_of_rag: bool = False,
+                       legacy_format: bool = True) -> Union[List[Dict], Dict[str, Any]]:
         """
         使用DeepSearcher的高级RAG功能搜索华为文档
         
@@ -266,69 +396,294 @@ class HuaweiRAGPipeline:
             content_type: 内容类型过滤 ('text', 'code')
             collection_name: 集合名称
             use_chain_of_rag: 是否使用ChainOfRAG进行多步推理搜索
+            legacy_format: 为True时返回结果列表，并在每个结果中附带rag_answer（兼容旧调用方）
+            
+        Returns:
+            legacy_format=False时返回 {'answer': RAG答案, 'results': 结果列表, 'token_usage': token数}，
+            降级为普通搜索时answer为None
         """
         try:
             # 初始化适配器
             adapter = self.initialize_adapter(collection_name)
             
             # 使用DeepSearcher的高级RAG功能
-            from deepsearcher.configuration import llm, embedding_model, vector_db
-            from deepsearcher.agent.naive_rag import NaiveRAG
-            from deepsearcher.agent.chain_of_rag import ChainOfRAG
-            from deepsearcher.agent.deep_search import DeepSearch
-            
-            if use_chain_of_rag:
-                # 使用ChainOfRAG进行多步推理搜索
-                rag_agent = ChainOfRAG(
-                    llm=llm,
-                    embedding_model=embedding_model,
-                    vector_db=vector_db,
-                    max_iter=3,
-                    early_stopping=True
-                )
-                logger.info("🔗 使用ChainOfRAG进行多步推理搜索")
-            else:
-                # 使用DeepSearch进行深度搜索
-                rag_agent = DeepSearch(
-                    llm=llm,
-                    embedding_model=embedding_model,
-                    vector_db=vector_db,
-                    top_k=top_k
-                )
-                logger.info("🔍 使用DeepSearch进行深度搜索")
+            rag_agent = self._get_rag_agent(use_chain_of_rag, top_k)
             
             # 执行RAG查询
             answer, retrieved_results, token_usage = rag_agent.query(query, top_k=top_k)
             
             # 转换结果格式
-            formatted_results = []
-            for result in retrieved_results:
-                formatted_result = {
-                    'title': result.metadata.get('title', '未知标题'),
-                    'url': result.metadata.get('url', '无链接'),
+            formatted_results = [
+                {
+                    'title': (metadata := result.metadata).get('title', '未知标题'),
+                    'url': metadata.get('url', '无链接'),
                     'content': result.text,
-                    'content_type': result.metadata.get('content_type', 'text'),
+                    'content_type': metadata.get('content_type', 'text'),
                     'score': result.score,
-                    'reference': result.reference,
-                    'rag_answer': answer  # 添加RAG生成的答案
+                    'reference': result.reference
                 }
-                formatted_results.append(formatted_result)
+                for result in retrieved_results
+            ]
             
-            logger.info(f"✅ RAG搜索完成，使用了 {token_usage} tokens")
-            return formatted_results
+            logger.info("✅ RAG搜索完成，使用了 %s tokens", token_usage)
             
-        except Exception as e:
-            logger.error(f"❌ RAG搜索失败: {e}")
+        except _EXPECTED_SEARCH_ERRORS as e:
+            logger.error("❌ RAG搜索失败: %s", e)
             # 降级到普通搜索
             logger.info("🔄 降级到普通向量搜索")
-            return self.search(query, top_k, content_type, collection_name)
+            results = self.search(query, top_k, content_type, collection_name)
+            return results if legacy_format else {'answer': None, 'results': results, 'token_usage': 0}
+        
+        if legacy_format:
+            for formatted_result in formatted_results:
+                formatted_result['rag_answer'] = answer
+            return formatted_results
+        return {'answer': answer, 'results': formatted_results, 'token_usage': token_usage}
+    
+    async def search_with_rag_async(self, 
+                                    query: str, 
+                                    top_k: int = 5,
+                                    content_type: str = None,
+                                    collection_name: str = None,
+                                    use_chain_of_rag: bool = False,
+                                    legacy_format: bool = True) -> Union[List[Dict], Dict[str, Any]]:
+        """
+        search_with_rag的异步版本，并发请求在短时间窗口内合并成批处理
+        
+        Args:
+            query: 搜索查询
+            top_k: 返回结果数量
+            content_type: 内容类型过滤 ('text', 'code')
+            collection_name: 集合名称
+            use_chain_of_rag: 是否使用ChainOfRAG进行多步推理搜索
+            legacy_format: 返回格式，同search_with_rag
+        """
+        loop = asyncio.get_running_loop()
+        if self._rag_worker is None or self._rag_worker.done() or self._rag_worker.get_loop() is not loop:
+            self._rag_queue = asyncio.Queue()
+            self._rag_worker = loop.create_task(self._rag_batch_worker(self._rag_queue))
+        
+        future = loop.create_future()
+        request = (query, top_k, content_type, collection_name, use_chain_of_rag, legacy_format)
+        await self._rag_queue.put((request, future))
+        return await future
+    
+    async def _rag_batch_worker(self, queue: asyncio.Queue):
+        """
+        收集一批RAG请求，相同请求只执行一次，不同请求在线程池中并发执行
+        
+        每个批次在后台任务中执行，收集协程立即返回继续接收下一批请求，
+        慢查询不会阻塞后续请求的合并与派发
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + RAG_BATCH_WINDOW
+            while len(batch) < RAG_BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            waiters: Dict[Tuple, List[asyncio.Future]] = {}
+            for request, future in batch:
+                waiters.setdefault(request, []).append(future)
+            if len(batch) > 1:
+                logger.info("📦 合并 %s 个RAG请求为 %s 次查询", len(batch), len(waiters))
+            
+            task = loop.create_task(self._run_rag_batch(waiters))
+            self._rag_batches.add(task)
+            task.add_done_callback(self._rag_batches.discard)
+    
+    async def _run_rag_batch(self, waiters: Dict[Tuple, List[asyncio.Future]]):
+        """并发执行一批去重后的RAG请求，并把结果分发给等待的调用方"""
+        requests = list(waiters)
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self.search_with_rag, *request) for request in requests),
+            return_exceptions=True
+        )
+        for request, result in zip(requests, results):
+            for i, future in enumerate(waiters[request]):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    # 每个调用方拿到独立的结果，避免相互修改
+                    future.set_result(result if i == 0 else copy.deepcopy(result))
+    
+    def _get_rag_agent(self, use_chain_of_rag: bool, top_k: int):
+        """获取RAG智能体，同一(类型, top_k)复用已创建的实例"""
+        key = ("chain", top_k) if use_chain_of_rag else ("deep", top_k)
+        rag_agent = self._rag_agents.get(key)
+        
+        if rag_agent is None:
+            with self._init_lock:
+                rag_agent = self._rag_agents.get(key)
+                if rag_agent is None:
+                    if use_chain_of_rag:
+                        # 使用ChainOfRAG进行多步推理搜索
+                        rag_agent = ChainOfRAG(
+                            llm=configuration.llm,
+                            embedding_model=configuration.embedding_model,
+                            vector_db=configuration.vector_db,
+                            max_iter=3,
+                            early_stopping=True
+                        )
+                    else:
+                        # 使用DeepSearch进行深度搜索
+                        rag_agent = DeepSearch(
+                            llm=configuration.llm,
+                            embedding_model=configuration.embedding_model,
+                            vector_db=configuration.vector_db,
+                            top_k=top_k
+                        )
+                    self._rag_agents[key] = rag_agent
+        
+        if use_chain_of_rag:
+            logger.info("🔗 使用ChainOfRAG进行多步推理搜索")
+        else:
+            logger.info("🔍 使用DeepSearch进行深度搜索")
+        return rag_agent
+    
+    async def crawl_and_load_streaming(self, 
+                                       links_file: str = None,
+                                       collection_name: str = None,
+                                       force_new_collection: bool = False,
+                                       embed_batch_size: int = RAGConfig.DEFAULT_EMBED_BATCH_SIZE,
+                                       upsert_batch_size: int = RAGConfig.DEFAULT_UPSERT_BATCH_SIZE) -> bool:
+        """
+        边爬取边向量化：爬取→分块→嵌入→写入四个阶段通过有界队列并发运行
+        
+        只处理本次新爬取的页面，已存在于内容文件中的页面请使用 load_to_vector_database 加载
+        
+        Args:
+            links_file: 链接文件路径
+            collection_name: 集合名称
+            force_new_collection: 是否强制创建新集合
+            embed_batch_size: 每次嵌入调用的文档块数量
+            upsert_batch_size: 每次写入向量数据库的文档块数量
+        """
+        adapter = self.initialize_adapter(collection_name)
+        crawler = self.initialize_crawler(links_file)
+        urls = crawler.load_links()
+        if not urls:
+            logger.error("❌ 没有找到可爬取的链接")
+            return False
+        
+        vector_db = adapter.vector_db
+        embedding_model = adapter.embedding_model
+        collection = adapter.collection_name
+        
+        existing_ids = set()
+        if not force_new_collection:
+            existing_ids = await asyncio.to_thread(
+                _get_existing_document_ids, vector_db, collection, embedding_model
+            )
+        await asyncio.to_thread(
+            vector_db.init_collection,
+            dim=embedding_model.dimension,
+            collection=collection,
+            description=f"华为文档集合 - {adapter.content_type}",
+            force_new_collection=force_new_collection
+        )
+        adapter.invalidate_collection_info()
+        if force_new_collection and adapter.dedup_cache is not None:
+            adapter.dedup_cache.clear()
+        
+        page_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_PAGE_QUEUE_SIZE)
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_BATCH_QUEUE_SIZE)
+        embedded_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_BATCH_QUEUE_SIZE)
+        stats = {'pages': 0, 'chunks': 0, 'inserted': 0}
+        # 待写入文档块的去重哈希，写入成功后记录
+        chunk_keys = {}
+        
+        async def on_page(url, content):
+            await page_queue.put((url, content))
+        
+        async def crawl_stage():
+            try:
+                await crawler.crawl_content(urls, on_page=on_page)
+            finally:
+                await page_queue.put(_STAGE_DONE)
+        
+        async def transform_stage():
+            pending = []
+            while (item := await page_queue.get()) is not _STAGE_DONE:
+                url, content = item
+                chunks = _filter_new_chunks(
+                    await asyncio.to_thread(adapter.build_page_chunks, url, asdict(content)), existing_ids
+                )
+                keep, keys = adapter.filter_seen_texts([chunk.text for chunk in chunks])
+                chunks = [chunks[i] for i in keep]
+                chunk_keys.update(zip(map(id, chunks), keys))
+                pending.extend(chunks)
+                stats['pages'] += 1
+                while len(pending) >= embed_batch_size:
+                    await chunk_queue.put(pending[:embed_batch_size])
+                    pending = pending[embed_batch_size:]
+            if pending:
+                await chunk_queue.put(pending)
+            await chunk_queue.put(_STAGE_DONE)
+        
+        async def embed_stage():
+            while (batch := await chunk_queue.get()) is not _STAGE_DONE:
+                embeddings = await asyncio.to_thread(
+                    embedding_model.embed_documents, [chunk.text for chunk in batch]
+                )
+                adapter.attach_embeddings(batch, embeddings)
+                stats['chunks'] += len(batch)
+                await embedded_queue.put(batch)
+            await embedded_queue.put(_STAGE_DONE)
+        
+        async def upsert_stage():
+            pending = []
+            while True:
+                batch = await embedded_queue.get()
+                done = batch is _STAGE_DONE
+                if not done:
+                    pending.extend(batch)
+                if pending and (done or len(pending) >= upsert_batch_size):
+                    # 写入失败时抛出异常终止流水线，只有全部写入后才记录内容哈希（未报告写入数量的向量数据库视为全部写入）
+                    written = await asyncio.to_thread(vector_db.insert_data, collection=collection, chunks=pending)
+                    if written is not None and written < len(pending):
+                        raise RuntimeError(f"向量数据库仅写入 {written}/{len(pending)} 个文档块")
+                    adapter.mark_texts_seen([chunk_keys.pop(id(chunk)) for chunk in pending if id(chunk) in chunk_keys])
+                    stats['inserted'] += len(pending)
+                    logger.info("   💾 已写入 %s 个文档块", stats['inserted'])
+                    pending = []
+                if done:
+                    return
+        
+        logger.info("🔀 启动流式流水线: 爬取→分块→嵌入→写入")
+        tasks = [asyncio.create_task(stage()) for stage in (crawl_stage, transform_stage, embed_stage, upsert_stage)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            adapter.invalidate_collection_info()
+            self.index_version += 1
+            self._status_cache = None
+            self._content_stat_cache = None
+        
+        logger.info("✅ 流式流水线完成: 新页面 %s 个，写入文档块 %s 个", stats['pages'], stats['inserted'])
+        return True
     
     async def run_full_pipeline(self, 
                          links_file: str = None,
                          collection_name: str = None,
                          force_recrawl: bool = False,
                          force_new_collection: bool = False,
-                         batch_size: int = 64) -> bool:
+                         batch_size: int = 64,
+                         streaming: bool = False,
+                         upsert_batch_size: int = RAGConfig.DEFAULT_UPSERT_BATCH_SIZE) -> bool:
         """
         运行完整的RAG流水线
         
@@ -338,6 +693,8 @@ class HuaweiRAGPipeline:
             force_recrawl: 是否强制重新爬取
             force_new_collection: 是否强制创建新集合
             batch_size: 批处理大小
+            streaming: 是否边爬取边向量化（内容文件尚不存在时生效）
+            upsert_batch_size: 写入向量数据库的批大小
         """
         try:
             logger.info("🚀 开始运行完整的华为RAG流水线...")
@@ -345,10 +702,30 @@ class HuaweiRAGPipeline:
             # 1. 设置DeepSearcher
             self.setup_deepsearcher()
             
+            if streaming and self._content_file_stat() is None:
+                logger.info(_BANNER)
+                logger.info("📋 爬取与向量化并行执行")
+                logger.info(_SEP)
+                
+                if not await self.crawl_and_load_streaming(
+                    links_file=links_file,
+                    collection_name=collection_name,
+                    force_new_collection=force_new_collection,
+                    embed_batch_size=batch_size,
+                    upsert_batch_size=upsert_batch_size
+                ):
+                    logger.error("❌ 流式流水线失败")
+                    return False
+                
+                logger.info(_BANNER)
+                logger.info("🎉 华为RAG流水线完成!")
+                logger.info(_SEP)
+                return True
+            
             # 2. 爬取内容
-            logger.info("\n" + "="*50)
+            logger.info(_BANNER)
             logger.info("📋 第1步: 爬取华为文档内容")
-            logger.info("="*50)
+            logger.info(_SEP)
             
             crawl_success = await self.crawl_content(
                 links_file=links_file,
@@ -360,30 +737,31 @@ class HuaweiRAGPipeline:
                 return False
             
             # 3. 加载到向量数据库
-            logger.info("\n" + "="*50)
+            logger.info(_BANNER)
             logger.info("📋 第2步: 加载到向量数据库")
-            logger.info("="*50)
+            logger.info(_SEP)
             
             load_success = self.load_to_vector_database(
                 collection_name=collection_name,
                 force_new_collection=force_new_collection,
-                batch_size=batch_size
+                embed_batch_size=batch_size,
+                upsert_batch_size=upsert_batch_size
             )
             
             if not load_success:
                 logger.error("❌ 向量化阶段失败，停止流水线")
                 return False
             
-            logger.info("\n" + "="*50)
+            logger.info(_BANNER)
             logger.info("🎉 华为RAG流水线完成!")
-            logger.info("="*50)
+            logger.info(_SEP)
             logger.info("✅ 所有步骤成功完成")
             logger.info("💡 现在可以使用 search() 方法进行文档搜索")
             
             return True
             
         except Exception as e:
-            logger.error(f"❌ 流水线执行失败: {e}")
+            logger.error("❌ 流水线执行失败: %s", e)
             return False
 
     def run_full_pipeline_sync(self, 
@@ -391,7 +769,9 @@ class HuaweiRAGPipeline:
                               collection_name: str = None,
                               force_recrawl: bool = False,
                               force_new_collection: bool = False,
-                              batch_size: int = 64) -> bool:
+                              batch_size: int = 64,
+                              streaming: bool = False,
+                              upsert_batch_size: int = RAGConfig.DEFAULT_UPSERT_BATCH_SIZE) -> bool:
         """
         运行完整的RAG流水线 (同步版本)
         
@@ -401,6 +781,8 @@ class HuaweiRAGPipeline:
             force_recrawl: 是否强制重新爬取
             force_new_collection: 是否强制创建新集合
             batch_size: 批处理大小
+            streaming: 是否边爬取边向量化
+            upsert_batch_size: 写入向量数据库的批大小
         """
         return run_pipeline_async(
             self.run_full_pipeline,
@@ -408,7 +790,9 @@ class HuaweiRAGPipeline:
             collection_name=collection_name,
             force_recrawl=force_recrawl,
             force_new_collection=force_new_collection,
-            batch_size=batch_size
+            batch_size=batch_size,
+            streaming=streaming,
+            upsert_batch_size=upsert_batch_size
         )
     
     def get_status(self) -> Dict[str, Any]:
@@ -416,16 +800,27 @@ class HuaweiRAGPipeline:
         status = {
             'crawler_initialized': self.crawler is not None,
             'adapter_initialized': self.adapter is not None,
+        }
+        
+        # 内容文件与集合状态需要文件系统和向量数据库访问，短时间内复用
+        now = time.monotonic()
+        if self._status_cache is None or now - self._status_cache[0] > self.rag_config.STATUS_TTL:
+            self._status_cache = (now, self._probe_status())
+        status.update(self._status_cache[1])
+        return status
+    
+    def _probe_status(self) -> Dict[str, Any]:
+        """检查内容文件和向量集合状态"""
+        status = {
             'content_file_exists': False,
             'collection_exists': False,
             'collection_info': {}
         }
         
         # 检查内容文件
-        content_file = self.crawler_config.PROCESSED_DATA_DIR / self.crawler_config.OUTPUT_FILE
-        status['content_file_exists'] = content_file.exists()
-        if content_file.exists():
-            status['content_file_path'] = str(content_file)
+        status['content_file_exists'] = self._content_file_stat() is not None
+        if status['content_file_exists']:
+            status['content_file_path'] = str(self._content_file)
         
         # 检查集合信息
         if self.adapter:
@@ -433,37 +828,43 @@ class HuaweiRAGPipeline:
                 collection_info = self.adapter.get_collection_info()
                 status['collection_exists'] = collection_info.get('exists', False)
                 status['collection_info'] = collection_info
-            except:
+            except _EXPECTED_SEARCH_ERRORS:
                 pass
         
         return status
     
     def print_status(self):
         """打印流水线状态"""
+        # 不输出INFO日志时无需查询状态（会访问向量数据库）
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
         status = self.get_status()
         
         logger.info("📊 华为RAG流水线状态:")
-        logger.info(f"   🕷️ 爬虫: {'✅' if status['crawler_initialized'] else '❌'}")
-        logger.info(f"   🔄 适配器: {'✅' if status['adapter_initialized'] else '❌'}")
-        logger.info(f"   📄 内容文件: {'✅' if status['content_file_exists'] else '❌'}")
-        logger.info(f"   📚 向量集合: {'✅' if status['collection_exists'] else '❌'}")
+        logger.info("   🕷️ 爬虫: %s", '✅' if status['crawler_initialized'] else '❌')
+        logger.info("   🔄 适配器: %s", '✅' if status['adapter_initialized'] else '❌')
+        logger.info("   📄 内容文件: %s", '✅' if status['content_file_exists'] else '❌')
+        logger.info("   📚 向量集合: %s", '✅' if status['collection_exists'] else '❌')
         
         if status['collection_exists']:
             info = status['collection_info']
-            logger.info(f"       集合名称: {info.get('name', 'Unknown')}")
-            logger.info(f"       文档数量: {info.get('count', 0):,}")
+            logger.info("       集合名称: %s", info.get('name', 'Unknown'))
+            logger.info("       文档数量: %s", format(info.get('count', 0), ','))
         
         if status['content_file_exists']:
-            logger.info(f"       内容文件: {status.get('content_file_path', 'Unknown')}")
+            logger.info("       内容文件: %s", status.get('content_file_path', 'Unknown'))
 
     def list_content_files(self) -> Dict[str, Any]:
         """列出所有可用的内容文件"""
         try:
-            # 创建一个临时适配器来获取文件列表
-            temp_adapter = HuaweiDeepSearcherAdapter()
-            return temp_adapter.list_available_content_files()
+            # 优先复用已初始化的适配器，否则创建一次并缓存
+            adapter = self.adapter or self._file_list_adapter
+            if adapter is None:
+                adapter = self._file_list_adapter = HuaweiDeepSearcherAdapter()
+            return adapter.list_available_content_files()
         except Exception as e:
-            logger.error(f"❌ 列出内容文件失败: {e}")
+            logger.error("❌ 列出内容文件失败: %s", e)
             return {}
 
 
@@ -471,9 +872,10 @@ class HuaweiRAGPipeline:
 def run_pipeline_async(pipeline_func, *args, **kwargs):
     """运行异步流水线的助手函数"""
     try:
-        loop = asyncio.get_event_loop()
+        asyncio.get_running_loop()
     except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        return asyncio.run(pipeline_func(*args, **kwargs))
     
-    return loop.run_until_complete(pipeline_func(*args, **kwargs)) 
\ No newline at end of file
+    # 已处于事件循环中（如Jupyter），在独立线程的新事件循环中运行
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, pipeline_func(*args, **kwargs)).result()
@@ -6,19 +6,33 @@ SearchAgent - 华为文档智能搜索代理
 现在增加了华为操作系统代码生成功能
 """
 
+import atexit
 import logging
+import os
+import re
+import sys
+import threading
 import time
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple, Union
-from dataclasses import dataclass
+import contextvars
+import functools
+import hashlib
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Deque, Iterator, List, Dict, Any, Optional, Tuple, Union
+from dataclasses import asdict, dataclass, field, replace
 from enum import Enum
 import json
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 # 导入现有模块
 from .adapter import HuaweiDeepSearcherAdapter
-from .online_search import EnhancedOnlineSearchEngine
+from .online_search import EnhancedOnlineSearchEngine, stream_llm_chat
 from .pipeline import HuaweiRAGPipeline
+from .config import RAGConfig
+from .search_cache import SearchCache, make_cache_key
+from .code_language import detect_code_language
 
 # 导入DeepSearcher组件
 try:
@@ -43,6 +57,269 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# 代码生成流水线（生成 → 检查 → 最终代码）共享的system消息前缀。
+# 三个阶段以逐字节相同的前缀开头，开启前缀缓存的推理后端（如vLLM的enable_prefix_caching）
+# 可直接复用已预填充的前缀，只需处理各阶段不同的user消息；修改时须保持各阶段拼接方式一致
+CODE_SYSTEM_PREFIX = """作为华为操作系统开发专家，请基于参考文档信息完成用户需求相关的华为操作系统代码开发任务。
+
+代码须符合以下要求：
+1. 代码必须与华为操作系统（如HarmonyOS、鸿蒙系统）相关
+2. 使用华为官方推荐的开发语言和框架（如ArkTS、ArkUI等）
+3. 遵循华为开发规范和最佳实践
+4. 代码应该是完整的、可运行的示例
+5. 包含适当的注释说明
+"""
+
+def _code_context_prefix(query: str, search_context: str) -> str:
+    """代码生成流水线各阶段共享的需求与文档上下文"""
+    return f"\n用户需求: {query}\n\n参考文档信息:\n{search_context}\n"
+
+def _code_stage_messages(query: str, search_context: str, stage_prompt: str) -> List[Dict[str, str]]:
+    """构建代码生成流水线某一阶段的消息：共享前缀作为system消息，阶段指令作为user消息"""
+    return [
+        {"role": "system", "content": CODE_SYSTEM_PREFIX + _code_context_prefix(query, search_context)},
+        {"role": "user", "content": stage_prompt},
+    ]
+
+# 代码检查提示词模板
+_REVIEW_PROMPT_TEMPLATE = """
+作为高级代码审查专家，请对以下华为操作系统相关代码进行全面评价：
+
+原始需求：{original_query}
+代码语言：{language}
+检查类型：{review_type}
+
+待评价代码：
+```
+{code}
+```
+
+请从以下几个方面进行评价并给出结构化的评价报告：
+
+1. 代码正确性：语法是否正确，逻辑是否合理
+2. 华为规范性：是否符合华为开发规范和最佳实践
+3. 功能完整性：是否满足用户需求
+4. 代码质量：可读性、可维护性、性能等
+5. 安全性：是否存在安全隐患
+6. 改进建议：具体的优化建议
+
+请按以下格式返回评价结果：
+
+## 总体评价
+[总体评价内容]
+
+## 发现的问题
+[列出具体问题，每个问题包含类型、位置、描述]
+
+## 改进建议
+[具体的改进建议列表]
+
+## 质量评分
+[给出0-100的质量评分及理由]
+
+## 详细分析
+[详细的技术分析]
+"""
+
+_REVIEW_FOCUS_SUFFIX = {
+    "syntax": "\n特别关注：语法错误和基本逻辑问题",
+    "security": "\n特别关注：安全漏洞和潜在风险",
+    "performance": "\n特别关注：性能优化和效率问题",
+}
+
+# 代码检查报告解析
+_REVIEW_SECTION_RE = re.compile(r'##[ \t]*(发现的问题|改进建议|质量评分)[^\n]*\n(.*?)(?=\n##|\Z)', re.S)
+_ISSUE_KEYWORD_RE = re.compile(r'问题|错误|警告')
+_BULLET_RE = re.compile(r'^[ \t]*([-*•].*?)[ \t\r]*$', re.M)
+_SCORE_RE = re.compile(r'(\d+(?:\.\d+)?)')
+
+# 代码检查问题的展示格式，按严重程度选择图标
+_SEVERITY_ICONS = {'error': '❌', 'warning': '⚠️', 'info': 'ℹ️'}
+_ISSUE_TEMPLATE = "\n{i}. {icon} **[{severity}]** {message}{location}\n   🔍 **规则**: `{rule}`\n   📂 **分类**: {category}{fix}"
+
+def _format_issue(i: int, issue: Dict[str, Any]) -> str:
+    """渲染单个代码检查问题（位置和修复建议仅在存在时显示）"""
+    get = issue.get
+    severity = get('severity', 'info')
+    line = get('line', 0)
+    column = get('column', 0)
+    fix_suggestion = get('fix_suggestion', '')
+    
+    location = ""
+    if line > 0:
+        location = f"\n   📍 **位置**: 第 {line} 行" + (f"，第 {column} 列" if column > 0 else "")
+    
+    return _ISSUE_TEMPLATE.format(
+        i=i,
+        icon=_SEVERITY_ICONS.get(severity.lower(), '📝'),
+        severity=severity.upper(),
+        message=get('message', '未知问题'),
+        location=location,
+        rule=get('rule', get('rule_id', 'unknown')),
+        category=get('category', 'general'),
+        fix=f"\n   💡 **修复建议**: {fix_suggestion}" if fix_suggestion else ""
+    )
+
+# 代码生成请求关键词，编译为单个正则在一次扫描中匹配全部关键词
+CODE_REQUEST_KEYWORDS = ("生成代码", "代码示例", "写代码", "实现代码", "代码实现", "编程示例")
+_CODE_REQUEST_RE = re.compile("|".join(map(re.escape, CODE_REQUEST_KEYWORDS)))
+
+# 字面量查询：带引号的短语、裸标识符或源文件名
+# （仅匹配ASCII，避免“ArkUI组件”这类中英混合的自然语言问题被当作标识符）
+_LITERAL_RE = re.compile(r'^("[^"]+"|[A-Za-z_][\w./-]{2,}|[\w./-]+\.(c|cpp|h|py|ts|ets))$', re.ASCII)
+
+# 同时进行的LLM/在线搜索调用上限，避免突发流量触发服务端限流
+LLM_CONCURRENCY = int(os.getenv("HW_LLM_CONCURRENCY", "16"))
+# LLM请求合并窗口（毫秒）与单批最大请求数，仅在后端提供batch_chat时生效
+LLM_BATCH_WINDOW_MS = 10
+LLM_MAX_BATCH = 16
+
+# 查询结果缓存：精确缓存按归一化查询哈希命中，语义缓存按查询向量余弦相似度命中
+QUERY_CACHE_SIZE = 256
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# 查询结果缓存时间（秒），在线搜索结果会随时间变化
+QUERY_CACHE_TTL = 600
+# 混合搜索结果参与语义排序的候选数量
+RERANK_CANDIDATES = 30
+# 重排序得分缓存时间（秒）
+RERANK_CACHE_TTL = 900
+# 同时保留的会话上下文数量上限，超出时淘汰最久未使用的会话
+MAX_ACTIVE_CONTEXTS = 10_000
+# 代码检查评分不低于该值时，直接采用与检查并行推测生成的最终代码
+SPECULATIVE_FINAL_MIN_SCORE = 90
+
+# 当前搜索中失败的分支，由search设置；任一分支失败时结果不写入查询缓存
+_failed_branches: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar(
+    '_failed_branches', default=None
+)
+
+def _mark_branch_failed(branch: str):
+    """记录当前搜索中失败的分支"""
+    failed = _failed_branches.get()
+    if failed is not None:
+        failed.append(branch)
+
+# 流式搜索时接收答案文本片段的回调，由search_stream设置，仅作用于当前搜索任务
+_answer_sink: contextvars.ContextVar[Optional[Callable[[str], None]]] = contextvars.ContextVar(
+    '_answer_sink', default=None
+)
+
+# 同步接口共享的后台事件循环，在专用线程中运行，避免每次调用或每个线程都新建循环
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_thread: Optional[threading.Thread] = None
+_sync_loop_lock = threading.Lock()
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """获取同步接口的后台事件循环，首次调用时启动循环线程"""
+    global _sync_loop, _sync_loop_thread
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            _sync_loop_thread = threading.Thread(
+                target=_sync_loop.run_forever, name="search-agent-sync-loop", daemon=True
+            )
+            _sync_loop_thread.start()
+        return _sync_loop
+
+def _run_sync(coro):
+    """在后台事件循环中执行协程并等待结果，可从任意线程调用"""
+    loop = _get_sync_loop()
+    if threading.current_thread() is _sync_loop_thread:
+        coro.close()
+        raise RuntimeError("不能在异步搜索任务中调用同步接口，请直接await对应的异步方法")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+@atexit.register
+def _close_sync_loop():
+    """停止并关闭同步接口的后台事件循环（进程退出时自动调用，之后再次调用同步接口会重新创建）"""
+    global _sync_loop, _sync_loop_thread
+    with _sync_loop_lock:
+        loop, thread = _sync_loop, _sync_loop_thread
+        _sync_loop = _sync_loop_thread = None
+    if loop is None:
+        return
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+class _CoalescingBatcher:
+    """
+    合并短时间窗口内的并发LLM请求，整批提交给支持批量推理的后端
+    窗口到期或请求数达到上限时提交，批内按消息长度降序排列以减少填充
+    """
+    
+    def __init__(self, fn: Callable, flush_ms: float = LLM_BATCH_WINDOW_MS, max_batch: int = LLM_MAX_BATCH):
+        """
+        Args:
+            fn: 批量调用函数（协程），接收消息列表的列表，按相同顺序返回响应列表
+            flush_ms: 合并窗口（毫秒）
+            max_batch: 单批最大请求数
+        """
+        self.fn = fn
+        self.flush_delay = flush_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[List[Dict[str, str]], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+    
+    async def submit(self, messages: List[Dict[str, str]]):
+        """提交单个请求，等待所在批次完成后返回其响应"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((messages, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_delay, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[List[Dict[str, str]], asyncio.Future]]):
+        batch.sort(key=lambda item: sum(len(message.get("content", "")) for message in item[0]), reverse=True)
+        try:
+            responses = list(await self.fn([messages for messages, _ in batch]))
+            if len(responses) != len(batch):
+                raise RuntimeError(f"批量LLM调用返回 {len(responses)} 个响应，请求数为 {len(batch)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    选出得分最高的k个下标（按得分降序）
+    先用argpartition在O(n)内选出前k个，再只对这k个排序
+    """
+    k = min(k, scores.shape[0])
+    if k < scores.shape[0]:
+        indices = np.argpartition(-scores, k - 1)[:k]
+    else:
+        indices = np.arange(scores.shape[0])
+    return indices[np.argsort(-scores[indices], kind="stable")]
+
+def _score_and_topk(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算已归一化的查询向量与文档向量的余弦相似度并选出前k个
+    
+    Returns:
+        (前k个下标, 对应得分)
+    """
+    scores = doc_vecs @ query_vec
+    indices = _topk(scores, k)
+    return indices, scores[indices]
+
 class SearchMode(Enum):
     """搜索模式枚举"""
     LOCAL_ONLY = "local_only"           # 仅本地搜索
@@ -61,12 +338,31 @@ class QueryType(Enum):
     CODE_EXAMPLE = "code_example" # 代码示例
     GENERAL = "general"           # 通用查询
 
+_QUERY_TYPE_BY_VALUE = {query_type.value: query_type for query_type in QueryType}
+
+# 信息源类型标记，驻留后各信息源共享同一字符串对象
+SOURCE_TYPE_LOCAL = sys.intern("local")
+SOURCE_TYPE_ONLINE = sys.intern("online")
+SOURCE_TYPE_CHAIN = sys.intern("chain_search")
+
+def _make_source(title: str, url: str, content: str, score: float, source_type: str) -> Dict[str, Any]:
+    """
+    构建单个信息源
+    信息源在后续流程中会被追加标记并序列化输出，因此保持为字典，
+    所有检索路径共用同一构建函数以保证键集合和顺序一致
+    """
+    return {"title": title, "url": url, "content": content, "score": score, "source_type": source_type}
+
+def _preview(item: Dict[str, Any]) -> str:
+    """检索结果的内容预览：优先使用检索后端预先截取的预览"""
+    return item.get('preview') or (item.get('content', '')[:RAGConfig.SOURCE_PREVIEW_LENGTH] + "...")
+
 @dataclass
 class SearchContext:
     """搜索上下文"""
     session_id: str
-    query_history: List[str]
-    search_history: List[Dict[str, Any]]
+    query_history: Deque[str]
+    search_history: Deque[Dict[str, Any]]
     user_preferences: Dict[str, Any]
     domain_focus: str = "huawei"
     
@@ -83,6 +379,18 @@ class SearchResult:
     token_usage: int
     metadata: Dict[str, Any]
 
+@dataclass(slots=True)
+class SearchStats:
+    """搜索统计计数器（平均响应时间在读取时由累计耗时计算）"""
+    total_queries: int = 0
+    successful_queries: int = 0
+    failed_queries: int = 0
+    mode_usage: Dict[str, int] = field(default_factory=lambda: {mode.value: 0 for mode in SearchMode})
+    code_generation_count: int = 0
+    code_review_count: int = 0
+    cache_hits: int = 0
+    total_response_time: float = 0.0
+
 @dataclass
 class CodeGenerationResult:
     """代码生成结果数据结构"""
@@ -145,11 +453,39 @@ class CodeReviewInterface(ABC):
         """检查代码检查服务是否可用"""
         pass
 
+def _cached_llm_chat(llm_client, messages: List[Dict[str, str]],
+                     cache: Optional[SearchCache] = None) -> Tuple[str, int]:
+    """
+    调用LLM并按消息内容持久化缓存响应（已去除思考过程）
+    
+    Args:
+        llm_client: LLM客户端
+        messages: 对话消息
+        cache: 响应缓存，None表示不使用缓存
+        
+    Returns:
+        (响应内容, token使用量)，命中缓存时token使用量为0
+    """
+    cache_key = None
+    if cache is not None:
+        model_id = getattr(llm_client, 'model', None) or type(llm_client).__name__
+        cache_key = make_cache_key('chat', model_id, json.dumps(messages, ensure_ascii=False, sort_keys=True))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached, 0
+    
+    response = llm_client.chat(messages)
+    content = llm_client.remove_think(response.content)
+    if cache is not None:
+        cache.set(cache_key, content)
+    return content, response.total_tokens
+
 class LLMCodeReviewService(CodeReviewInterface):
     """基于LLM的代码检查服务（当前实现）"""
     
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, response_cache: Optional[SearchCache] = None):
         self.llm = llm_client
+        self.response_cache = response_cache
         self.review_count = 0
         
     def is_available(self) -> bool:
@@ -166,33 +502,40 @@ class LLMCodeReviewService(CodeReviewInterface):
         Returns:
             代码检查结果
         """
-        start_time = time.time()
-        request_id = f"review_{int(time.time())}_{self.review_count}"
+        start_time = time.perf_counter()
+        request_id = f"review_{time.time_ns()}_{self.review_count}"
         self.review_count += 1
         
         try:
             if not self.is_available():
                 raise ValueError("LLM代码检查服务不可用")
             
-            # 构建检查提示词
+            # 构建检查提示词；携带检索上下文时使用代码生成流水线的共享前缀
             review_prompt = self._build_review_prompt(request)
+            search_context = (request.metadata or {}).get("search_context")
+            if search_context is not None:
+                messages = _code_stage_messages(request.original_query, search_context, review_prompt)
+            else:
+                messages = [{"role": "user", "content": review_prompt}]
             
             # 调用LLM进行检查
-            response = self.llm.chat([{"role": "user", "content": review_prompt}])
-            review_content = self.llm.remove_think(response.content)
+            review_content, token_usage = await asyncio.to_thread(
+                _cached_llm_chat, self.llm, messages, self.response_cache
+            )
             
             # 解析检查结果
             review_result = self._parse_review_result(
-                request_id, request, review_content, response.total_tokens
+                request_id, request, review_content, token_usage
             )
             
-            review_result.processing_time = time.time() - start_time
+            review_result.processing_time = time.perf_counter() - start_time
             
             logger.info(f"✅ 代码检查完成: {request_id}")
             return review_result
             
         except Exception as e:
             logger.error(f"❌ 代码检查失败: {e}")
+            _mark_branch_failed("代码检查")
             # 返回错误结果
             return CodeReviewResult(
                 request_id=request_id,
@@ -203,103 +546,46 @@ class LLMCodeReviewService(CodeReviewInterface):
                 suggestions=[],
                 score=0.0,
                 review_metadata={"error": str(e), "token_usage": 0},
-                processing_time=time.time() - start_time
+                processing_time=time.perf_counter() - start_time
             )
     
     def _build_review_prompt(self, request: CodeReviewRequest) -> str:
         """构建代码检查提示词"""
-        base_prompt = f"""
-作为高级代码审查专家，请对以下华为操作系统相关代码进行全面评价：
-
-原始需求：{request.original_query}
-代码语言：{request.language}
-检查类型：{request.review_type}
-
-待评价代码：
-```
-{request.code}
-```
-
-请从以下几个方面进行评价并给出结构化的评价报告：
-
-1. 代码正确性：语法是否正确，逻辑是否合理
-2. 华为规范性：是否符合华为开发规范和最佳实践
-3. 功能完整性：是否满足用户需求
-4. 代码质量：可读性、可维护性、性能等
-5. 安全性：是否存在安全隐患
-6. 改进建议：具体的优化建议
-
-请按以下格式返回评价结果：
-
-## 总体评价
-[总体评价内容]
-
-## 发现的问题
-[列出具体问题，每个问题包含类型、位置、描述]
-
-## 改进建议
-[具体的改进建议列表]
-
-## 质量评分
-[给出0-100的质量评分及理由]
-
-## 详细分析
-[详细的技术分析]
-"""
-        
-        # 根据检查类型调整提示词
-        if request.review_type == "syntax":
-            base_prompt += "\n特别关注：语法错误和基本逻辑问题"
-        elif request.review_type == "security":
-            base_prompt += "\n特别关注：安全漏洞和潜在风险"
-        elif request.review_type == "performance":
-            base_prompt += "\n特别关注：性能优化和效率问题"
-        
-        return base_prompt
+        # 根据检查类型追加关注点
+        return _REVIEW_PROMPT_TEMPLATE.format(
+            original_query=request.original_query,
+            language=request.language,
+            review_type=request.review_type,
+            code=request.code
+        ) + _REVIEW_FOCUS_SUFFIX.get(request.review_type, "")
     
     def _parse_review_result(self, request_id: str, request: CodeReviewRequest, 
                            review_content: str, token_usage: int) -> CodeReviewResult:
         """解析LLM返回的检查结果"""
         
-        # 提取各个部分
-        sections = review_content.split('## ')
-        
         review_report = review_content
         issues_found = []
         suggestions = []
         score = 70.0  # 默认评分
         
-        try:
-            for section in sections:
-                if section.startswith('发现的问题'):
-                    issues_text = section.replace('发现的问题\n', '').strip()
-                    # 简单解析问题列表
-                    for line in issues_text.split('\n'):
-                        if line.strip() and ('问题' in line or '错误' in line or '警告' in line):
-                            issues_found.append({
-                                "type": "issue",
-                                "message": line.strip(),
-                                "severity": "medium"
-                            })
-                
-                elif section.startswith('改进建议'):
-                    suggestions_text = section.replace('改进建议\n', '').strip()
-                    for line in suggestions_text.split('\n'):
-                        if line.strip() and line.strip().startswith(('-', '*', '•')):
-                            suggestions.append(line.strip())
-                
-                elif section.startswith('质量评分'):
-                    score_text = section.replace('质量评分\n', '').strip()
-                    # 尝试提取数字评分
-                    import re
-                    score_match = re.search(r'(\d+(?:\.\d+)?)', score_text)
-                    if score_match:
-                        score = float(score_match.group(1))
-                        if score > 100:
-                            score = score / 10  # 如果是1000制，转换为100制
-        
-        except Exception as e:
-            logger.warning(f"解析检查结果时出错: {e}")
+        # 一次扫描定位各个部分
+        for match in _REVIEW_SECTION_RE.finditer(review_content):
+            title, body = match.group(1), match.group(2)
+            if title == '发现的问题':
+                issues_found.extend(
+                    {"type": "issue", "message": line.strip(), "severity": "medium"}
+                    for line in body.splitlines()
+                    if _ISSUE_KEYWORD_RE.search(line)
+                )
+            elif title == '改进建议':
+                suggestions.extend(_BULLET_RE.findall(body))
+            else:
+                # 尝试提取数字评分
+                score_match = _SCORE_RE.search(body)
+                if score_match:
+                    score = float(score_match.group(1))
+                    if score > 100:
+                        score = score / 10  # 如果是1000制，转换为100制
         
         return CodeReviewResult(
             request_id=request_id,
@@ -317,6 +603,138 @@ class LLMCodeReviewService(CodeReviewInterface):
             processing_time=0.0  # 将在外部设置
         )
 
+class RerankerInterface(ABC):
+    """重排序接口抽象类"""
+    
+    @abstractmethod
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        计算查询与各候选文本的相关性得分
+        
+        Args:
+            query: 用户查询
+            texts: 候选文本列表
+            
+        Returns:
+            与texts一一对应的得分，越大越相关
+        """
+        pass
+    
+    @abstractmethod
+    def is_available(self) -> bool:
+        """检查重排序服务是否可用"""
+        pass
+
+class ONNXRerankerService(RerankerInterface):
+    """基于ONNX Runtime的本地交叉编码器重排序服务（如bge-reranker-v2-m3）"""
+    
+    def __init__(self,
+                 model_path: str = "bge-reranker-v2-m3.onnx",
+                 tokenizer_path: str = "tokenizer.json",
+                 max_length: int = 512,
+                 cache_ttl: float = RERANK_CACHE_TTL,
+                 cache_size: int = 4096):
+        """
+        初始化重排序服务，依赖onnxruntime和tokenizers（可选依赖，缺失时服务不可用）
+        
+        Args:
+            model_path: ONNX模型文件路径
+            tokenizer_path: HuggingFace tokenizer.json路径
+            max_length: 查询与文本拼接后的最大token数
+            cache_ttl: 得分缓存过期时间（秒）
+            cache_size: 得分缓存容量
+        """
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._score_cache: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.session = self.tokenizer = None
+        
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+            
+            self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            self.tokenizer = Tokenizer.from_file(tokenizer_path)
+            self.tokenizer.enable_truncation(max_length=max_length)
+            self.tokenizer.enable_padding()
+            self._input_names = {node.name for node in self.session.get_inputs()}
+            logger.info(f"✅ 重排序模型加载成功: {model_path}")
+        except ImportError as e:
+            logger.warning(f"重排序依赖未安装: {e}")
+        except Exception as e:
+            logger.warning(f"重排序模型加载失败: {e}")
+            self.session = self.tokenizer = None
+    
+    def is_available(self) -> bool:
+        """检查服务是否可用"""
+        return self.session is not None
+    
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """批量计算相关性得分，命中缓存的文本不再参与推理"""
+        query_key = hashlib.sha1(query.encode('utf-8')).hexdigest()
+        keys = [(query_key, hashlib.sha1(text.encode('utf-8')).hexdigest()) for text in texts]
+        now = time.monotonic()
+        
+        scores: List[Optional[float]] = []
+        with self._cache_lock:
+            for key in keys:
+                cached = self._score_cache.get(key)
+                scores.append(cached[0] if cached and cached[1] > now else None)
+        
+        missing = [i for i, value in enumerate(scores) if value is None]
+        if missing:
+            encodings = self.tokenizer.encode_batch([(query, texts[i]) for i in missing])
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if "token_type_ids" in self._input_names:
+                feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            logits = self.session.run(None, feed)[0].reshape(len(missing), -1)[:, 0]
+            
+            expire_at = now + self.cache_ttl
+            with self._cache_lock:
+                for i, value in zip(missing, logits.tolist()):
+                    scores[i] = value
+                    self._score_cache[keys[i]] = (value, expire_at)
+                    self._score_cache.move_to_end(keys[i])
+                while len(self._score_cache) > self.cache_size:
+                    self._score_cache.popitem(last=False)
+        
+        return scores
+
+@functools.lru_cache(maxsize=4096)
+def _classify_cached(query: str) -> QueryType:
+    """
+    调用LLM分类查询类型，按归一化查询缓存结果（调用失败时抛出异常，不会被缓存）
+    
+    Args:
+        query: 归一化后的用户查询
+        
+    Returns:
+        查询类型
+    """
+    classification_prompt = f"""
+请分析以下查询的类型，从以下选项中选择最合适的一个：
+1. factual - 事实性查询（寻找具体信息、数据、定义）
+2. procedural - 过程性查询（如何做某事的步骤）
+3. conceptual - 概念性查询（理解概念、原理、架构）
+4. troubleshooting - 故障排除（解决问题、错误修复）
+5. code_example - 代码示例（需要代码演示、API使用）
+6. general - 通用查询（其他类型）
+
+查询: "{query}"
+
+请只回答类型名称，不要解释。
+"""
+    
+    response = llm.chat([{"role": "user", "content": classification_prompt}])
+    query_type_str = llm.remove_think(response.content).strip().lower()
+    
+    # 映射到枚举
+    return _QUERY_TYPE_BY_VALUE.get(query_type_str, QueryType.GENERAL)
+
 class HuaweiSearchAgent:
     """
     华为文档智能搜索代理
@@ -326,12 +744,36 @@ class HuaweiSearchAgent:
     现在支持华为操作系统代码生成功能
     """
     
+    # 查询类型到搜索模式的启发式映射，未列出的类型使用混合搜索
+    # 各搜索模式沿用的预取检索分支
+    _RETRIEVAL_BRANCHES = {
+        SearchMode.LOCAL_ONLY: ("local",),
+        SearchMode.ONLINE_ONLY: ("online",),
+        SearchMode.HYBRID: ("local", "online"),
+        SearchMode.CODE_GENERATION: ("local", "online"),
+    }
+    
+    _TYPE_TO_MODE = {
+        QueryType.CODE_EXAMPLE: SearchMode.CODE_GENERATION,     # 代码示例可能需要代码生成
+        QueryType.TROUBLESHOOTING: SearchMode.ONLINE_ONLY,      # 故障排除优先在线搜索（获取最新解决方案）
+        QueryType.FACTUAL: SearchMode.HYBRID,                   # 事实性查询使用混合搜索
+        QueryType.PROCEDURAL: SearchMode.CHAIN_OF_SEARCH,       # 过程性和概念性查询使用链式搜索
+        QueryType.CONCEPTUAL: SearchMode.CHAIN_OF_SEARCH,
+    }
+    
     def __init__(self, 
                  config_file: str = None,
                  collection_name: str = "huawei_docs",
                  default_search_mode: SearchMode = SearchMode.ADAPTIVE,
                  max_context_length: int = 10,
-                 code_review_service: CodeReviewInterface = None):
+                 code_review_service: CodeReviewInterface = None,
+                 reranker: RerankerInterface = None,
+                 cache_size: int = QUERY_CACHE_SIZE,
+                 semantic_cache_threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 cache_ttl: float = QUERY_CACHE_TTL,
+                 llm_concurrency: int = LLM_CONCURRENCY,
+                 llm_cache: bool = True,
+                 max_active_contexts: int = MAX_ACTIVE_CONTEXTS):
         """
         初始化华为搜索代理
         
@@ -341,11 +783,49 @@ class HuaweiSearchAgent:
             default_search_mode: 默认搜索模式
             max_context_length: 最大上下文长度
             code_review_service: 自定义代码检查服务（可选）
+            reranker: 混合搜索结果重排序服务（可选），未提供时按嵌入相似度排序
+            cache_size: 查询结果缓存容量，0表示禁用缓存
+            semantic_cache_threshold: 语义缓存命中的余弦相似度阈值
+            cache_ttl: 查询结果缓存时间（秒）
+            llm_concurrency: 同时进行的LLM/在线搜索调用上限
+            llm_cache: 是否持久化缓存代码生成与代码检查的LLM响应
+            max_active_contexts: 同时保留的会话上下文数量上限
         """
         self.config_file = config_file
         self.collection_name = collection_name
         self.default_search_mode = default_search_mode
         self.max_context_length = max_context_length
+        self.reranker = reranker if reranker and reranker.is_available() else None
+        
+        # 查询结果缓存（LRU + TTL），条目附带按单调时钟计算的过期时间
+        self.cache_size = cache_size
+        self.semantic_cache_threshold = semantic_cache_threshold
+        self.cache_ttl = cache_ttl
+        self._exact_cache: "OrderedDict[str, Tuple[float, SearchResult]]" = OrderedDict()
+        self._sem_cache: List[Tuple[np.ndarray, Tuple[str, int], SearchResult, float]] = []
+        self._sem_matrix: Optional[np.ndarray] = None
+        # 缓存结果对应的知识库版本，RAG流水线重新加载向量库后清空缓存
+        self._cache_index_version = None
+        
+        # LLM并发限制（信号量绑定事件循环，切换到其他事件循环时重新创建）
+        self.llm_concurrency = llm_concurrency
+        self._llm_sem: Optional[asyncio.Semaphore] = None
+        self._llm_sem_loop = None
+        # 后端支持批量推理时合并并发请求（与信号量一样按事件循环创建）
+        self._llm_batcher: Optional[_CoalescingBatcher] = None
+        self._llm_batcher_loop = None
+        
+        # 代码生成/检查的LLM响应缓存，跨进程复用
+        self._llm_cache = None
+        if llm_cache:
+            try:
+                self._llm_cache = SearchCache(
+                    RAGConfig.LLM_CACHE_DIR,
+                    default_expire=RAGConfig.LLM_CACHE_TTL,
+                    size_limit=RAGConfig.LLM_CACHE_SIZE_LIMIT
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ LLM响应缓存初始化失败，将不使用缓存: {e}")
         
         # 初始化组件
         self._initialize_components(config_file)
@@ -363,22 +843,16 @@ class HuaweiSearchAgent:
             except ImportError as e:
                 logger.warning(f"统一代码检查服务导入失败: {e}")
                 # 回退到LLM服务
-                self.code_review_service = LLMCodeReviewService(llm_client=llm)
+                self.code_review_service = LLMCodeReviewService(llm_client=llm, response_cache=self._llm_cache)
                 logger.info("✅ 回退到LLM代码检查服务")
         
-        # 搜索上下文管理
-        self.active_contexts: Dict[str, SearchContext] = {}
-        
-        # 统计信息
-        self.stats = {
-            "total_queries": 0,
-            "successful_queries": 0,
-            "failed_queries": 0,
-            "average_response_time": 0.0,
-            "mode_usage": {mode.value: 0 for mode in SearchMode},
-            "code_generation_count": 0,
-            "code_review_count": 0  # 新增代码检查统计
-        }
+        # 搜索上下文管理（LRU，超出上限时淘汰最久未使用的会话）
+        self.max_active_contexts = max_active_contexts
+        self.active_contexts: "OrderedDict[str, SearchContext]" = OrderedDict()
+        
+        # 统计信息：整数计数器与累计耗时，平均响应时间在读取时计算
+        self._stats_lock = threading.Lock()
+        self._stats = SearchStats()
         
         logger.info("✅ 华为搜索代理初始化完成")
     
@@ -435,39 +909,64 @@ class HuaweiSearchAgent:
             return QueryType.GENERAL
         
         try:
-            classification_prompt = f"""
-请分析以下查询的类型，从以下选项中选择最合适的一个：
-1. factual - 事实性查询（寻找具体信息、数据、定义）
-2. procedural - 过程性查询（如何做某事的步骤）
-3. conceptual - 概念性查询（理解概念、原理、架构）
-4. troubleshooting - 故障排除（解决问题、错误修复）
-5. code_example - 代码示例（需要代码演示、API使用）
-6. general - 通用查询（其他类型）
-
-查询: "{query}"
-
-请只回答类型名称，不要解释。
-"""
-            
-            response = llm.chat([{"role": "user", "content": classification_prompt}])
-            query_type_str = llm.remove_think(response.content).strip().lower()
-            
-            # 映射到枚举
-            type_mapping = {
-                "factual": QueryType.FACTUAL,
-                "procedural": QueryType.PROCEDURAL,
-                "conceptual": QueryType.CONCEPTUAL,
-                "troubleshooting": QueryType.TROUBLESHOOTING,
-                "code_example": QueryType.CODE_EXAMPLE,
-                "general": QueryType.GENERAL
-            }
-            
-            return type_mapping.get(query_type_str, QueryType.GENERAL)
-            
+            return _classify_cached(query.strip().casefold())
         except Exception as e:
             logger.warning(f"查询类型分类失败: {e}")
             return QueryType.GENERAL
     
+    def _llm_slot(self) -> asyncio.Semaphore:
+        """获取当前事件循环的LLM并发信号量"""
+        loop = asyncio.get_running_loop()
+        if self._llm_sem is None or self._llm_sem_loop is not loop:
+            self._llm_sem = asyncio.Semaphore(self.llm_concurrency)
+            self._llm_sem_loop = loop
+        return self._llm_sem
+    
+    async def _achat(self, messages: List[Dict[str, str]]):
+        """在并发限制内调用LLM，阻塞调用放到线程中执行，不占用事件循环"""
+        if hasattr(llm, 'batch_chat'):
+            return await self._batcher().submit(messages)
+        async with self._llm_slot():
+            return await asyncio.to_thread(llm.chat, messages)
+    
+    def _batcher(self) -> _CoalescingBatcher:
+        """获取当前事件循环的LLM请求合并器"""
+        loop = asyncio.get_running_loop()
+        if self._llm_batcher is None or self._llm_batcher_loop is not loop:
+            self._llm_batcher = _CoalescingBatcher(self._abatch_chat)
+            self._llm_batcher_loop = loop
+        return self._llm_batcher
+    
+    async def _abatch_chat(self, messages_list: List[List[Dict[str, str]]]) -> List[Any]:
+        """整批调用LLM，一个批次只占用一个并发名额"""
+        async with self._llm_slot():
+            return await asyncio.to_thread(llm.batch_chat, messages_list)
+    
+    async def _astream_chat(self, messages: List[Dict[str, str]], sink: Callable[[str], None]) -> Tuple[str, int]:
+        """
+        流式调用LLM，文本片段到达时立即在事件循环中交给sink
+        
+        Returns:
+            (去除思考过程的完整答案, token使用量；流式接口不返回统计，按长度粗略估算)
+        """
+        loop = asyncio.get_running_loop()
+        
+        def consume() -> str:
+            parts = []
+            for chunk in stream_llm_chat(llm, messages):
+                parts.append(chunk)
+                loop.call_soon_threadsafe(sink, chunk)
+            return "".join(parts)
+        
+        async with self._llm_slot():
+            content = await asyncio.to_thread(consume)
+        return llm.remove_think(content), len(content) // 4
+    
+    async def _acached_chat(self, messages: List[Dict[str, str]]) -> Tuple[str, int]:
+        """在并发限制内调用LLM，响应按消息内容持久化缓存"""
+        async with self._llm_slot():
+            return await asyncio.to_thread(_cached_llm_chat, llm, messages, self._llm_cache)
+    
     def _select_search_mode(self, query: str, query_type: QueryType, context: SearchContext = None) -> SearchMode:
         """
         智能选择搜索模式
@@ -484,26 +983,11 @@ class HuaweiSearchAgent:
             return self.default_search_mode
         
         # 检查是否为代码生成请求
-        code_keywords = ["生成代码", "代码示例", "写代码", "实现代码", "代码实现", "编程示例"]
-        if any(keyword in query for keyword in code_keywords):
+        if _CODE_REQUEST_RE.search(query):
             return SearchMode.CODE_GENERATION
         
         # 基于查询类型的启发式规则
-        if query_type == QueryType.CODE_EXAMPLE:
-            # 代码示例可能需要代码生成
-            return SearchMode.CODE_GENERATION
-        elif query_type == QueryType.TROUBLESHOOTING:
-            # 故障排除优先在线搜索（获取最新解决方案）
-            return SearchMode.ONLINE_ONLY
-        elif query_type == QueryType.FACTUAL:
-            # 事实性查询使用混合搜索
-            return SearchMode.HYBRID
-        elif query_type in [QueryType.PROCEDURAL, QueryType.CONCEPTUAL]:
-            # 过程性和概念性查询使用链式搜索
-            return SearchMode.CHAIN_OF_SEARCH
-        else:
-            # 默认使用混合搜索
-            return SearchMode.HYBRID
+        return self._TYPE_TO_MODE.get(query_type, SearchMode.HYBRID)
     
     async def search(self, 
                     query: str,
@@ -524,39 +1008,62 @@ class HuaweiSearchAgent:
         Returns:
             搜索结果
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             # 更新统计
-            self.stats["total_queries"] += 1
+            self._count("total_queries")
             
             # 获取或创建搜索上下文
             context = self._get_or_create_context(session_id, query)
             
-            # 分类查询类型
-            query_type = self._classify_query_type(query)
-            logger.info(f"🏷️ 查询类型: {query_type.value}")
-            
-            # 选择搜索模式
-            if search_mode is None:
-                search_mode = self._select_search_mode(query, query_type, context)
-            
-            logger.info(f"🎯 选择搜索模式: {search_mode.value}")
-            self.stats["mode_usage"][search_mode.value] += 1
-            
-            # 执行搜索
-            answer, sources, token_usage = await self._execute_search(
-                query, search_mode, query_type, top_k, **kwargs
-            )
-            
-            # 计算置信度
-            confidence_score = self._calculate_confidence(answer, sources, search_mode)
+            # 查询结果缓存（额外参数会影响检索结果，此时不使用缓存）
+            cache_key = cache_params = query_vector = None
+            if self.cache_size > 0 and not kwargs:
+                cache_params = (search_mode.value if search_mode else "auto", top_k)
+                cache_key = self._cache_key(query, cache_params)
+                cached, query_vector = await self._lookup_cache(cache_key, cache_params, query)
+                if cached is not None:
+                    self._update_context(context, query, cached.answer, cached.sources)
+                    self._count("cache_hits")
+                    self._record_success(time.perf_counter() - start_time)
+                    cached.metadata.update({
+                        "session_id": session_id,
+                        "context_length": len(context.query_history) if context else 0
+                    })
+                    logger.info(f"⚡ 命中{cached.metadata['cache']}缓存，跳过检索与生成")
+                    return cached
+            
+            # 自适应模式下，字面量查询（标识符、带引号的短语、文件名）直接精确匹配本地文档，跳过分类与LLM生成
+            literal_result = None
+            failed_branches: List[str] = []
+            if (search_mode is None and self.default_search_mode == SearchMode.ADAPTIVE and not kwargs
+                    and self.local_adapter and _LITERAL_RE.match(query.strip())):
+                literal_result = await self._literal_lookup(query, top_k)
+            
+            if literal_result is not None:
+                query_type, search_mode = QueryType.GENERAL, SearchMode.LOCAL_ONLY
+                self._count_mode(search_mode)
+                answer, sources = literal_result
+                token_usage, confidence_score = 0, 1.0
+                logger.info(f"🎯 字面量精确匹配命中 {len(sources)} 个文档")
+            else:
+                failed_token = _failed_branches.set(failed_branches)
+                try:
+                    query_type, search_mode, answer, sources, token_usage = await self._classify_and_execute(
+                        query, search_mode, context, top_k, **kwargs
+                    )
+                finally:
+                    _failed_branches.reset(failed_token)
+                
+                # 计算置信度
+                confidence_score = self._calculate_confidence(answer, sources, search_mode)
             
             # 更新上下文
             self._update_context(context, query, answer, sources)
             
             # 创建搜索结果
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             result = SearchResult(
                 query=query,
                 answer=answer,
@@ -572,19 +1079,22 @@ class HuaweiSearchAgent:
                 }
             )
             
+            if cache_key is not None:
+                if failed_branches:
+                    logger.info(f"⚠️ {'、'.join(failed_branches)}失败，结果不写入缓存")
+                else:
+                    self._store_cache(cache_key, cache_params, query_vector, result)
+            
             # 更新统计
-            self.stats["successful_queries"] += 1
-            self.stats["average_response_time"] = (
-                (self.stats["average_response_time"] * (self.stats["successful_queries"] - 1) + processing_time) 
-                / self.stats["successful_queries"]
-            )
+            self._record_success(processing_time)
             
             logger.info(f"✅ 搜索完成，耗时 {processing_time:.2f}s，置信度 {confidence_score:.2f}")
             return result
             
         except Exception as e:
             logger.error(f"❌ 搜索失败: {e}")
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
+            self._count("failed_queries")
             
             # 返回错误结果
             return SearchResult(
@@ -599,11 +1109,166 @@ class HuaweiSearchAgent:
                 metadata={"error": str(e)}
             )
     
+    async def search_stream(self,
+                            query: str,
+                            search_mode: SearchMode = None,
+                            session_id: str = None,
+                            top_k: int = 5,
+                            **kwargs) -> AsyncIterator[Union[str, SearchResult]]:
+        """
+        流式搜索：混合搜索的综合答案按LLM输出逐段产出，其他模式在完成后一次性产出答案，
+        最后产出完整的搜索结果
+        
+        Args:
+            与search相同
+            
+        Yields:
+            答案文本片段（str），最后一项为SearchResult
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        sink_token = _answer_sink.set(queue.put_nowait)
+        try:
+            search_task = asyncio.create_task(
+                self.search(query, search_mode=search_mode, session_id=session_id, top_k=top_k, **kwargs)
+            )
+        finally:
+            _answer_sink.reset(sink_token)
+        
+        streamed = False
+        try:
+            while not search_task.done() or not queue.empty():
+                if not queue.empty():
+                    streamed = True
+                    yield queue.get_nowait()
+                    continue
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({search_task, getter}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    streamed = True
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            if not search_task.done():
+                search_task.cancel()
+        
+        result = search_task.result()
+        if not streamed:
+            yield result.answer
+        yield result
+    
+    async def _classify_and_execute(self,
+                                    query: str,
+                                    search_mode: Optional[SearchMode],
+                                    context: Optional[SearchContext],
+                                    top_k: int,
+                                    **kwargs) -> Tuple[QueryType, SearchMode, str, List[Dict[str, Any]], int]:
+        """
+        分类查询、选择搜索模式并执行搜索
+        
+        Returns:
+            (查询类型, 搜索模式, 答案, 信息源列表, token使用量)
+        """
+        # 自适应模式下，查询分类（一次LLM往返）与本地、在线两路检索并发执行。
+        # 预取只做检索、不生成各路答案：确定模式后，本地/在线/混合搜索和代码生成沿用已完成的检索结果
+        # 生成答案，其他模式取消预取，不会为被丢弃的预取消耗答案生成的LLM调用
+        retrieval = None
+        if search_mode is None and self.default_search_mode == SearchMode.ADAPTIVE:
+            retrieval = self._start_retrieval(query, top_k, **kwargs)
+        
+        # 分类查询类型
+        try:
+            async with self._llm_slot():
+                query_type = await asyncio.to_thread(self._classify_query_type, query)
+        except BaseException:
+            if retrieval is not None:
+                self._discard_retrieval(retrieval)
+            raise
+        logger.info(f"🏷️ 查询类型: {query_type.value}")
+        
+        # 选择搜索模式
+        if search_mode is None:
+            search_mode = self._select_search_mode(query, query_type, context)
+        
+        logger.info(f"🎯 选择搜索模式: {search_mode.value}")
+        self._count_mode(search_mode)
+        
+        # 执行搜索
+        if retrieval is not None:
+            self._discard_retrieval(retrieval, keep=self._RETRIEVAL_BRANCHES.get(search_mode, ()))
+        answer, sources, token_usage = await self._execute_search(
+            query, search_mode, query_type, top_k, retrieval=retrieval, **kwargs
+        )
+        
+        return query_type, search_mode, answer, sources, token_usage
+    
+    def _start_retrieval(self, query: str, top_k: int, **kwargs) -> Dict[str, asyncio.Task]:
+        """
+        启动本地和在线两路检索任务（不生成答案），确定搜索模式后交给对应分支沿用
+        
+        Returns:
+            分支名（"local"/"online"）到检索任务的映射，未初始化的分支不启动
+        """
+        retrieval = {}
+        if self.local_adapter:
+            retrieval["local"] = asyncio.create_task(self._local_retrieve(query, top_k, **kwargs))
+        if self.online_engine:
+            retrieval["online"] = asyncio.create_task(self._online_retrieve(query))
+        for task in retrieval.values():
+            # 被丢弃的检索任务的异常不再有人读取，避免事件循环报告未处理的异常
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return retrieval
+    
+    @staticmethod
+    def _discard_retrieval(retrieval: Dict[str, asyncio.Task], keep: Tuple[str, ...] = ()):
+        """取消所选模式不会使用的预取检索任务"""
+        for name, task in retrieval.items():
+            if name not in keep:
+                task.cancel()
+    
+    async def _literal_lookup(self, query: str, top_k: int) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        字面量精确查找，未找到结果时返回None以回退到完整搜索流程
+        
+        Returns:
+            (结果摘要, 信息源列表) 或 None
+        """
+        literal = query.strip()
+        if len(literal) > 2 and literal[0] == literal[-1] == '"':
+            literal = literal[1:-1]
+        try:
+            results = await asyncio.to_thread(
+                self.local_adapter.search_huawei_docs, literal, top_k=top_k, exact=True
+            )
+        except Exception as e:
+            logger.warning(f"字面量精确查找失败: {e}")
+            return None
+        if not results:
+            return None
+        return self._summarize_local_results(results), self._local_sources(results)
+    
+    @staticmethod
+    def _summarize_local_results(results: List[Dict[str, Any]]) -> str:
+        """LLM不参与时的本地搜索结果摘要"""
+        answer = f"找到 {len(results)} 个相关文档：\n"
+        for i, r in enumerate(results[:3], 1):
+            answer += f"{i}. {r.get('title', '未知标题')}\n   {r.get('content', '')[:100]}...\n"
+        return answer
+    
+    @staticmethod
+    def _local_sources(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将本地搜索结果转换为信息源列表"""
+        return [
+            _make_source(r.get('title', '未知标题'), r.get('url', ''), _preview(r), r.get('score', 0), SOURCE_TYPE_LOCAL)
+            for r in results
+        ]
+    
     async def _execute_search(self, 
                              query: str, 
                              search_mode: SearchMode, 
                              query_type: QueryType,
                              top_k: int,
+                             retrieval: Optional[Dict[str, asyncio.Task]] = None,
                              **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
         """
         执行具体的搜索逻辑
@@ -613,36 +1278,53 @@ class HuaweiSearchAgent:
             search_mode: 搜索模式
             query_type: 查询类型
             top_k: 返回结果数量
+            retrieval: 预取的检索任务（自适应模式），为None时各分支自行检索
             **kwargs: 其他参数
             
         Returns:
             (答案, 信息源列表, token使用量)
         """
+        retrieval = retrieval or {}
         if search_mode == SearchMode.LOCAL_ONLY:
-            return await self._local_search(query, top_k, **kwargs)
+            return await self._local_search(query, top_k, retrieval=retrieval.get("local"), **kwargs)
         elif search_mode == SearchMode.ONLINE_ONLY:
-            return await self._online_search(query, top_k, **kwargs)
+            return await self._online_search(query, top_k, retrieval=retrieval.get("online"), **kwargs)
         elif search_mode == SearchMode.HYBRID:
-            return await self._hybrid_search(query, top_k, **kwargs)
+            return await self._hybrid_search(query, top_k, retrieval=retrieval, **kwargs)
         elif search_mode == SearchMode.CHAIN_OF_SEARCH:
             return await self._chain_of_search(query, top_k, **kwargs)
         elif search_mode == SearchMode.CODE_GENERATION:
-            return await self._code_generation_search(query, top_k, **kwargs)
+            return await self._code_generation_search(query, top_k, retrieval=retrieval, **kwargs)
         else:
             # 默认使用混合搜索
             return await self._hybrid_search(query, top_k, **kwargs)
     
-    async def _local_search(self, query: str, top_k: int, **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
-        """本地搜索"""
+    async def _local_retrieve(self, query: str, top_k: int, **kwargs) -> List[Dict[str, Any]]:
+        """本地检索（不生成答案）"""
+        return await asyncio.to_thread(
+            self.local_adapter.search_huawei_docs,
+            query=query,
+            top_k=top_k,
+            **kwargs
+        )
+    
+    async def _local_search(self, query: str, top_k: int,
+                            retrieval: Optional[asyncio.Task] = None,
+                            **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
+        """
+        本地搜索
+        
+        Args:
+            retrieval: 预取的本地检索任务，提供时沿用其结果（按top_k截取）而不重新检索
+        """
         if not self.local_adapter:
             return "本地搜索服务不可用：适配器未初始化。请确保向量数据库和嵌入模型已正确配置。", [], 0
         
         try:
-            results = self.local_adapter.search_huawei_docs(
-                query=query,
-                top_k=top_k,
-                **kwargs
-            )
+            if retrieval is None:
+                results = await self._local_retrieve(query, top_k, **kwargs)
+            else:
+                results = (await retrieval)[:top_k]
             
             # 生成答案
             if results and llm:
@@ -657,52 +1339,56 @@ class HuaweiSearchAgent:
 
 请提供准确、详细的答案：
 """
-                response = llm.chat([{"role": "user", "content": answer_prompt}])
+                response = await self._achat([{"role": "user", "content": answer_prompt}])
                 answer = llm.remove_think(response.content)
                 token_usage = response.total_tokens
             else:
                 if results:
                     # 有结果但LLM不可用，返回搜索结果摘要
-                    answer = f"找到 {len(results)} 个相关文档：\n"
-                    for i, r in enumerate(results[:3], 1):
-                        answer += f"{i}. {r.get('title', '未知标题')}\n   {r.get('content', '')[:100]}...\n"
+                    answer = self._summarize_local_results(results)
                 else:
                     answer = "未找到相关文档"
                 token_usage = 0
             
-            sources = [
-                {
-                    "title": r.get('title', '未知标题'),
-                    "url": r.get('url', ''),
-                    "content": r.get('content', '')[:200] + "...",
-                    "score": r.get('score', 0),
-                    "source_type": "local"
-                }
-                for r in results
-            ]
+            sources = self._local_sources(results)
             
             return answer, sources, token_usage
             
         except Exception as e:
             logger.error(f"本地搜索失败: {e}")
+            _mark_branch_failed("本地搜索")
             return f"本地搜索失败: {str(e)}", [], 0
     
-    async def _online_search(self, query: str, top_k: int, **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
-        """在线搜索"""
+    async def _online_retrieve(self, query: str) -> Tuple[Iterator[str], List[Dict[str, Any]]]:
+        """
+        在线检索：搜索阶段完成即返回
+        
+        Returns:
+            (答案文本片段迭代器, 文档列表)；迭代器被消费前不会调用LLM生成答案
+        """
+        async with self._llm_slot():
+            return await asyncio.to_thread(self.online_engine.search_and_answer_stream, query)
+    
+    async def _online_search(self, query: str, top_k: int,
+                             retrieval: Optional[asyncio.Task] = None,
+                             **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
+        """
+        在线搜索
+        
+        Args:
+            retrieval: 预取的在线检索任务，提供时沿用其结果而不重新搜索
+        """
         if not self.online_engine:
             return "在线搜索服务不可用", [], 0
         
         try:
-            answer, documents = self.online_engine.search_and_answer(query)
+            chunks, documents = await (retrieval if retrieval is not None else self._online_retrieve(query))
+            async with self._llm_slot():
+                answer = await asyncio.to_thread(lambda: "".join(chunks).strip())
             
             sources = [
-                {
-                    "title": doc.get('title', '未知标题'),
-                    "url": doc.get('url', ''),
-                    "content": doc.get('content', '')[:200] + "...",
-                    "score": doc.get('relevance_score', 0),
-                    "source_type": "online"
-                }
+                _make_source(doc.get('title', '未知标题'), doc.get('url', ''), _preview(doc),
+                             doc.get('relevance_score', 0), SOURCE_TYPE_ONLINE)
                 for doc in documents[:top_k]
             ]
             
@@ -713,29 +1399,63 @@ class HuaweiSearchAgent:
             
         except Exception as e:
             logger.error(f"在线搜索失败: {e}")
+            _mark_branch_failed("在线搜索")
             return f"在线搜索失败: {str(e)}", [], 0
     
     async def _hybrid_search(self, query: str, top_k: int, **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
         """混合搜索"""
-        # 并行执行本地和在线搜索
-        local_task = self._local_search(query, top_k // 2, **kwargs)
-        online_task = self._online_search(query, top_k // 2, **kwargs)
+        # 最后产出的一项即综合结果
+        async for _, answer, sources, token_usage in self._hybrid_search_stream(query, top_k, **kwargs):
+            pass
+        return answer, sources, token_usage
+    
+    async def _hybrid_search_stream(self, query: str, top_k: int,
+                                    retrieval: Optional[Dict[str, asyncio.Task]] = None, **kwargs):
+        """
+        增量式混合搜索：本地和在线搜索并行执行，先完成的一路作为部分结果产出，
+        两路都完成后产出综合答案
         
-        local_result, online_result = await asyncio.gather(local_task, online_task, return_exceptions=True)
+        Args:
+            retrieval: 预取的检索任务（分支名到任务），提供的分支沿用其结果而不重新检索
         
-        # 处理异常结果
-        if isinstance(local_result, Exception):
-            local_answer, local_sources, local_tokens = f"本地搜索异常: {local_result}", [], 0
-        else:
-            local_answer, local_sources, local_tokens = local_result
+        Yields:
+            (是否为最终结果, 答案, 信息源列表, token使用量)
+        """
+        retrieval = retrieval or {}
+        tasks = {
+            asyncio.create_task(
+                self._local_search(query, top_k // 2, retrieval=retrieval.get("local"), **kwargs)
+            ): "local",
+            asyncio.create_task(
+                self._online_search(query, top_k // 2, retrieval=retrieval.get("online"), **kwargs)
+            ): "online",
+        }
+        results = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    error = task.exception()
+                    if error is not None:
+                        label = "本地" if name == "local" else "在线"
+                        _mark_branch_failed(f"{label}搜索")
+                        results[name] = (f"{label}搜索异常: {error}", [], 0)
+                    else:
+                        results[name] = task.result()
+                if pending:
+                    for task in done:
+                        yield (False, *results[tasks[task]])
+        finally:
+            for task in pending:
+                task.cancel()
         
-        if isinstance(online_result, Exception):
-            online_answer, online_sources, online_tokens = f"在线搜索异常: {online_result}", [], 0
-        else:
-            online_answer, online_sources, online_tokens = online_result
+        local_answer, local_sources, local_tokens = results["local"]
+        online_answer, online_sources, online_tokens = results["online"]
         
-        # 合并结果
-        all_sources = local_sources + online_sources
+        # 合并结果，并按与查询的语义相似度排序
+        all_sources = await self._rank_sources(query, local_sources + online_sources)
         
         # 生成综合答案
         if llm and (local_sources or online_sources):
@@ -752,14 +1472,20 @@ class HuaweiSearchAgent:
 
 请提供一个综合、准确的最终答案：
 """
-            response = llm.chat([{"role": "user", "content": synthesis_prompt}])
-            final_answer = llm.remove_think(response.content)
-            total_tokens = local_tokens + online_tokens + response.total_tokens
+            messages = [{"role": "user", "content": synthesis_prompt}]
+            sink = _answer_sink.get()
+            if sink is None:
+                response = await self._achat(messages)
+                final_answer = llm.remove_think(response.content)
+                synthesis_tokens = response.total_tokens
+            else:
+                final_answer, synthesis_tokens = await self._astream_chat(messages, sink)
+            total_tokens = local_tokens + online_tokens + synthesis_tokens
         else:
             final_answer = f"本地搜索: {local_answer}\n\n在线搜索: {online_answer}"
             total_tokens = local_tokens + online_tokens
         
-        return final_answer, all_sources, total_tokens
+        yield True, final_answer, all_sources, total_tokens
     
     async def _chain_of_search(self, query: str, top_k: int, **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
         """链式搜索"""
@@ -777,16 +1503,15 @@ class HuaweiSearchAgent:
                 early_stopping=True
             )
             
-            answer, retrieved_results, token_usage = chain_rag.query(query, top_k=top_k)
+            async with self._llm_slot():
+                answer, retrieved_results, token_usage = await asyncio.to_thread(
+                    chain_rag.query, query, top_k=top_k
+                )
             
+            preview_length = RAGConfig.SOURCE_PREVIEW_LENGTH
             sources = [
-                {
-                    "title": result.metadata.get('title', '未知标题'),
-                    "url": result.metadata.get('url', ''),
-                    "content": result.text[:200] + "...",
-                    "score": result.score,
-                    "source_type": "chain_search"
-                }
+                _make_source(result.metadata.get('title', '未知标题'), result.metadata.get('url', ''),
+                             result.text[:preview_length] + "...", result.score, SOURCE_TYPE_CHAIN)
                 for result in retrieved_results[:top_k]
             ]
             
@@ -797,13 +1522,16 @@ class HuaweiSearchAgent:
             # 降级到混合搜索
             return await self._hybrid_search(query, top_k, **kwargs)
     
-    async def _code_generation_search(self, query: str, top_k: int, **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
+    async def _code_generation_search(self, query: str, top_k: int,
+                                      retrieval: Optional[Dict[str, asyncio.Task]] = None,
+                                      **kwargs) -> Tuple[str, List[Dict[str, Any]], int]:
         """
         代码生成搜索：先搜索文档，然后生成华为操作系统相关代码
         
         Args:
             query: 搜索查询
             top_k: 返回结果数量
+            retrieval: 预取的检索任务（自适应模式），为None时重新检索
             **kwargs: 其他参数
             
         Returns:
@@ -816,25 +1544,59 @@ class HuaweiSearchAgent:
             logger.info(f"🔨 开始代码生成流程: {query}")
             
             # 步骤1：先执行文档搜索获取相关信息
+            # 先完成的一路检索结果到达后即推测性地启动代码生成，与另一路检索重叠执行
             logger.info("📚 步骤1：搜索相关文档...")
-            search_answer, sources, search_tokens = await self._hybrid_search(query, top_k, **kwargs)
+            # 文档综合答案只是中间结果，不向流式调用方输出
+            speculative_task = speculative_keys = None
+            search_stream = self._hybrid_search_stream(query, top_k, retrieval=retrieval, **kwargs)
+            sink_token = _answer_sink.set(None)
+            try:
+                async for is_final, search_answer, sources, search_tokens in search_stream:
+                    if not is_final and speculative_task is None and sources:
+                        speculative_keys = self._source_keys(sources)
+                        speculative_task = asyncio.create_task(
+                            self._generate_huawei_code(query, search_answer, sources)
+                        )
+            finally:
+                _answer_sink.reset(sink_token)
             
             # 步骤2：基于搜索结果生成华为操作系统相关代码
+            # 推测生成所依据的信息源仍全部保留在完整检索结果中时沿用推测生成的代码
+            # （另一路新增的信息源会在步骤4随综合答案一起参与最终代码生成），否则取消并重新生成
             logger.info("💻 步骤2：生成华为操作系统代码...")
-            initial_code, code_gen_tokens = await self._generate_huawei_code(query, search_answer, sources)
+            if speculative_task is not None and speculative_keys <= self._source_keys(sources):
+                logger.info("⚡ 推测生成依据的信息源均在完整检索结果中，沿用推测生成的代码")
+                initial_code, code_gen_tokens = await speculative_task
+            else:
+                if speculative_task is not None:
+                    speculative_task.cancel()
+                initial_code, code_gen_tokens = await self._generate_huawei_code(query, search_answer, sources)
             
             # 步骤3：使用新的代码检查服务进行评价
+            # 检查的同时推测性地生成不参考评价的最终代码，评分足够高时直接采用
             logger.info("🔍 步骤3：进行代码检查...")
-            code_review_result = await self._review_code_with_service(query, initial_code)
+            speculative_final = asyncio.create_task(
+                self._generate_final_code(query, initial_code, "", search_answer)
+            )
+            try:
+                code_review_result = await self._review_code_with_service(query, initial_code, search_answer)
+            except BaseException:
+                speculative_final.cancel()
+                raise
             
             # 步骤4：基于评价结果生成最终优化代码
             logger.info("✨ 步骤4：生成最终优化代码...")
-            final_code, final_tokens = await self._generate_final_code(
-                query, initial_code, code_review_result.review_report
-            )
+            if code_review_result.score >= SPECULATIVE_FINAL_MIN_SCORE:
+                logger.info(f"⚡ 代码评分 {code_review_result.score} 较高，采用推测生成的最终代码")
+                final_code, final_tokens = await speculative_final
+            else:
+                speculative_final.cancel()
+                final_code, final_tokens = await self._generate_final_code(
+                    query, initial_code, code_review_result.review_report, search_answer
+                )
             
             # 更新统计
-            self.stats["code_generation_count"] += 1
+            self._count("code_generation_count")
             
             # 组织最终答案，包含初始代码信息
             final_answer = self._format_code_generation_result(
@@ -871,8 +1633,14 @@ class HuaweiSearchAgent:
             
         except Exception as e:
             logger.error(f"❌ 代码生成失败: {e}")
+            _mark_branch_failed("代码生成")
             return f"代码生成失败: {str(e)}", [], 0
     
+    @staticmethod
+    def _source_keys(sources: List[Dict[str, Any]]) -> frozenset:
+        """信息源的(url, 标题)集合，用于判断推测生成所依据的上下文是否仍然有效"""
+        return frozenset((source.get('url', ''), source.get('title', '')) for source in sources)
+    
     async def _generate_huawei_code(self, query: str, search_context: str, sources: List[Dict]) -> Tuple[str, int]:
         """
         基于搜索结果生成华为操作系统相关代码
@@ -886,41 +1654,27 @@ class HuaweiSearchAgent:
             (生成的代码, token使用量)
         """
         try:
-            # 构建代码生成提示词
-            code_prompt = f"""
-作为华为操作系统开发专家，请基于以下文档信息，为用户需求生成相应的华为操作系统相关代码。
-
-用户需求: {query}
-
-参考文档信息:
-{search_context}
-
-请生成符合以下要求的代码：
-1. 代码必须与华为操作系统（如HarmonyOS、鸿蒙系统）相关
-2. 使用华为官方推荐的开发语言和框架（如ArkTS、ArkUI等）
-3. 遵循华为开发规范和最佳实践
-4. 代码应该是完整的、可运行的示例
-5. 包含适当的注释说明
-
-请生成代码，并简要说明代码的功能和使用方法：
-"""
-            
-            response = llm.chat([{"role": "user", "content": code_prompt}])
-            code = llm.remove_think(response.content)
+            # 构建代码生成提示词（共享前缀之后仅追加本阶段指令）
+            messages = _code_stage_messages(
+                query, search_context, "请为用户需求生成相应的华为操作系统相关代码，并简要说明代码的功能和使用方法："
+            )
             
-            return code, response.total_tokens
+            # 在线程中调用，使推测生成能与检索重叠执行
+            return await self._acached_chat(messages)
             
         except Exception as e:
             logger.error(f"代码生成失败: {e}")
+            _mark_branch_failed("代码生成")
             return f"代码生成失败: {str(e)}", 0
     
-    async def _review_code_with_service(self, query: str, code: str) -> CodeReviewResult:
+    async def _review_code_with_service(self, query: str, code: str, search_context: str = None) -> CodeReviewResult:
         """
         使用代码检查服务进行代码评价
         
         Args:
             query: 原始查询
             code: 待评价的代码
+            search_context: 代码生成时使用的检索上下文（可选，用于复用共享提示词前缀）
             
         Returns:
             代码检查结果
@@ -935,7 +1689,8 @@ class HuaweiSearchAgent:
                 original_query=query,
                 code=code,
                 language=language,
-                review_type="comprehensive"
+                review_type="comprehensive",
+                metadata={"search_context": search_context} if search_context is not None else None
             )
             
             # 执行检查（返回 shared.interfaces.CodeReviewResult）
@@ -958,13 +1713,14 @@ class HuaweiSearchAgent:
             
         except Exception as e:
             logger.error(f"代码检查服务调用失败: {e}")
+            _mark_branch_failed("代码检查")
             # 如果服务失败，回退到原始方法
             logger.info("回退到原始代码检查方法")
-            review_text, token_usage = await self._review_code(query, code)
+            review_text, token_usage = await self._review_code(query, code, search_context)
             
             # 构造兼容的结果
             return CodeReviewResult(
-                request_id=f"fallback_{int(time.time())}",
+                request_id=f"fallback_{time.time_ns()}",
                 original_query=query,
                 code=code,
                 review_report=review_text,
@@ -985,141 +1741,16 @@ class HuaweiSearchAgent:
         Returns:
             检测到的语言
         """
-        code_lower = code.lower()
-        code_lines = code.split('\n')
-        
-        # ArkTS 特征检测（优先级最高）
-        arkts_decorators = ['@entry', '@component', '@state', '@prop', '@link', '@provide', 
-                           '@consume', '@objectlink', '@observed', '@watch', '@builder', 
-                           '@extend', '@styles', '@preview']
-        arkts_keywords = ['struct', 'build()', 'abouttoappear', 'abouttodisappear', 
-                         'onpageshow', 'onpagehide', 'onbackpress']
-        arkts_ui_components = ['column', 'row', 'stack', 'flex', 'text', 'button', 
-                              'image', 'list', 'listitem', 'grid', 'griditem', 'scroll']
-        
-        # 检查 ArkTS 装饰器
-        if any(decorator in code_lower for decorator in arkts_decorators):
-            return "arkts"
-        
-        # 检查 ArkTS 关键字
-        if any(keyword in code_lower for keyword in arkts_keywords):
-            return "arkts"
-        
-        # 检查 ArkTS UI 组件
-        if any(component in code_lower for component in arkts_ui_components):
-            # 进一步检查是否是 ArkTS 语法
-            if 'struct' in code_lower or any(decorator in code_lower for decorator in arkts_decorators[:3]):
-                return "arkts"
-        
-        # 检查文件扩展名相关的语法模式
-        if '.ets' in code_lower or 'export struct' in code_lower:
-            return "arkts"
-        
-        # 检查 ArkTS 特有的语法模式
-        for line in code_lines:
-            line_lower = line.lower().strip()
-            # ArkTS 组件定义模式
-            if line_lower.startswith('struct ') and '{' in line:
-                return "arkts"
-            # ArkTS build 方法模式
-            if line_lower.startswith('build()') or 'build() {' in line_lower:
-                return "arkts"
-            # ArkTS 状态变量模式
-            if line_lower.startswith('@state') or line_lower.startswith('@prop'):
-                return "arkts"
-        
-        # TypeScript 检测
-        typescript_indicators = ['interface ', 'type ', 'enum ', 'namespace ', 'declare ', 
-                               'import type', 'export type', 'as const', 'readonly ', 
-                               'keyof ', 'typeof ', 'extends ', 'implements ']
-        typescript_generics = ['<T>', '<T,', '<T extends', '<K,', '<V>', 'Array<', 'Promise<']
-        
-        if any(indicator in code_lower for indicator in typescript_indicators):
-            return "typescript"
-        
-        if any(generic in code for generic in typescript_generics):
-            return "typescript"
-        
-        # 检查 TypeScript 类型注解
-        if ':' in code and any(pattern in code for pattern in [': string', ': number', ': boolean', 
-                                                              ': object', ': any', ': void', 
-                                                              ': Array<', ': Promise<']):
-            return "typescript"
-        
-        # JavaScript 检测
-        javascript_indicators = ['function ', 'var ', 'let ', 'const ', 'import ', 'export ', 
-                               'class ', 'extends ', 'super(', 'this.', 'prototype.', 
-                               'async ', 'await ', '=>', 'require(', 'module.exports']
-        
-        if any(indicator in code_lower for indicator in javascript_indicators):
-            # 进一步区分 JavaScript 和 TypeScript
-            if ':' in code and any(type_hint in code for type_hint in [': string', ': number', ': boolean']):
-                return "typescript"
-            return "javascript"
-        
-        # Java 检测
-        java_indicators = ['public class', 'private class', 'protected class', 'public static void main',
-                          'package ', 'import java.', 'System.out.', 'public void ', 'private void ',
-                          'protected void ', 'public int ', 'private int ', 'String[]', 'ArrayList<']
-        
-        if any(indicator in code_lower for indicator in java_indicators):
-            return "java"
-        
-        # Python 检测
-        python_indicators = ['def ', 'class ', 'import ', 'from ', 'if __name__', 'print(', 
-                           'self.', 'elif ', 'with ', 'as ', 'lambda ', 'yield ', 'async def']
-        
-        if any(indicator in code_lower for indicator in python_indicators):
-            return "python"
-        
-        # C/C++ 检测
-        cpp_indicators = ['#include', 'int main', 'std::', 'using namespace', 'cout <<', 
-                         'cin >>', 'endl', 'printf(', 'scanf(', 'malloc(', 'free(']
-        
-        if any(indicator in code_lower for indicator in cpp_indicators):
-            return "cpp"
-        
-        # Vue 检测
-        vue_indicators = ['<template>', '<script>', '<style>', 'export default', 'Vue.', 
-                         'v-if', 'v-for', 'v-model', '@click', ':class', ':style']
-        
-        if any(indicator in code_lower for indicator in vue_indicators):
-            return "vue"
-        
-        # HTML 检测
-        html_indicators = ['<!doctype', '<html', '<head>', '<body>', '<div', '<span', 
-                          '<p>', '<a href', '<img src', '<script src']
-        
-        if any(indicator in code_lower for indicator in html_indicators):
-            return "html"
-        
-        # CSS 检测
-        css_indicators = ['{', '}', ':', ';', 'px', 'em', 'rem', '%', 'color:', 'background:', 
-                         'margin:', 'padding:', 'display:', 'position:', 'font-']
-        
-        if code.count('{') > 2 and code.count('}') > 2 and ':' in code and ';' in code:
-            if any(indicator in code_lower for indicator in css_indicators):
-                return "css"
-        
-        # JSON 检测
-        if code.strip().startswith('{') and code.strip().endswith('}'):
-            try:
-                import json
-                json.loads(code)
-                return "json"
-            except:
-                pass
-        
-        # 默认返回 unknown
-        return "unknown"
+        return detect_code_language(code)
     
-    async def _review_code(self, query: str, code: str) -> Tuple[str, int]:
+    async def _review_code(self, query: str, code: str, search_context: str = None) -> Tuple[str, int]:
         """
         对生成的代码进行评价和检查
         
         Args:
             query: 原始查询
             code: 待评价的代码
+            search_context: 检索上下文（可选，提供时使用共享提示词前缀）
             
         Returns:
             (评价结果, token使用量)
@@ -1144,16 +1775,22 @@ class HuaweiSearchAgent:
 请提供详细的评价报告：
 """
             
-            response = llm.chat([{"role": "user", "content": review_prompt}])
+            if search_context is not None:
+                messages = _code_stage_messages(query, search_context, review_prompt)
+            else:
+                messages = [{"role": "user", "content": review_prompt}]
+            response = await self._achat(messages)
             review = llm.remove_think(response.content)
             
             return review, response.total_tokens
             
         except Exception as e:
             logger.error(f"代码评价失败: {e}")
+            _mark_branch_failed("代码评价")
             return f"代码评价失败: {str(e)}", 0
     
-    async def _generate_final_code(self, query: str, initial_code: str, review: str) -> Tuple[str, int]:
+    async def _generate_final_code(self, query: str, initial_code: str, review: str,
+                                   search_context: str = "") -> Tuple[str, int]:
         """
         基于评价结果生成最终优化的代码
         
@@ -1161,6 +1798,7 @@ class HuaweiSearchAgent:
             query: 原始查询
             initial_code: 初始代码
             review: 代码评价
+            search_context: 代码生成时使用的检索上下文，与前序阶段共享提示词前缀
             
         Returns:
             (最终优化代码, token使用量)
@@ -1169,8 +1807,6 @@ class HuaweiSearchAgent:
             final_prompt = f"""
 基于代码评价结果，请生成最终优化的华为操作系统代码：
 
-原始需求：{query}
-
 初始代码：
 {initial_code}
 
@@ -1187,13 +1823,11 @@ class HuaweiSearchAgent:
 请提供最终的完整代码：
 """
             
-            response = llm.chat([{"role": "user", "content": final_prompt}])
-            final_code = llm.remove_think(response.content)
-            
-            return final_code, response.total_tokens
+            return await self._acached_chat(_code_stage_messages(query, search_context, final_prompt))
             
         except Exception as e:
             logger.error(f"最终代码生成失败: {e}")
+            _mark_branch_failed("最终代码生成")
             return f"最终代码生成失败: {str(e)}", 0
     
     def _format_code_generation_result(self, query: str, search_answer: str, 
@@ -1213,7 +1847,9 @@ class HuaweiSearchAgent:
         Returns:
             格式化的最终答案（包含详细的代码检查信息）
         """
-        result = f"""## 华为代码生成结果
+        parts: List[str] = []
+        append = parts.append
+        append(f"""## 华为代码生成结果
 
 ### 用户需求
 {query}
@@ -1223,127 +1859,97 @@ class HuaweiSearchAgent:
 {final_code}
 ```
 
-### 🔍 代码检查详情"""
+### 🔍 代码检查详情""")
         
         if code_review_result:
             # 基本检查信息
-            result += f"""
+            append(f"""
 **检查器服务**: {code_review_result.review_metadata.get('service', '未知')}
 **检查语言**: {code_review_result.review_metadata.get('language', '未知')}
 **代码质量评分**: {code_review_result.score}/100
 **处理时间**: {code_review_result.processing_time:.2f}秒
-**检查ID**: {code_review_result.request_id}"""
+**检查ID**: {code_review_result.request_id}""")
 
             # 显示使用的具体检查器
             if code_review_result.review_metadata.get('unified_service'):
                 selected_checker = code_review_result.review_metadata.get('selected_checker', '未知')
-                result += f"""
+                append(f"""
 **使用的检查器**: {selected_checker.upper()}
-**统一检查服务**: ✅ 已启用"""
+**统一检查服务**: ✅ 已启用""")
                 
                 # 如果使用了ESLint，显示ESLint特定信息
                 if selected_checker == 'eslint':
-                    result += f"""
+                    append(f"""
 **ESLint版本**: 已集成
-**支持语言**: JavaScript, TypeScript, ArkTS"""
+**支持语言**: JavaScript, TypeScript, ArkTS""")
                 
                 # 如果使用了CppCheck，显示CppCheck特定信息
                 elif selected_checker == 'cppcheck':
-                    result += f"""
+                    append(f"""
 **CppCheck版本**: 已集成
-**支持语言**: C, C++"""
+**支持语言**: C, C++""")
             else:
-                result += f"""
-**检查方式**: LLM模拟检查（回退模式）"""
+                append(f"""
+**检查方式**: LLM模拟检查（回退模式）""")
 
-            result += f"""
+            append(f"""
 
-#### 📋 发现的问题 ({len(code_review_result.issues_found)} 个)"""
+#### 📋 发现的问题 ({len(code_review_result.issues_found)} 个)""")
             
             if code_review_result.issues_found:
                 for i, issue in enumerate(code_review_result.issues_found, 1):
-                    issue_type = issue.get('type', 'unknown')
-                    severity = issue.get('severity', 'info')
-                    message = issue.get('message', '未知问题')
-                    line = issue.get('line', 0)
-                    column = issue.get('column', 0)
-                    rule = issue.get('rule', issue.get('rule_id', 'unknown'))
-                    category = issue.get('category', 'general')
-                    
-                    # 根据严重程度选择图标
-                    severity_icon = {
-                        'error': '❌',
-                        'warning': '⚠️', 
-                        'info': 'ℹ️'
-                    }.get(severity.lower(), '📝')
-                    
-                    result += f"""
-{i}. {severity_icon} **[{severity.upper()}]** {message}"""
-                    
-                    if line > 0:
-                        result += f"""
-   📍 **位置**: 第 {line} 行""" + (f"，第 {column} 列" if column > 0 else "")
-                    
-                    result += f"""
-   🔍 **规则**: `{rule}`
-   📂 **分类**: {category}"""
-                    
-                    # 如果有修复建议
-                    fix_suggestion = issue.get('fix_suggestion', '')
-                    if fix_suggestion:
-                        result += f"""
-   💡 **修复建议**: {fix_suggestion}"""
+                    append(_format_issue(i, issue))
             else:
-                result += f"""
-✅ **未发现问题，代码质量良好！**"""
+                append(f"""
+✅ **未发现问题，代码质量良好！**""")
             
-            result += f"""
+            append(f"""
 
-#### 💡 改进建议 ({len(code_review_result.suggestions)} 条)"""
+#### 💡 改进建议 ({len(code_review_result.suggestions)} 条)""")
             
             if code_review_result.suggestions:
                 for i, suggestion in enumerate(code_review_result.suggestions, 1):
-                    result += f"""
-{i}. 💡 {suggestion}"""
+                    append(f"""
+{i}. 💡 {suggestion}""")
             else:
-                result += f"""
-✅ **代码已经很好，暂无改进建议**"""
+                append(f"""
+✅ **代码已经很好，暂无改进建议**""")
             
             # 显示技术细节
-            result += f"""
+            append(f"""
 
-#### 🔧 检查技术细节"""
+#### 🔧 检查技术细节""")
             
             # 显示检查器元数据
             if code_review_result.review_metadata:
-                result += f"""
+                append(f"""
 - **Token使用量**: {code_review_result.review_metadata.get('token_usage', 'N/A')}
 - **检查文件数**: {code_review_result.review_metadata.get('files_checked', 'N/A')}
-- **总处理时间**: {code_review_result.review_metadata.get('total_processing_time', code_review_result.processing_time):.2f}秒"""
+- **总处理时间**: {code_review_result.review_metadata.get('total_processing_time', code_review_result.processing_time):.2f}秒""")
                 
                 # 如果是统一服务，显示更多细节
                 if code_review_result.review_metadata.get('unified_service'):
-                    result += f"""
+                    append(f"""
 - **检查器可用性**: ✅ 真实工具检查
-- **回退状态**: 否"""
+- **回退状态**: 否""")
                 else:
-                    result += f"""
+                    append(f"""
 - **检查器可用性**: ⚠️ 使用LLM回退检查
-- **回退原因**: 真实检查器不可用"""
+- **回退原因**: 真实检查器不可用""")
 
-            result += f"""
+            append(f"""
 
 #### 📄 完整检查报告
 ```
 {code_review_result.review_report}
-```"""
+```""")
         else:
-            result += f"""
+            append(f"""
 ⚠️ **代码检查结果不可用**
 - 可能原因：检查器初始化失败或服务不可用
-- 建议：检查ESLint和CppCheck工具是否正确安装"""
+- 建议：检查ESLint和CppCheck工具是否正确安装""")
         
-        result += f"""
+        append(f"""
 
 ### 📝 初始代码（供调试参考）
 ```
@@ -1356,54 +1962,204 @@ class HuaweiSearchAgent:
 - **使用建议**: 请根据具体环境和需求进行适当调整
 - **问题排查**: 如有问题，请参考上述检查详情进行调试
 
-### 📊 生成统计"""
+### 📊 生成统计""")
         
         if code_review_result:
-            result += f"""
+            append(f"""
 - **代码质量评分**: {code_review_result.score}/100
 - **发现问题数**: {len(code_review_result.issues_found)}
 - **改进建议数**: {len(code_review_result.suggestions)}
-- **检查器类型**: {code_review_result.review_metadata.get('selected_checker', '未知').upper()}"""
+- **检查器类型**: {code_review_result.review_metadata.get('selected_checker', '未知').upper()}""")
         
-        result += f"""
+        append(f"""
 
 ---
-*🚀 由华为代码生成系统自动生成 | 🔍 检查器: {code_review_result.review_metadata.get('selected_checker', '未知').upper() if code_review_result else '未知'} | ⏱️ 处理时间: {f'{code_review_result.processing_time:.2f}s' if code_review_result else 'N/A'}*"""
+*🚀 由华为代码生成系统自动生成 | 🔍 检查器: {code_review_result.review_metadata.get('selected_checker', '未知').upper() if code_review_result else '未知'} | ⏱️ 处理时间: {f'{code_review_result.processing_time:.2f}s' if code_review_result else 'N/A'}*""")
         
-        return result.strip()
+        return "".join(parts).strip()
     
     def _get_or_create_context(self, session_id: str = None, query: str = "") -> Optional[SearchContext]:
         """获取或创建搜索上下文"""
         if not session_id:
             return None
         
-        if session_id not in self.active_contexts:
-            self.active_contexts[session_id] = SearchContext(
+        context = self.active_contexts.get(session_id)
+        if context is None:
+            # 历史记录使用定长队列，超出最大上下文长度时自动丢弃最早的记录
+            context = SearchContext(
                 session_id=session_id,
-                query_history=[],
-                search_history=[],
+                query_history=deque(maxlen=self.max_context_length),
+                search_history=deque(maxlen=self.max_context_length),
                 user_preferences={},
                 domain_focus="huawei"
             )
+            self.active_contexts[session_id] = context
+            while len(self.active_contexts) > self.max_active_contexts:
+                self.active_contexts.popitem(last=False)
+        else:
+            self.active_contexts.move_to_end(session_id)
         
-        context = self.active_contexts[session_id]
         context.query_history.append(query)
+        return context
+    
+    @staticmethod
+    def _cache_key(query: str, params: Tuple[str, int]) -> str:
+        """生成精确缓存键：搜索参数与归一化查询的blake2b哈希"""
+        mode, top_k = params
+        normalized = query.strip().lower()
+        return hashlib.blake2b(f"{mode}\x00{top_k}\x00{normalized}".encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _clone_result(result: SearchResult, cache_type: str) -> SearchResult:
+        """复制缓存的搜索结果，避免调用方修改影响缓存内容"""
+        return replace(
+            result,
+            sources=[dict(source) for source in result.sources],
+            processing_time=0.0,
+            metadata={**result.metadata, "cache": cache_type}
+        )
+    
+    @staticmethod
+    def _embed_batch(texts: List[str]) -> np.ndarray:
+        """
+        一次请求嵌入多段文本
+        按长度降序提交以减少分词填充浪费，返回按输入顺序排列的归一化向量矩阵
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors = np.asarray(embedding_model.embed_documents([texts[i] for i in order]), dtype=np.float32)
+        matrix = np.empty_like(vectors)
+        matrix[order] = vectors
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+    
+    async def _rank_sources(self, query: str, sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按相关性对信息源排序
+        配置了重排序服务时使用交叉编码器打分；否则查询与前RERANK_CANDIDATES个候选片段
+        在同一次嵌入请求中计算相似度。服务不可用或请求失败时保持原顺序
+        """
+        if len(sources) < 2 or not (self.reranker or embedding_model):
+            return sources
         
-        # 限制上下文长度
-        if len(context.query_history) > self.max_context_length:
-            context.query_history = context.query_history[-self.max_context_length:]
-            context.search_history = context.search_history[-self.max_context_length:]
+        candidates = sources[:RERANK_CANDIDATES]
+        snippets = [source.get('content', '') for source in candidates]
+        try:
+            if self.reranker:
+                score_key = "rerank_score"
+                scores = np.asarray(
+                    await asyncio.to_thread(self.reranker.score, query.strip(), snippets), dtype=np.float32
+                )
+                order = _topk(scores, len(candidates))
+                top_scores = scores[order]
+            else:
+                score_key = "semantic_score"
+                matrix = await asyncio.to_thread(self._embed_batch, [query.strip()] + snippets)
+                order, top_scores = _score_and_topk(matrix[0], matrix[1:], len(candidates))
+        except Exception as e:
+            logger.warning(f"信息源排序失败: {e}")
+            return sources
         
-        return context
+        ranked = [candidates[i] for i in order]
+        for source, score in zip(ranked, top_scores.tolist()):
+            source[score_key] = score
+        return ranked + sources[RERANK_CANDIDATES:]
+    
+    def _embed_for_cache(self, query: str) -> Optional[np.ndarray]:
+        """计算归一化的查询向量，嵌入模型不可用时返回None"""
+        if not embedding_model:
+            return None
+        try:
+            vector = np.asarray(embedding_model.embed_query(query.strip()), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"语义缓存查询向量计算失败: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+    
+    async def _lookup_cache(self, key: str, params: Tuple[str, int],
+                      query: str) -> Tuple[Optional[SearchResult], Optional[np.ndarray]]:
+        """
+        查找缓存的搜索结果
+        
+        Args:
+            key: 精确缓存键
+            params: 搜索参数（搜索模式, top_k），语义缓存只在参数相同的条目间命中
+            query: 用户查询
+        
+        Returns:
+            (命中的结果副本或None, 查询向量；精确命中时不计算向量)
+        """
+        self._check_index_version()
+        now = time.monotonic()
+        entry = self._exact_cache.get(key)
+        if entry is not None:
+            expires_at, cached = entry
+            if expires_at > now:
+                self._exact_cache.move_to_end(key)
+                return self._clone_result(cached, "exact"), None
+            del self._exact_cache[key]
+        
+        query_vector = await asyncio.to_thread(self._embed_for_cache, query)
+        if query_vector is None or not self._sem_cache:
+            return None, query_vector
+        
+        if self._sem_matrix is None:
+            self._sem_matrix = np.stack([vector for vector, _, _, _ in self._sem_cache])
+        if self._sem_matrix.shape[1] != query_vector.shape[0]:
+            return None, query_vector
+        scores = self._sem_matrix @ query_vector
+        for index, (_, entry_params, _, expires_at) in enumerate(self._sem_cache):
+            if entry_params != params or expires_at <= now:
+                scores[index] = -1.0
+        best = int(_topk(scores, 1)[0])
+        if scores[best] >= self.semantic_cache_threshold:
+            cached = self._sem_cache[best][2]
+            return self._clone_result(cached, "semantic"), query_vector
+        return None, query_vector
+    
+    def _store_cache(self, key: str, params: Tuple[str, int],
+                     query_vector: Optional[np.ndarray], result: SearchResult):
+        """写入缓存，超出容量时淘汰最久未使用的条目，同时清理已过期的语义缓存条目"""
+        if result.metadata.get("error"):
+            return
+        result = replace(result, sources=[dict(source) for source in result.sources],
+                         metadata=dict(result.metadata))
+        now = time.monotonic()
+        expires_at = now + self.cache_ttl
+        self._exact_cache[key] = (expires_at, result)
+        self._exact_cache.move_to_end(key)
+        while len(self._exact_cache) > self.cache_size:
+            self._exact_cache.popitem(last=False)
+        
+        if query_vector is not None:
+            self._sem_cache = [entry for entry in self._sem_cache if entry[3] > now]
+            self._sem_cache.append((query_vector, params, result, expires_at))
+            if len(self._sem_cache) > self.cache_size:
+                del self._sem_cache[:len(self._sem_cache) - self.cache_size]
+            self._sem_matrix = None
+    
+    def clear_cache(self):
+        """清空查询结果缓存（知识库更新后应调用）"""
+        self._exact_cache.clear()
+        self._sem_cache.clear()
+        self._sem_matrix = None
+    
+    def _check_index_version(self):
+        """RAG流水线重新加载过向量数据库时清空查询缓存"""
+        version = getattr(getattr(self, 'rag_pipeline', None), 'index_version', None)
+        if version != self._cache_index_version:
+            self.clear_cache()
+            self._cache_index_version = version
     
     def _update_context(self, context: SearchContext, query: str, answer: str, sources: List[Dict[str, Any]]):
         """更新搜索上下文"""
         if context:
+            # 会话上下文只保存在进程内存中，使用单调时钟（纳秒整数）记录先后顺序和间隔
             context.search_history.append({
                 "query": query,
                 "answer": answer,
                 "sources_count": len(sources),
-                "timestamp": time.time()
+                "timestamp_ns": time.monotonic_ns()
             })
     
     def _calculate_confidence(self, answer: str, sources: List[Dict[str, Any]], search_mode: SearchMode) -> float:
@@ -1431,9 +2187,35 @@ class HuaweiSearchAgent:
         
         return min(confidence, 1.0)
     
+    def _count(self, name: str):
+        """递增统计计数器"""
+        with self._stats_lock:
+            setattr(self._stats, name, getattr(self._stats, name) + 1)
+    
+    def _count_mode(self, search_mode: SearchMode):
+        """记录搜索模式使用次数"""
+        with self._stats_lock:
+            self._stats.mode_usage[search_mode.value] += 1
+    
+    def _record_success(self, processing_time: float):
+        """记录一次成功查询及其耗时"""
+        with self._stats_lock:
+            self._stats.successful_queries += 1
+            self._stats.total_response_time += processing_time
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """统计信息快照"""
+        with self._stats_lock:
+            snapshot = asdict(self._stats)
+        total_response_time = snapshot.pop("total_response_time")
+        successful = snapshot["successful_queries"]
+        snapshot["average_response_time"] = total_response_time / successful if successful else 0.0
+        return snapshot
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取搜索统计信息"""
-        return self.stats.copy()
+        return self.stats
     
     def clear_context(self, session_id: str = None):
         """清除搜索上下文"""
@@ -1444,15 +2226,7 @@ class HuaweiSearchAgent:
     
     def search_sync(self, query: str, **kwargs) -> SearchResult:
         """同步版本的搜索方法（兼容旧版本API）"""
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(self.search(query, **kwargs))
-            return result
-        finally:
-            loop.close()
+        return _run_sync(self.search(query, **kwargs))
     
     async def generate_code(self, 
                            query: str, 
@@ -1469,7 +2243,7 @@ class HuaweiSearchAgent:
         Returns:
             代码生成结果
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             logger.info(f"🔨 开始代码生成: {query}")
@@ -1548,15 +2322,7 @@ class HuaweiSearchAgent:
     
     def generate_code_sync(self, query: str, **kwargs) -> CodeGenerationResult:
         """同步版本的代码生成方法"""
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(self.generate_code(query, **kwargs))
-            return result
-        finally:
-            loop.close()
+        return _run_sync(self.generate_code(query, **kwargs))
     
     async def review_code_standalone(self, 
                                    query: str, 
@@ -1590,7 +2356,7 @@ class HuaweiSearchAgent:
             result = await self.code_review_service.review_code(request)
             
             # 更新统计
-            self.stats["code_review_count"] += 1
+            self._count("code_review_count")
             
             logger.info(f"✅ 代码检查完成: {result.request_id}")
             return result
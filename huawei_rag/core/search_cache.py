@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+华为RAG在线搜索持久化缓存
+基于SQLite的键值缓存，用于跨进程复用FireCrawl搜索结果和LLM查询分解；
+文本嵌入以int8量化后存放在连续的np.memmap文件中
+"""
+
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# SQLite单条语句的参数数量有上限，批量查询时分段执行
+_SQLITE_MAX_PARAMS = 900
+# 定期清理过期条目的间隔（秒）
+_EVICT_INTERVAL = 3600
+# 超出容量上限时清理到上限的该比例，避免之后每次写入都触发清理
+_CULL_RATIO = 0.9
+
+
+def make_cache_key(namespace: str, *parts: str) -> str:
+    """生成缓存键：sha256(namespace||parts)"""
+    digest = hashlib.sha256()
+    digest.update(namespace.encode('utf-8'))
+    for part in parts:
+        digest.update(b'\x00')
+        digest.update(part.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SearchCache:
+    """
+    SQLite键值缓存
+    值使用pickle序列化，支持按条目设置过期时间，可在多线程间共享；
+    打开时及写入时定期清理过期条目，设置size_limit后按写入顺序淘汰最早的条目
+    """
+
+    def __init__(self, directory: Union[str, Path], default_expire: Optional[float] = None,
+                 size_limit: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            directory: 缓存目录
+            default_expire: 默认过期时间（秒），None表示永不过期
+            size_limit: 缓存值的总字节数上限，None表示不限制
+        """
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.default_expire = default_expire
+        self.size_limit = size_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.directory / 'cache.db'),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expire_at REAL)'
+        )
+        self._next_evict = 0.0
+        self.evict_expired()
+        self._volume = self._total_size()
+
+    def _total_size(self) -> int:
+        """缓存值的总字节数（调用方持有锁或在初始化阶段调用）"""
+        return self._conn.execute('SELECT COALESCE(SUM(length(value)), 0) FROM cache').fetchone()[0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取单个缓存项，不存在或已过期时返回default"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expire_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """批量读取缓存项，只返回命中的键"""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        hits = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                batch = keys[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, value, expire_at FROM cache WHERE key IN ({placeholders})',
+                    batch
+                ).fetchall()
+                for key, value, expire_at in rows:
+                    if expire_at is None or expire_at >= now:
+                        hits[key] = value
+        return {key: pickle.loads(value) for key, value in hits.items()}
+
+    def set(self, key: str, value: Any, expire: Optional[float] = _MISSING) -> None:
+        """写入单个缓存项"""
+        self.set_many({key: value}, expire=expire)
+
+    def set_many(self, items: Dict[str, Any], expire: Optional[float] = _MISSING) -> None:
+        """批量写入缓存项"""
+        if not items:
+            return
+        if expire is _MISSING:
+            expire = self.default_expire
+        expire_at = time.time() + expire if expire is not None else None
+        rows = [
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expire_at)
+            for key, value in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expire_at) VALUES (?, ?, ?)',
+                rows
+            )
+            # 覆盖已有键时会高估数据量，清理时以实际统计为准
+            self._volume += sum(len(row[1]) for row in rows)
+            if self.size_limit is not None and self._volume > self.size_limit:
+                self._cull()
+        if time.monotonic() >= self._next_evict:
+            self.evict_expired()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def evict_expired(self) -> int:
+        """清理已过期的缓存项，返回清理数量"""
+        with self._lock:
+            self._next_evict = time.monotonic() + _EVICT_INTERVAL
+            cursor = self._conn.execute(
+                'DELETE FROM cache WHERE expire_at IS NOT NULL AND expire_at < ?', (time.time(),)
+            )
+            if cursor.rowcount:
+                self._volume = self._total_size()
+        return cursor.rowcount
+
+    def _cull(self) -> None:
+        """
+        数据量超过size_limit时先清理过期条目，仍超出则按写入顺序（rowid）删除最早的条目，
+        直到回落到上限的_CULL_RATIO（调用方持有锁）
+        """
+        self._conn.execute(
+            'DELETE FROM cache WHERE expire_at IS NOT NULL AND expire_at < ?', (time.time(),)
+        )
+        total = self._total_size()
+        if total > self.size_limit:
+            excess = total - int(self.size_limit * _CULL_RATIO)
+            self._conn.execute(
+                'DELETE FROM cache WHERE rowid IN ('
+                'SELECT rowid FROM (SELECT rowid, '
+                'SUM(length(value)) OVER (ORDER BY rowid) - length(value) AS before FROM cache) '
+                'WHERE before < ?)',
+                (excess,)
+            )
+            total = self._total_size()
+        self._volume = total
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM cache')
+            self._volume = 0
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按向量做对称int8量化：vec_i8 = round(vec / max(|vec|) * 127)
+
+    Returns:
+        (int8矩阵, 每个向量的缩放系数max(|vec|))
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1)
+    safe = np.where(scales == 0, 1.0, scales)
+    quantized = np.rint(vectors / safe[:, None] * 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def dequantize_int8(quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """int8向量还原为float32"""
+    return quantized.astype(np.float32) * (scales[:, None] / 127)
+
+
+def int8_cosine(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    int8向量间的余弦相似度，缩放系数在余弦中相互抵消，无需反量化
+
+    Args:
+        query: 形状为(D,)的int8查询向量
+        matrix: 形状为(N, D)的int8矩阵
+    """
+    matrix = matrix.astype(np.int32)
+    query = query.astype(np.int32)
+    dots = matrix @ query
+    norms = np.sqrt((matrix * matrix).sum(axis=1).astype(np.float64) * float(query @ query))
+    return (dots / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+class QuantizedEmbeddingStore:
+    """
+    int8量化的嵌入向量存储
+    向量和缩放系数分别追加写入两个定长记录文件，读取时以np.memmap映射；
+    文本键到行号的索引保存在SQLite中，写入时借助SQLite写锁在多进程间分配行号。
+    设置max_rows后，行数超过上限时换用一组新文件并清空索引（整体淘汰旧向量）；
+    行号全局递增不复用，轮换前分配的行号在读取时抛出KeyError
+    """
+
+    def __init__(self, directory: Union[str, Path], max_rows: Optional[int] = None):
+        """
+        初始化向量存储
+
+        Args:
+            directory: 存储目录（每个嵌入模型使用独立目录）
+            max_rows: 当前文件组的最大行数，None表示不限制
+        """
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.directory / 'index.db'),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self.dim = self._meta('dim', None)
+        self._mapped_base = 0
+        self._mapped_rows = 0
+        self._vectors = None
+        self._scales = None
+
+    def _meta(self, name: str, default: Optional[int] = 0) -> Optional[int]:
+        row = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def _count(self) -> int:
+        """已分配的全局行数（含被其他进程抢先写入而未被引用的行）"""
+        return self._meta('count')
+
+    def _paths(self, base: int) -> Tuple[Path, Path]:
+        """起始行号为base的文件组路径"""
+        if base == 0:
+            return self.directory / 'vectors.i8', self.directory / 'scales.f32'
+        return self.directory / f'vectors.{base}.i8', self.directory / f'scales.{base}.f32'
+
+    def _remap(self) -> None:
+        """按当前文件组重新映射（其他进程追加或轮换后调用）"""
+        base, count = self._meta('base'), self._count()
+        vectors_path, scales_path = self._paths(base)
+        if count > base:
+            self._vectors = np.memmap(vectors_path, dtype=np.int8, mode='r', shape=(count - base, self.dim))
+            self._scales = np.memmap(scales_path, dtype=np.float32, mode='r', shape=(count - base,))
+        else:
+            self._vectors = self._scales = None
+        self._mapped_base, self._mapped_rows = base, count
+
+    def _select_rows(self, keys: List[str]) -> Dict[str, int]:
+        found = {}
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            batch = keys[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ','.join('?' * len(batch))
+            found.update(self._conn.execute(
+                f'SELECT key, row FROM rows WHERE key IN ({placeholders})', batch
+            ).fetchall())
+        return found
+
+    def lookup(self, keys: List[str]) -> Dict[str, int]:
+        """查询已存储的键对应的行号"""
+        with self._lock:
+            return self._select_rows(keys)
+
+    def add(self, keys: List[str], vectors: np.ndarray) -> Dict[str, int]:
+        """量化并追加写入向量，返回各键对应的行号"""
+        quantized, scales = quantize_int8(vectors)
+        retired = None
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self.dim is None:
+                    self.dim = quantized.shape[1]
+                    self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+                elif quantized.shape[1] != self.dim:
+                    raise ValueError(f"嵌入维度不一致: 存储为 {self.dim}，输入为 {quantized.shape[1]}")
+
+                start = self._count()
+                base = self._meta('base')
+                if self.max_rows is not None and start - base + len(keys) > self.max_rows:
+                    # 换用新文件组而不截断旧文件：其他进程可能仍映射着旧文件
+                    retired, base = base, start
+                    self._conn.execute('DELETE FROM rows')
+                    self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('base', ?)", (base,))
+
+                for path, data, itemsize in zip(self._paths(base), (quantized, scales), (self.dim, 4)):
+                    with open(path, 'ab') as f:
+                        f.truncate((start - base) * itemsize)
+                        f.write(data.tobytes())
+
+                # 其他进程可能已写入相同的键，以已有行号为准
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO rows (key, row) VALUES (?, ?)',
+                    ((key, start + i) for i, key in enumerate(keys))
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('count', ?)", (start + len(keys),)
+                )
+                rows = self._select_rows(keys)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        if retired is not None:
+            logger.info(f"🧹 嵌入向量存储达到 {self.max_rows} 行上限，已轮换到新文件")
+            for path in self._paths(retired):
+                try:
+                    path.unlink()
+                except OSError:
+                    # 已被删除，或在Windows上仍被其他进程映射
+                    pass
+        return rows
+
+    def get(self, rows: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按行号读取int8向量和缩放系数
+
+        Raises:
+            KeyError: 行号已因存储轮换而失效
+        """
+        rows = np.fromiter(rows, dtype=np.int64)
+        with self._lock:
+            if not rows.size:
+                return np.empty((0, self.dim or 0), dtype=np.int8), np.empty(0, dtype=np.float32)
+            # 行号全局唯一，已映射范围内的行即使旧文件已被轮换删除也仍然有效
+            if rows.min() < self._mapped_base or rows.max() >= self._mapped_rows:
+                self._remap()
+                if rows.min() < self._mapped_base or rows.max() >= self._mapped_rows:
+                    raise KeyError("嵌入向量行号已因存储轮换而失效")
+            local = rows - self._mapped_base
+            return np.asarray(self._vectors[local]), np.asarray(self._scales[local])
+
+    def close(self) -> None:
+        """关闭索引连接并释放内存映射"""
+        with self._lock:
+            self._vectors = self._scales = None
+            self._mapped_base = self._mapped_rows = 0
+            self._conn.close()
@@ -159,19 +159,21 @@ def advanced_rag_demo(pipeline: HuaweiRAGPipeline, use_chain_of_rag: bool):
             print("🤖 正在使用高级RAG进行深度分析...")
             
             # 使用高级RAG搜索
-            results = pipeline.search_with_rag(
+            rag_response = pipeline.search_with_rag(
                 query=query, 
                 top_k=3, 
                 collection_name="huawei_docs",
-                use_chain_of_rag=use_chain_of_rag
+                use_chain_of_rag=use_chain_of_rag,
+                legacy_format=False
             )
+            results = rag_response['results']
             
             if results:
                 # 显示RAG生成的答案（如果有）
-                if results[0].get('rag_answer'):
+                if rag_response['answer']:
                     print(f"\n💡 RAG生成的答案:")
                     print("─" * 60)
-                    print(safe_str(results[0]['rag_answer']))
+                    print(safe_str(rag_response['answer']))
                     print("─" * 60)
                 
                 # 显示相关文档
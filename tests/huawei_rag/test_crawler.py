@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from huawei_rag.core.config import CrawlerConfig
+from huawei_rag.core.crawler import HuaweiContentCrawler
+
+
+def _fake_playwright(browser):
+    """Return an async_playwright replacement whose chromium launches the given browser."""
+    playwright = MagicMock()
+    playwright.chromium.launch = AsyncMock(return_value=browser)
+    manager = MagicMock()
+    manager.__aenter__ = AsyncMock(return_value=playwright)
+    manager.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=manager)
+
+
+def _fake_browser():
+    """Create a browser mock whose contexts hand out open page mocks."""
+    browser = MagicMock()
+    browser.close = AsyncMock()
+
+    async def new_context(**kwargs):
+        context = MagicMock()
+        context.close = AsyncMock()
+
+        async def new_page():
+            page = MagicMock()
+            page.context = context
+            page.is_closed.return_value = False
+            return page
+
+        context.new_page = AsyncMock(side_effect=new_page)
+        return context
+
+    browser.new_context = AsyncMock(side_effect=new_context)
+    return browser
+
+
+class TestCrawlWorkerPool(unittest.TestCase):
+    """Tests for the fixed worker pool in crawl_content."""
+
+    def test_workers_reuse_setup_page(self):
+        """Test each worker gets its page from setup_page and reuses it for every URL."""
+        with patch.object(CrawlerConfig, "ensure_directories"):
+            crawler = HuaweiContentCrawler(config=CrawlerConfig())
+        crawler.config.MAX_CONCURRENT = 2
+        crawler.config.DELAY_SECONDS = 0
+        browser = _fake_browser()
+        pages = []
+
+        async def fake_crawl(page, url_info):
+            pages.append(page)
+            return MagicMock()
+
+        urls = [{"url": f"https://developer.huawei.com/{i}"} for i in range(6)]
+        with patch("huawei_rag.core.crawler.async_playwright", _fake_playwright(browser)), \
+                patch.object(HuaweiContentCrawler, "load_existing_content", AsyncMock()), \
+                patch.object(HuaweiContentCrawler, "incremental_save", AsyncMock()), \
+                patch.object(HuaweiContentCrawler, "crawl_with_retry", side_effect=fake_crawl), \
+                patch.object(HuaweiContentCrawler, "setup_page",
+                             side_effect=HuaweiContentCrawler.setup_page, autospec=True) as setup_page:
+            content = asyncio.run(crawler.crawl_content(urls))
+
+        self.assertEqual(len(content), 6)
+        self.assertEqual(setup_page.call_count, 2)
+        self.assertEqual(len(set(map(id, pages))), 2)
+        self.assertEqual(browser.new_context.call_count, 2)
+        for page in pages:
+            page.context.close.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from huawei_rag.core.firecrawl_advanced_config import (
+    AdvancedFirecrawlConfig,
+    BATCH_SCRAPE_MAX_WORKERS,
+    HuaweiDocumentCrawler,
+    HUAWEI_MAX_WAIT_FOR_MS,
+    HUAWEI_WAIT_FOR_MS,
+    WAIT_RETRY_TIMEOUT_MARGIN_MS,
+)
+
+
+class TestScrapeOptions(unittest.TestCase):
+    """Tests that the scrape options reach the Firecrawl request body."""
+
+    def test_huawei_options_dump(self):
+        """Test the Huawei scrape options serialize wait time and content filters."""
+        dump = AdvancedFirecrawlConfig.get_huawei_optimized_scrape_options().model_dump()
+        self.assertEqual(dump["waitFor"], HUAWEI_WAIT_FOR_MS)
+        self.assertTrue(dump["onlyMainContent"])
+        self.assertIn("article", dump["includeTags"])
+        self.assertIn("nav", dump["excludeTags"])
+
+    def test_huawei_options_custom_wait(self):
+        """Test a custom wait time is kept in the dump."""
+        options = AdvancedFirecrawlConfig.get_huawei_optimized_scrape_options(
+            wait_ms=HUAWEI_MAX_WAIT_FOR_MS
+        )
+        self.assertEqual(options.model_dump()["waitFor"], HUAWEI_MAX_WAIT_FOR_MS)
+
+    def test_general_options_dump(self):
+        """Test the general scrape options serialize wait time."""
+        dump = AdvancedFirecrawlConfig.get_general_optimized_scrape_options().model_dump()
+        self.assertEqual(dump["waitFor"], 2000)
+        self.assertTrue(dump["onlyMainContent"])
+
+    def test_crawl_and_search_options_dump(self):
+        """Test the nested crawl and search scrape options serialize wait time."""
+        crawl = AdvancedFirecrawlConfig.get_crawl_options_for_huawei_docs()["scrape_options"]
+        search = AdvancedFirecrawlConfig.get_search_options_for_huawei()["scrape_options"]
+        self.assertEqual(crawl.model_dump()["waitFor"], 2000)
+        self.assertEqual(search.model_dump()["waitFor"], 2500)
+        self.assertTrue(search.model_dump(by_alias=True)["onlyMainContent"])
+
+    def test_selectors_merged_into_tags(self):
+        """Test the Huawei CSS selectors are sent as deduplicated include/exclude tags."""
+        dump = AdvancedFirecrawlConfig.get_huawei_optimized_scrape_options().model_dump()
+        self.assertIn(".doc-content", dump["includeTags"])
+        self.assertIn('[role="main"]', dump["includeTags"])
+        self.assertEqual(dump["includeTags"].count("main"), 1)
+        self.assertIn(".breadcrumb", dump["excludeTags"])
+        self.assertEqual(dump["excludeTags"].count(".sidebar"), 1)
+
+        crawl = AdvancedFirecrawlConfig.get_crawl_options_for_huawei_docs()["scrape_options"]
+        self.assertIn(".api-reference", crawl.model_dump()["includeTags"])
+        self.assertIn(".toc", crawl.model_dump()["excludeTags"])
+
+
+class TestBatchScrape(unittest.TestCase):
+    """Tests for HuaweiDocumentCrawler.scrape_huawei_doc_pages against the real SDK."""
+
+    def setUp(self):
+        """Set up a crawler whose SDK calls hit a stubbed HTTP layer."""
+        self.crawler = HuaweiDocumentCrawler("fc-test-key")
+        start = MagicMock(status_code=200)
+        start.json.return_value = {"success": True, "id": "job-1"}
+        status = MagicMock(status_code=200)
+        status.json.return_value = {
+            "success": True,
+            "status": "completed",
+            "completed": 1,
+            "total": 1,
+            "creditsUsed": 1,
+            "expiresAt": "2030-01-01T00:00:00Z",
+            "data": [{"markdown": "# ArkTS", "metadata": {"sourceURL": "https://developer.huawei.com/a"}}],
+        }
+        post_patcher = patch("firecrawl.firecrawl.requests.post", return_value=start)
+        get_patcher = patch("firecrawl.firecrawl.requests.get", return_value=status)
+        self.mock_post = post_patcher.start()
+        self.mock_get = get_patcher.start()
+        self.addCleanup(post_patcher.stop)
+        self.addCleanup(get_patcher.stop)
+
+    def test_batch_request_body(self):
+        """Test the batch request is accepted by the SDK and carries the scrape options."""
+        urls = ["https://developer.huawei.com/a", "https://developer.huawei.com/b"]
+        pages = self.crawler.scrape_huawei_doc_pages(urls)
+
+        self.assertEqual(len(pages), 1)
+        self.mock_post.assert_called_once()
+        url = self.mock_post.call_args.args[0]
+        body = self.mock_post.call_args.kwargs["json"]
+        self.assertTrue(url.endswith("/v1/batch/scrape"))
+        self.assertEqual(body["urls"], urls)
+        self.assertEqual(body["waitFor"], HUAWEI_WAIT_FOR_MS)
+        self.assertTrue(body["onlyMainContent"])
+        self.assertIn(".doc-content", body["includeTags"])
+        self.assertIn("nav", body["excludeTags"])
+
+    def test_batches_split_and_worker_cap(self):
+        """Test URLs are split into batches and the thread pool is capped."""
+        urls = [f"https://developer.huawei.com/{i}" for i in range(5)]
+        with patch(
+            "huawei_rag.core.firecrawl_advanced_config.ThreadPoolExecutor",
+            wraps=ThreadPoolExecutor,
+        ) as mock_pool:
+            pages = self.crawler.scrape_huawei_doc_pages(urls, batch_size=1)
+
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(self.mock_post.call_count, 5)
+        self.assertEqual(mock_pool.call_args.kwargs["max_workers"], BATCH_SCRAPE_MAX_WORKERS)
+
+    def test_breadth_first_crawl_request_body(self):
+        """Test the breadth-first crawl sends the crawl scrape options with the batch request."""
+        frontier = ["https://developer.huawei.com/docs", "https://developer.huawei.com/docs/a"]
+        with patch.object(HuaweiDocumentCrawler, "_build_bfs_frontier", return_value=frontier):
+            result = self.crawler.crawl_huawei_doc_site("https://developer.huawei.com/docs")
+
+        self.assertEqual(len(result.data), 1)
+        body = self.mock_post.call_args.kwargs["json"]
+        self.assertEqual(body["urls"], frontier)
+        self.assertEqual(body["formats"], ["markdown", "links"])
+        self.assertEqual(body["waitFor"], 2000)
+        self.assertTrue(body["onlyMainContent"])
+        self.assertIn(".api-reference", body["includeTags"])
+        self.assertIn(".toc", body["excludeTags"])
+
+    def test_empty_urls(self):
+        """Test no request is made for an empty URL list."""
+        self.assertEqual(self.crawler.scrape_huawei_doc_pages([]), [])
+        self.mock_post.assert_not_called()
+
+
+class TestSyncSearch(unittest.TestCase):
+    """Tests for HuaweiDocumentCrawler.search_huawei_content against the real SDK."""
+
+    def test_search_request_accepted_by_sdk(self):
+        """Test every search query reaches the HTTP layer with SDK-valid parameters."""
+        crawler = HuaweiDocumentCrawler("fc-test-key")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "success": True,
+            "data": [{"url": "https://developer.huawei.com/a", "title": "ArkTS", "description": "d"}],
+        }
+        with patch("firecrawl.firecrawl.requests.post", return_value=response) as mock_post:
+            results = list(crawler.search_huawei_content("ArkTS"))
+
+        self.assertEqual([item["url"] for item in results], ["https://developer.huawei.com/a"])
+        # 2 merged queries + 4 fallback queries, since one unique result is below the limit
+        self.assertEqual(mock_post.call_count, 6)
+        body = mock_post.call_args.kwargs["json"]
+        self.assertTrue(mock_post.call_args.args[0].endswith("/v1/search"))
+        self.assertEqual(body["limit"], 10)
+        self.assertEqual(body["location"], "China")
+        self.assertTrue(body["scrapeOptions"]["onlyMainContent"])
+
+
+class TestScrapeFallback(unittest.TestCase):
+    """Tests for the SDK fallback of the direct scrape request."""
+
+    def _scrape(self, error):
+        """Scrape once with the direct request failing with error and return the SDK mock."""
+        crawler = HuaweiDocumentCrawler("fc-test-key")
+        crawler.app = MagicMock()
+        with patch.object(HuaweiDocumentCrawler, "_post_scrape", side_effect=error), \
+                patch("huawei_rag.core.firecrawl_advanced_config.time.sleep"):
+            try:
+                crawler._scrape_page("https://developer.huawei.com/a", HUAWEI_WAIT_FOR_MS, 10000)
+            except Exception as e:
+                self.assertIs(e, error)
+        return crawler.app.scrape_url
+
+    @staticmethod
+    def _http_error(status_code):
+        return requests.exceptions.HTTPError(response=MagicMock(status_code=status_code))
+
+    def test_transient_errors_fall_back_to_sdk(self):
+        """Test transport errors and transient status codes fall back to the SDK."""
+        for error in (requests.exceptions.ConnectionError("reset"), self._http_error(503)):
+            with self.subTest(error=error):
+                self._scrape(error).assert_called_once()
+
+    def test_client_errors_are_raised(self):
+        """Test non-transient errors are raised without a second request through the SDK."""
+        for error in (self._http_error(401), self._http_error(402), self._http_error(404),
+                      RuntimeError("爬取失败")):
+            with self.subTest(error=error):
+                self._scrape(error).assert_not_called()
+
+
+class TestScrapeRetry(unittest.TestCase):
+    """Tests for the empty-markdown retry of scrape_huawei_doc_page."""
+
+    def test_retry_timeout_covers_max_wait(self):
+        """Test the retry timeout leaves room for the longer wait even with a short adaptive timeout."""
+        crawler = HuaweiDocumentCrawler("fc-test-key")
+        calls = []
+
+        def fake_scrape(url, wait_ms, timeout_ms):
+            calls.append((wait_ms, timeout_ms))
+            return MagicMock(markdown="" if len(calls) == 1 else "# ArkTS")
+
+        with patch.object(HuaweiDocumentCrawler, "_scrape_page", side_effect=fake_scrape):
+            result = crawler.scrape_huawei_doc_page("https://developer.huawei.com/a", timeout_ms=2000)
+
+        self.assertEqual(result.markdown, "# ArkTS")
+        self.assertEqual(calls[0], (HUAWEI_WAIT_FOR_MS, 2000))
+        self.assertEqual(
+            calls[1], (HUAWEI_MAX_WAIT_FOR_MS, HUAWEI_MAX_WAIT_FOR_MS + WAIT_RETRY_TIMEOUT_MARGIN_MS)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
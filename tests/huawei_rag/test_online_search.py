@@ -0,0 +1,147 @@
+import threading
+import unittest
+
+import numpy as np
+from unittest.mock import MagicMock, patch
+
+from huawei_rag.core.online_search import (
+    EnhancedOnlineSearchEngine,
+    _keyword_relevance_scores,
+    _query_term_matcher,
+)
+
+
+def _make_engine(cache=None):
+    """Create an engine with a FireCrawl key and the given cache."""
+    with patch.dict("os.environ", {"FIRECRAWL_API_KEY": "fc-test-key"}), \
+            patch("huawei_rag.core.online_search.SearchCache", return_value=cache):
+        return EnhancedOnlineSearchEngine()
+
+
+class TestBackgroundLoopOffload(unittest.TestCase):
+    """Tests that blocking work does not run on the shared background loop thread."""
+
+    def test_search_documents_offloads_blocking_calls(self):
+        """Test query decomposition, ranking and cache reads run on worker threads."""
+        threads = {}
+
+        def record(name, result):
+            def fn(*args, **kwargs):
+                threads[name] = threading.get_ident()
+                return result
+            return fn
+
+        cache = MagicMock()
+        cache.get.side_effect = record("cache_get", [{"url": "https://a", "markdown": "# a"}])
+        engine = _make_engine(cache)
+        doc = MagicMock()
+        with patch.object(engine, "_decompose_query_with_llm", side_effect=record("decompose", ["q1"])), \
+                patch.object(engine, "_deduplicate_and_rank_documents", side_effect=record("rank", [doc])):
+            result = engine._run(engine._async_search_documents("ArkTS"))
+        loop_thread = engine._loop_thread.ident
+
+        self.assertEqual(result[0], ["q1"])
+        self.assertEqual(set(threads), {"decompose", "rank", "cache_get"})
+        for name, ident in threads.items():
+            with self.subTest(call=name):
+                self.assertNotEqual(ident, loop_thread)
+
+
+# Texts shared by the matcher and scoring tests: mixed case, CJK, overlapping and nested terms
+_TEXTS = (
+    "Using ARKTS 组件 in HarmonyOS",
+    "Ark UI",
+    "xabcdx",
+    "A STATEMENT about state",
+    "use C++ and axb",
+    "",
+)
+
+
+class TestQueryTermMatcher(unittest.TestCase):
+    """Tests for the compiled multi-term query matcher."""
+
+    def test_fixed_matches(self):
+        """Test the matched term sets for fixed queries and texts."""
+        cases = [
+            ("ArkTS arkts 组件 ark", "Using ARKTS 组件 in HarmonyOS", {"arkts", "组件", "ark"}),
+            ("ArkTS arkts 组件 ark", "Ark UI", {"ark"}),
+            ("abc bcd", "xabcdx", {"abc", "bcd"}),
+            ("state statement", "A STATEMENT", {"state", "statement"}),
+            ("state statement", "state", {"state"}),
+            ("c++ a.b", "use C++ and axb", {"c++"}),
+            # case-insensitive matches whose lowercase form differs from the query term
+            ("hms sdk", "ſdk guide", {"sdk"}),
+            ("kelvin", "\u212aELVIN", {"kelvin"}),
+        ]
+        for query, text, expected in cases:
+            with self.subTest(query=query, text=text):
+                self.assertEqual(_query_term_matcher(query)[1](text), frozenset(expected))
+
+    def test_query_terms_keep_duplicates(self):
+        """Test the returned terms are the lowercased query split, duplicates included."""
+        terms, _ = _query_term_matcher("ArkTS arkts 组件")
+        self.assertEqual(terms, ("arkts", "arkts", "组件"))
+
+    def test_empty_query(self):
+        """Test an empty query matches nothing."""
+        terms, matched_terms = _query_term_matcher("   ")
+        self.assertEqual(terms, ())
+        self.assertEqual(matched_terms("anything"), frozenset())
+
+    def test_matches_per_term_substring_check(self):
+        """Test the matcher agrees with checking each term with `in` on the lowercased text."""
+        for query in ("ArkTS arkts 组件 ark", "abc bcd", "state statement", "c++ a.b", "ui ark harmonyos"):
+            terms, matched_terms = _query_term_matcher(query)
+            for text in _TEXTS:
+                with self.subTest(query=query, text=text):
+                    expected = frozenset(term for term in terms if term in text.lower())
+                    self.assertEqual(matched_terms(text), expected)
+
+
+def _per_term_score(user_query, title, content, description):
+    """Reference scoring: count each query term with `in` per field, weighted 0.4/0.4/0.2."""
+    terms = user_query.lower().split()
+    score = sum(term in title.lower() for term in terms) / len(terms) * 0.4
+    score += sum(term in content.lower() for term in terms) / len(terms) * 0.4
+    if description:
+        score += sum(term in description.lower() for term in terms) / len(terms) * 0.2
+    return min(score, 1.0)
+
+
+class TestKeywordRelevanceScores(unittest.TestCase):
+    """Tests for batched keyword overlap scoring."""
+
+    def test_fixed_scores(self):
+        """Test the weighted scores for a fixed query and documents."""
+        fields = [
+            ("ArkTS 入门", "状态管理 and arkts", ""),
+            ("无关", "nothing", "ArkTS"),
+            ("", "", ""),
+            ("arkts 状态管理", "arkts 状态管理", "arkts 状态管理"),
+        ]
+        scores = _keyword_relevance_scores("ArkTS 状态管理 arkts", fields)
+        np.testing.assert_allclose(scores, [2 / 3 * 0.4 + 0.4, 2 / 3 * 0.2, 0.0, 1.0])
+
+    def test_case_folded_match_does_not_raise(self):
+        """Test a match whose lowercase form is not a query term still scores instead of raising."""
+        scores = _keyword_relevance_scores("hms sdk", [("ſdk guide", "x", "y")])
+        np.testing.assert_allclose(scores, [1 / 2 * 0.4])
+
+    def test_empty_inputs(self):
+        """Test an empty query or document list yields zero scores."""
+        np.testing.assert_array_equal(_keyword_relevance_scores("", [("a", "b", "c")]), [0.0])
+        self.assertEqual(_keyword_relevance_scores("arkts", []).shape, (0,))
+
+    def test_matches_per_term_scoring(self):
+        """Test batched scores agree with scoring each document term by term."""
+        fields = [(title, content, description)
+                  for title in _TEXTS[:3] for content in _TEXTS[2:] for description in _TEXTS[::2]]
+        for query in ("ArkTS arkts 组件 ark", "abc bcd", "state statement", "c++ a.b", "ui ark harmonyos"):
+            with self.subTest(query=query):
+                expected = [_per_term_score(query, *doc) for doc in fields]
+                np.testing.assert_allclose(_keyword_relevance_scores(query, fields), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
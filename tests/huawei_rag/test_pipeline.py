@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from huawei_rag.core.config import CrawlerConfig
+from huawei_rag.core.pipeline import HuaweiRAGPipeline
+
+
+def _make_pipeline():
+    """Create a pipeline without touching the data directories."""
+    with patch.object(CrawlerConfig, "ensure_directories"):
+        return HuaweiRAGPipeline()
+
+
+class TestRAGBatchWorker(unittest.TestCase):
+    """Tests for the asynchronous RAG request batching."""
+
+    def test_slow_batch_does_not_block_next_batch(self):
+        """Test a later request completes while an earlier batch is still running."""
+        pipeline = _make_pipeline()
+        release = threading.Event()
+
+        def fake_search(query, *args):
+            if query == "slow":
+                release.wait(5)
+            return [query]
+
+        pipeline.search_with_rag = fake_search
+
+        async def run():
+            slow = asyncio.create_task(pipeline.search_with_rag_async("slow"))
+            await asyncio.sleep(0.1)
+            fast = await asyncio.wait_for(pipeline.search_with_rag_async("fast"), 2)
+            self.assertFalse(slow.done())
+            release.set()
+            return fast, await slow
+
+        self.assertEqual(asyncio.run(run()), (["fast"], ["slow"]))
+
+    def test_identical_requests_share_one_query(self):
+        """Test identical concurrent requests run once and get independent results."""
+        pipeline = _make_pipeline()
+        calls = []
+
+        def fake_search(query, *args):
+            calls.append(query)
+            return [{"title": query}]
+
+        pipeline.search_with_rag = fake_search
+
+        async def run():
+            return await asyncio.gather(*(pipeline.search_with_rag_async("q") for _ in range(3)))
+
+        results = asyncio.run(run())
+        self.assertEqual(calls, ["q"])
+        self.assertEqual(results, [[{"title": "q"}]] * 3)
+        self.assertIsNot(results[0], results[1])
+
+
+class TestLazyInitialization(unittest.TestCase):
+    """Tests for thread-safe lazy creation of the adapter and RAG agents."""
+
+    def _run_concurrently(self, fn, workers=8):
+        threads = [threading.Thread(target=fn) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_adapter_created_once(self):
+        """Test concurrent first calls create a single adapter."""
+        pipeline = _make_pipeline()
+        pipeline._deepsearcher_ready = True
+
+        def slow_adapter(**kwargs):
+            time.sleep(0.05)
+            return MagicMock()
+
+        with patch("huawei_rag.core.pipeline.HuaweiDeepSearcherAdapter", side_effect=slow_adapter) as mock_cls:
+            self._run_concurrently(pipeline.initialize_adapter)
+        self.assertEqual(mock_cls.call_count, 1)
+
+    def test_agent_created_once(self):
+        """Test concurrent first calls create a single agent per (type, top_k)."""
+        pipeline = _make_pipeline()
+
+        def slow_agent(**kwargs):
+            time.sleep(0.05)
+            return MagicMock()
+
+        with patch("huawei_rag.core.pipeline.DeepSearch", side_effect=slow_agent) as mock_cls:
+            self._run_concurrently(lambda: pipeline._get_rag_agent(False, 5))
+        self.assertEqual(mock_cls.call_count, 1)
+
+
+class TestSetupDeepSearcher(unittest.TestCase):
+    """Tests for the vector DB provider config built by setup_deepsearcher."""
+
+    def test_vector_db_config_has_only_client_arguments(self):
+        """Test only client-supported settings are forwarded and the default config is not mutated."""
+        pipeline = _make_pipeline()
+        default = dict(pipeline.rag_config.DEFAULT_VECTOR_DB_CONFIG)
+        with patch("huawei_rag.core.pipeline.Configuration") as mock_config, \
+                patch("huawei_rag.core.pipeline.init_config"):
+            pipeline.setup_deepsearcher(embedding_dtype="float16")
+
+        provider_configs = {
+            call.args[0]: call.args[2] for call in mock_config.return_value.set_provider_config.call_args_list
+        }
+        self.assertEqual(provider_configs["vector_db"], {**default, "vector_dtype": "float16"})
+        self.assertEqual(pipeline.rag_config.DEFAULT_VECTOR_DB_CONFIG, default)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,426 @@
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from huawei_rag.core.search_agent import (
+    _LITERAL_RE,
+    HuaweiSearchAgent,
+    QueryType,
+    SearchMode,
+    _CoalescingBatcher,
+    _cached_llm_chat,
+    _close_sync_loop,
+    _mark_branch_failed,
+    _run_sync,
+)
+from huawei_rag.core.config import RAGConfig
+from huawei_rag.core.search_cache import SearchCache
+
+
+def _no_components(self, config_file=None):
+    """Skip adapter, online engine and pipeline initialization."""
+    self.local_adapter = None
+    self.online_engine = None
+    self.rag_pipeline = None
+
+
+def _make_agent(**kwargs):
+    """Create an agent without external components or a persistent LLM cache."""
+    with patch.object(HuaweiSearchAgent, "_initialize_components", _no_components):
+        return HuaweiSearchAgent(code_review_service=MagicMock(), llm_cache=False, **kwargs)
+
+
+def _source(url):
+    return {"title": url, "url": url, "content": url, "score": 1.0}
+
+
+class TestLiteralQuery(unittest.TestCase):
+    """Tests for the literal query pattern that routes queries to keyword search."""
+
+    def test_quoted_phrases(self):
+        """Test quoted phrases are literal, including CJK content."""
+        for query in ['"页面路由"', '"router.pushUrl"', '"UIAbility lifecycle"']:
+            with self.subTest(query=query):
+                self.assertIsNotNone(_LITERAL_RE.match(query))
+
+    def test_identifiers_and_filenames(self):
+        """Test bare identifiers, paths and source file names are literal."""
+        for query in ["UIAbility", "router.pushUrl", "index.ets", "src/main/ets/EntryAbility.ets",
+                      "main.cpp", "build-profile.json5", "a.h"]:
+            with self.subTest(query=query):
+                self.assertIsNotNone(_LITERAL_RE.match(query))
+
+    def test_mixed_cjk_questions_are_not_literal(self):
+        """Test natural-language questions that start with an English term are not literal."""
+        for query in ["UIAbility生命周期", "ArkUI组件", "ArkTS是什么", "HarmonyOS如何创建项目",
+                      "如何使用index.ets", "生命周期"]:
+            with self.subTest(query=query):
+                self.assertIsNone(_LITERAL_RE.match(query))
+
+    def test_sentences_are_not_literal(self):
+        """Test queries with spaces or too-short tokens are not literal."""
+        for query in ["how to use UIAbility", "UI", '"unterminated']:
+            with self.subTest(query=query):
+                self.assertIsNone(_LITERAL_RE.match(query))
+
+
+class TestLiteralShortCircuit(unittest.TestCase):
+    """Tests for answering literal queries from local exact matches."""
+
+    def _search(self, **kwargs):
+        """Search a bare identifier and return the result and the literal lookup mock."""
+        agent = _make_agent(**kwargs)
+        agent.local_adapter = MagicMock()
+        lookup = AsyncMock(return_value=("exact", [_source("https://a")]))
+
+        async def fake_execute(self, query, search_mode, context, top_k, **kwargs):
+            return QueryType.FACTUAL, self.default_search_mode, "searched", [], 1
+
+        with patch.object(HuaweiSearchAgent, "_literal_lookup", lookup), \
+                patch.object(HuaweiSearchAgent, "_classify_and_execute", fake_execute), \
+                patch.object(HuaweiSearchAgent, "_embed_for_cache", return_value=None):
+            return asyncio.run(agent.search("HarmonyOS")), lookup
+
+    def test_adaptive_agent_uses_exact_match(self):
+        """Test an adaptive agent answers a bare identifier from local exact matches."""
+        result, lookup = self._search()
+        lookup.assert_awaited_once()
+        self.assertEqual(result.search_mode, SearchMode.LOCAL_ONLY)
+        self.assertEqual(result.answer, "exact")
+
+    def test_configured_mode_is_respected(self):
+        """Test an agent with a fixed default mode does not short-circuit literal queries."""
+        result, lookup = self._search(default_search_mode=SearchMode.ONLINE_ONLY)
+        lookup.assert_not_called()
+        self.assertEqual(result.search_mode, SearchMode.ONLINE_ONLY)
+        self.assertEqual(result.answer, "searched")
+
+
+class TestSpeculativeCodeGeneration(unittest.TestCase):
+    """Tests for reusing the code generated from the first finished search branch."""
+
+    def _run(self, partial_sources, final_sources):
+        """Run the code generation flow and return how often code was generated."""
+        agent = _make_agent()
+
+        async def fake_stream(self, query, top_k, **kwargs):
+            yield False, "partial", list(partial_sources), 1
+            yield True, "final", list(final_sources), 2
+
+        review = SimpleNamespace(score=95, review_report="", review_metadata={}, request_id="r",
+                                 issues_found=[], suggestions=[])
+        generate = AsyncMock(return_value=("code", 1))
+        with patch("huawei_rag.core.search_agent.llm", MagicMock()), \
+                patch.object(HuaweiSearchAgent, "_hybrid_search_stream", fake_stream), \
+                patch.object(HuaweiSearchAgent, "_generate_huawei_code", generate), \
+                patch.object(HuaweiSearchAgent, "_review_code_with_service", AsyncMock(return_value=review)), \
+                patch.object(HuaweiSearchAgent, "_generate_final_code", AsyncMock(return_value=("final", 1))), \
+                patch.object(HuaweiSearchAgent, "_format_code_generation_result", return_value="answer"):
+            answer, _, _ = asyncio.run(agent._code_generation_search("生成代码", 4))
+        self.assertEqual(answer, "answer")
+        return generate.call_count
+
+    def test_reuses_speculation_when_partial_sources_are_kept(self):
+        """Test the speculative code is reused when the merged sources contain the partial ones."""
+        a, b = _source("https://a"), _source("https://b")
+        self.assertEqual(self._run([a], [b, a]), 1)
+
+    def test_regenerates_when_partial_sources_are_dropped(self):
+        """Test code is regenerated when a partial source is missing from the merged sources."""
+        a, b = _source("https://a"), _source("https://b")
+        self.assertEqual(self._run([a], [b]), 2)
+
+
+class TestAdaptivePrefetch(unittest.TestCase):
+    """Tests for the retrieval prefetched while the query is classified."""
+
+    def _run(self, query, query_type):
+        """Run one adaptive classification and return the mode, answer, backends and answer mocks."""
+        agent = _make_agent()
+        agent.local_adapter = MagicMock()
+        agent.local_adapter.search_huawei_docs.return_value = [
+            {"title": "a", "url": "https://a", "content": "local doc", "score": 1.0}
+        ]
+        online_answers = []
+
+        def online_chunks():
+            online_answers.append(True)
+            yield "online answer"
+
+        agent.online_engine = MagicMock()
+        agent.online_engine.search_and_answer_stream.side_effect = lambda q: (
+            online_chunks(), [{"title": "b", "url": "https://b", "content": "online doc"}]
+        )
+        mocks = {
+            "_achat": AsyncMock(return_value=SimpleNamespace(content="synthesized", total_tokens=1)),
+            "_chain_of_search": AsyncMock(return_value=("chain", [], 1)),
+            "_generate_huawei_code": AsyncMock(return_value=("code", 1)),
+            "_review_code_with_service": AsyncMock(return_value=SimpleNamespace(
+                score=95, review_report="", review_metadata={}, request_id="r",
+                issues_found=[], suggestions=[])),
+            "_generate_final_code": AsyncMock(return_value=("final", 1)),
+            "_rank_sources": AsyncMock(side_effect=lambda query, sources: sources),
+        }
+        fake_llm = MagicMock()
+        fake_llm.remove_think.side_effect = lambda content: content
+        patchers = [patch.object(HuaweiSearchAgent, name, mock) for name, mock in mocks.items()]
+        patchers += [
+            patch("huawei_rag.core.search_agent.llm", fake_llm),
+            patch.object(HuaweiSearchAgent, "_classify_query_type", return_value=query_type),
+            patch.object(HuaweiSearchAgent, "_format_code_generation_result", return_value="code answer"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _, mode, answer, _, _ = asyncio.run(agent._classify_and_execute(query, None, None, 4))
+        return mode, answer, agent, online_answers, mocks
+
+    def test_hybrid_reuses_prefetch(self):
+        """Test a hybrid query answers from the prefetched retrieval without searching again."""
+        mode, answer, agent, online_answers, _ = self._run("ArkTS状态管理", QueryType.FACTUAL)
+        self.assertEqual(mode, SearchMode.HYBRID)
+        self.assertEqual(answer, "synthesized")
+        agent.local_adapter.search_huawei_docs.assert_called_once()
+        agent.online_engine.search_and_answer_stream.assert_called_once()
+        self.assertEqual(len(online_answers), 1)
+
+    def test_code_generation_takes_over_prefetch(self):
+        """Test code generation consumes the prefetched retrieval instead of searching again."""
+        mode, answer, agent, _, mocks = self._run("生成代码：页面跳转", QueryType.GENERAL)
+        self.assertEqual(mode, SearchMode.CODE_GENERATION)
+        self.assertEqual(answer, "code answer")
+        agent.local_adapter.search_huawei_docs.assert_called_once()
+        agent.online_engine.search_and_answer_stream.assert_called_once()
+        self.assertEqual(mocks["_generate_huawei_code"].call_count, 1)
+
+    def test_online_only_reuses_online_retrieval(self):
+        """Test an online-only query runs the online search once and skips the local answer."""
+        mode, answer, agent, online_answers, mocks = self._run("应用闪退怎么办", QueryType.TROUBLESHOOTING)
+        self.assertEqual(mode, SearchMode.ONLINE_ONLY)
+        self.assertEqual(answer, "online answer")
+        agent.online_engine.search_and_answer_stream.assert_called_once()
+        self.assertEqual(len(online_answers), 1)
+        mocks["_achat"].assert_not_called()
+
+    def test_other_modes_skip_prefetch_answers(self):
+        """Test a discarded prefetch spends no answer-generation LLM call."""
+        mode, answer, _, online_answers, mocks = self._run("如何配置签名", QueryType.PROCEDURAL)
+        self.assertEqual(mode, SearchMode.CHAIN_OF_SEARCH)
+        self.assertEqual(answer, "chain")
+        mocks["_achat"].assert_not_called()
+        self.assertEqual(online_answers, [])
+
+
+class TestQueryCache(unittest.TestCase):
+    """Tests for the in-memory query result cache."""
+
+    def _search(self, agent, query="ArkTS状态管理", fail=False):
+        """Run one search with a stubbed classification and execution step."""
+        async def fake_execute(self, query, search_mode, context, top_k, **kwargs):
+            if fail:
+                _mark_branch_failed("在线搜索")
+            return QueryType.FACTUAL, SearchMode.HYBRID, "answer", [_source("https://a")], 1
+
+        with patch.object(HuaweiSearchAgent, "_classify_and_execute", fake_execute), \
+                patch.object(HuaweiSearchAgent, "_embed_for_cache", return_value=None):
+            return asyncio.run(agent.search(query))
+
+    def test_repeated_query_hits_cache(self):
+        """Test a successful result is served from the cache on the next call."""
+        agent = _make_agent()
+        self._search(agent)
+        self.assertEqual(self._search(agent).metadata.get("cache"), "exact")
+
+    def test_failed_branch_is_not_cached(self):
+        """Test a result with a failed search branch is not cached."""
+        agent = _make_agent()
+        self._search(agent, fail=True)
+        self.assertEqual(len(agent._exact_cache), 0)
+        self.assertIsNone(self._search(agent).metadata.get("cache"))
+
+    def test_expired_entry_is_a_miss(self):
+        """Test entries older than the TTL are not served."""
+        agent = _make_agent(cache_ttl=60)
+        self._search(agent)
+        with patch("huawei_rag.core.search_agent.time.monotonic", return_value=time.monotonic() + 61):
+            result = self._search(agent)
+        self.assertIsNone(result.metadata.get("cache"))
+
+    def test_pipeline_reload_clears_cache(self):
+        """Test reloading the vector database through the pipeline invalidates the cache."""
+        agent = _make_agent()
+        agent.rag_pipeline = SimpleNamespace(index_version=0)
+        self._search(agent)
+        agent.rag_pipeline.index_version += 1
+        self.assertIsNone(self._search(agent).metadata.get("cache"))
+
+
+class _BatchBackend:
+    """Stub LLM backend that records each batch_chat call."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def batch_chat(self, messages_list):
+        self.batches.append([messages[0]["content"] for messages in messages_list])
+        if self.fail:
+            raise ValueError("backend down")
+        return [f"reply:{messages[0]['content']}" for messages in messages_list]
+
+    def chat(self, messages):
+        raise AssertionError("chat should not be called when batch_chat is available")
+
+
+def _messages(content):
+    return [{"role": "user", "content": content}]
+
+
+class TestCoalescingBatcher(unittest.TestCase):
+    """Tests for coalescing concurrent LLM requests into batch_chat calls."""
+
+    def _submit_all(self, batcher, contents):
+        async def run():
+            return await asyncio.gather(*(batcher.submit(_messages(c)) for c in contents))
+        return asyncio.run(run())
+
+    def _batcher(self, backend, **kwargs):
+        async def fn(messages_list):
+            return backend.batch_chat(messages_list)
+        return _CoalescingBatcher(fn, **kwargs)
+
+    def test_concurrent_requests_share_one_batch(self):
+        """Test requests in the same window go out as one call, longest first, with replies routed back."""
+        backend = _BatchBackend()
+        replies = self._submit_all(self._batcher(backend, flush_ms=20), ["a", "ccc", "bb"])
+        self.assertEqual(backend.batches, [["ccc", "bb", "a"]])
+        self.assertEqual(replies, ["reply:a", "reply:ccc", "reply:bb"])
+
+    def test_max_batch_flushes_early(self):
+        """Test a full batch is submitted without waiting for the window."""
+        backend = _BatchBackend()
+        batcher = self._batcher(backend, flush_ms=10_000, max_batch=2)
+        started = time.monotonic()
+        replies = self._submit_all(batcher, ["a", "b", "c", "d"])
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([sorted(batch) for batch in backend.batches], [["a", "b"], ["c", "d"]])
+        self.assertEqual(replies, ["reply:a", "reply:b", "reply:c", "reply:d"])
+
+    def test_backend_error_reaches_every_request(self):
+        """Test a failed batch_chat call is raised in every waiting request."""
+        batcher = self._batcher(_BatchBackend(fail=True), flush_ms=1)
+
+        async def run():
+            return await asyncio.gather(
+                batcher.submit(_messages("a")), batcher.submit(_messages("b")), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_short_response_list_fails_every_request(self):
+        """Test a backend returning fewer responses than requests fails the batch instead of hanging."""
+        async def short_batch(messages_list):
+            return ["only one"]
+
+        batcher = _CoalescingBatcher(short_batch, flush_ms=1)
+
+        async def run():
+            return await asyncio.wait_for(asyncio.gather(
+                batcher.submit(_messages("a")), batcher.submit(_messages("b")), return_exceptions=True
+            ), timeout=5)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_agent_routes_through_batch_chat(self):
+        """Test _achat coalesces concurrent calls when the backend provides batch_chat."""
+        backend = _BatchBackend()
+        agent = _make_agent()
+
+        async def run():
+            return await asyncio.gather(*(agent._achat(_messages(c)) for c in ("x", "y")))
+
+        with patch("huawei_rag.core.search_agent.llm", backend):
+            replies = asyncio.run(run())
+        self.assertEqual(replies, ["reply:x", "reply:y"])
+        self.assertEqual(len(backend.batches), 1)
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """Tests for the persistent LLM response cache."""
+
+    def test_agent_cache_is_size_bounded(self):
+        """Test the agent opens the LLM cache with the configured size limit."""
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(RAGConfig, "LLM_CACHE_DIR", tmp), \
+                patch.object(HuaweiSearchAgent, "_initialize_components", _no_components):
+            agent = HuaweiSearchAgent(code_review_service=MagicMock())
+            self.assertEqual(agent._llm_cache.size_limit, RAGConfig.LLM_CACHE_SIZE_LIMIT)
+            agent._llm_cache.close()
+
+    def test_oldest_responses_are_evicted(self):
+        """Test responses beyond the size limit are evicted oldest first."""
+        llm = MagicMock(model="m")
+        llm.chat.side_effect = lambda messages: SimpleNamespace(content="x" * 1000, total_tokens=10)
+        llm.remove_think.side_effect = lambda content: content
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SearchCache(tmp, size_limit=5_000)
+            for i in range(10):
+                _cached_llm_chat(llm, [{"role": "user", "content": str(i)}], cache)
+
+            self.assertEqual(_cached_llm_chat(llm, [{"role": "user", "content": "9"}], cache)[1], 0)
+            self.assertEqual(_cached_llm_chat(llm, [{"role": "user", "content": "0"}], cache)[1], 10)
+            cache.close()
+
+
+class TestRunSync(unittest.TestCase):
+    """Tests for the shared event loop behind the synchronous entry points."""
+
+    def setUp(self):
+        self.addCleanup(_close_sync_loop)
+
+    async def _current_loop(self):
+        return asyncio.get_running_loop()
+
+    def test_threads_share_one_loop(self):
+        """Test calls from different threads run on the same background loop."""
+        loops = []
+        threads = [threading.Thread(target=lambda: loops.append(_run_sync(self._current_loop())))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        loops.append(_run_sync(self._current_loop()))
+        self.assertEqual(len(set(map(id, loops))), 1)
+        self.assertTrue(loops[0].is_running())
+
+    def test_close_stops_loop_and_thread(self):
+        """Test the close hook stops the loop thread and closes the loop."""
+        loop = _run_sync(self._current_loop())
+        names = {thread.name for thread in threading.enumerate()}
+        self.assertIn("search-agent-sync-loop", names)
+
+        _close_sync_loop()
+
+        self.assertTrue(loop.is_closed())
+        names = {thread.name for thread in threading.enumerate()}
+        self.assertNotIn("search-agent-sync-loop", names)
+        self.assertIsNot(_run_sync(self._current_loop()), loop)
+
+    def test_nested_call_is_rejected(self):
+        """Test calling a sync entry point from inside the loop raises instead of deadlocking."""
+        async def nested():
+            return _run_sync(self._current_loop())
+
+        with self.assertRaises(RuntimeError):
+            _run_sync(nested())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from huawei_rag.core.search_cache import QuantizedEmbeddingStore, SearchCache
+
+
+class TestSearchCacheEviction(unittest.TestCase):
+    """Tests for expiry and size-based eviction in SearchCache."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def test_expired_entries_removed_on_open(self):
+        """Test reopening the cache deletes entries that have already expired."""
+        cache = SearchCache(self._tmp.name)
+        cache.set("old", "value", expire=-1)
+        cache.set("fresh", "value", expire=60)
+        cache.close()
+
+        cache = SearchCache(self._tmp.name)
+        self.addCleanup(cache.close)
+        keys = [row[0] for row in cache._conn.execute("SELECT key FROM cache")]
+        self.assertEqual(keys, ["fresh"])
+
+    def test_periodic_eviction_on_write(self):
+        """Test writes trigger expiry cleanup once the eviction interval has passed."""
+        cache = SearchCache(self._tmp.name)
+        self.addCleanup(cache.close)
+        cache.set("old", "value", expire=-1)
+        cache._next_evict = time.monotonic() - 1
+        cache.set("new", "value")
+        count = cache._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_size_limit_culls_oldest_entries(self):
+        """Test exceeding size_limit drops the oldest entries first."""
+        cache = SearchCache(self._tmp.name, size_limit=10_000)
+        self.addCleanup(cache.close)
+        for i in range(30):
+            cache.set(f"key{i}", b"x" * 1000)
+
+        self.assertLessEqual(cache._total_size(), 10_000)
+        self.assertNotIn("key0", cache)
+        self.assertEqual(cache.get("key29"), b"x" * 1000)
+
+    def test_rewritten_entry_counts_as_recent(self):
+        """Test overwriting a key moves it to the end of the eviction order."""
+        cache = SearchCache(self._tmp.name, size_limit=5_000)
+        self.addCleanup(cache.close)
+        for i in range(4):
+            cache.set(f"key{i}", b"x" * 1000)
+        cache.set("key0", b"y" * 1000)
+        cache.set("key4", b"x" * 1000)
+        cache.set("key5", b"x" * 1000)
+
+        self.assertIn("key0", cache)
+        self.assertNotIn("key1", cache)
+
+
+class TestQuantizedEmbeddingStore(unittest.TestCase):
+    """Tests for the bounded int8 embedding store."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _vectors(self, n, offset=0):
+        return np.arange(offset, offset + n * 4, dtype=np.float32).reshape(n, 4) + 1
+
+    def test_rollover_at_max_rows(self):
+        """Test the store switches to new files and forgets old keys at max_rows."""
+        store = QuantizedEmbeddingStore(self._tmp.name, max_rows=4)
+        self.addCleanup(store.close)
+        first = store.add(["a", "b", "c"], self._vectors(3))
+        store.get(first.values())
+
+        second = store.add(["d", "e"], self._vectors(2, offset=100))
+
+        self.assertEqual(sorted(second.values()), [3, 4])
+        self.assertEqual(store.lookup(["a", "b", "c", "d"]), {"d": 3})
+        quantized, _ = store.get([second["d"], second["e"]])
+        self.assertEqual(quantized.shape, (2, 4))
+        files = sorted(path.name for path in store.directory.iterdir() if path.suffix in (".i8", ".f32"))
+        self.assertEqual(files, ["scales.3.f32", "vectors.3.i8"])
+
+    def test_stale_rows_raise_key_error(self):
+        """Test rows allocated before a rollover in another handle are rejected."""
+        writer = QuantizedEmbeddingStore(self._tmp.name, max_rows=2)
+        reader = QuantizedEmbeddingStore(self._tmp.name, max_rows=2)
+        self.addCleanup(writer.close)
+        self.addCleanup(reader.close)
+        rows = reader.add(["a", "b"], self._vectors(2))
+
+        writer.add(["c", "d"], self._vectors(2, offset=100))
+
+        with self.assertRaises(KeyError):
+            reader.get([rows["a"]])
+
+    def test_reopen_keeps_current_generation(self):
+        """Test vectors written after a rollover survive reopening the store."""
+        store = QuantizedEmbeddingStore(self._tmp.name, max_rows=2)
+        store.add(["a", "b"], self._vectors(2))
+        rows = store.add(["c"], self._vectors(1, offset=100))
+        expected, _ = store.get([rows["c"]])
+        store.close()
+
+        store = QuantizedEmbeddingStore(self._tmp.name, max_rows=2)
+        self.addCleanup(store.close)
+        self.assertEqual(store.lookup(["a", "c"]), rows)
+        quantized, _ = store.get([rows["c"]])
+        np.testing.assert_array_equal(quantized, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
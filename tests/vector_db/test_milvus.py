@@ -137,5 +137,32 @@ class TestMilvus(unittest.TestCase):
             self.assertGreaterEqual(len(collections), 0)
 
 
+class TestMilvusInsertCount(unittest.TestCase):
+    """Tests for the number of chunks reported by Milvus.insert_data."""
+
+    def setUp(self):
+        """Set up a Milvus instance with a mocked client."""
+        with patch("deepsearcher.vector_db.milvus.MilvusClient") as mock_client:
+            self.milvus = Milvus(uri="./milvus.db")
+        self.client = mock_client.return_value
+        self.chunks = [
+            Chunk(text=f"text {i}", reference="ref", metadata={}, embedding=[0.1] * 8)
+            for i in range(5)
+        ]
+
+    def test_insert_returns_count(self):
+        """Test a successful insert reports every chunk."""
+        written = self.milvus.insert_data(collection="c", chunks=self.chunks, batch_size=2)
+        self.assertEqual(written, 5)
+        self.assertEqual(self.client.insert.call_count, 3)
+
+    def test_insert_failure_raises(self):
+        """Test a failed batch raises and reports the chunks written before it."""
+        self.client.insert.side_effect = [None, Exception("connection lost"), None]
+        with self.assertRaises(RuntimeError) as ctx:
+            self.milvus.insert_data(collection="c", chunks=self.chunks, batch_size=2)
+        self.assertIn("2/5", str(ctx.exception))
+
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file